@@ -0,0 +1,511 @@
+"""
+This module contains a smarter computer player's AI:
+it chooses to attack, to use the skill or to skip the turn by the expected outcome
+(expectimax over the weapon damage distributions, the hero is expected to attack
+and to use the skill as soon as it is affordable)
+
+the values are kept in integer tenths like in the fixed point mode,
+the search results are cached in a transposition table,
+an offline precomputed policy table of a matchup (see precompute_policy) replaces the search:
+a byte (the action) per state bucket, the tables of all the matchups are kept in a file
+mapped into memory (shared by the workers, a page is read when a matchup is played)
+
+usage: python -m app.ai --output policies  (precomputes the policy tables of all the matchups)
+"""
+
+from __future__ import annotations
+
+import argparse
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import product
+from math import floor
+from threading import Lock
+from typing import Optional, Union
+
+from app.arena import ATTACK, USE_SKILL, SKIP_TURN
+from app.classes import UnitClass
+from app.const import (
+    AI_SEARCH_DEPTH,
+    AI_DAMAGE_BUCKETS,
+    AI_CACHE_SIZE,
+    AI_POLICY_DIR,
+    STAMINA_RECOVER_PER_TURN,
+)
+from app.equipment import Equipment, Weapon, Armor
+from app.unit import BaseUnit
+
+ACTIONS = (ATTACK, USE_SKILL, SKIP_TURN)
+WIN, DRAW, LOSS = 1.0, 0.0, -1.0  # from the computer player's point of view
+
+# the policy table state buckets
+HEALTH_BUCKETS = 10
+STAMINA_BUCKETS = 4
+TABLE_SIZE = (
+    HEALTH_BUCKETS * STAMINA_BUCKETS * 2
+) ** 2  # the buckets (and the bytes) of a policy table
+
+# the policy tables file: the header (a signature, the table size, the number of the matchups),
+# the matchups (the computer player's and the hero's setups ids) and their tables in the same order
+POLICY_FILE = "tables.bin"
+POLICY_HEADER = struct.Struct("<4sII")
+POLICY_SIGNATURE = b"SKP1"
+POLICY_MATCHUP = struct.Struct("<6H")
+
+
+def damage_distribution(weapon: Weapon, attack: float) -> list[tuple[int, float]]:
+    """
+    returns the (damage in tenths, probability) pairs of round(uniform(min, max) * attack, 1)
+    """
+
+    low, high = weapon.min_damage * attack * 10, weapon.max_damage * attack * 10
+    if high <= low:
+        return [(round(low), 1.0)]
+    distribution = []
+    for tenths in range(round(low), round(high) + 1):
+        covered = min(high, tenths + 0.5) - max(low, tenths - 0.5)
+        if covered > 0:
+            distribution.append((tenths, covered / (high - low)))
+    return distribution
+
+
+def coarsen(
+    distribution: list[tuple[int, float]], buckets: int
+) -> list[tuple[int, float]]:
+    """
+    merges a distribution into the buckets of equal probability (their mean values)
+    """
+
+    merged: list[list[float]] = [[0.0, 0.0] for _ in range(buckets)]
+    cumulative = 0.0
+    for value, probability in distribution:
+        bucket = merged[
+            min(floor((cumulative + probability / 2) * buckets), buckets - 1)
+        ]
+        bucket[0] += value * probability
+        bucket[1] += probability
+        cumulative += probability
+    return [
+        (round(total / probability), probability)
+        for total, probability in merged
+        if probability > 0
+    ]
+
+
+@dataclass(frozen=True)
+class Fighter:  # pylint: disable=too-many-instance-attributes
+    """
+    a unit's constant parameters in tenths
+    """
+
+    max_health: int
+    max_stamina: int
+    hit_cost: int
+    defence_cost: int
+    armor: float  # defence in tenths
+    skill_damage: int
+    skill_cost: int
+    regeneration: int
+    damage: tuple[tuple[int, float], ...]
+
+    @classmethod
+    def make(
+        cls,
+        unit_class: UnitClass,
+        weapon: Weapon,
+        armor: Armor,
+        stamina: float,
+        buckets: Optional[int] = None,
+    ) -> Fighter:
+        """
+        makes the parameters of a unit setup
+        buckets - the number of the damage values to keep, all of them by default
+        """
+
+        damage = damage_distribution(weapon, unit_class.attack)
+
+        return cls(
+            max_health=round(unit_class.max_health * 10),
+            max_stamina=round(unit_class.max_stamina * 10),
+            hit_cost=round(weapon.stamina_per_hit * 10),
+            defence_cost=round(armor.stamina_per_turn * 10),
+            armor=armor.defence * unit_class.armor * 10,
+            skill_damage=round(unit_class.skill.damage * 10),
+            skill_cost=round(unit_class.get_required_stamina() * 10),
+            regeneration=round(stamina * unit_class.get_stamina_mod() * 10),
+            damage=tuple(damage if buckets is None else coarsen(damage, buckets)),
+        )
+
+
+# a state: (health, stamina, skill used) of the computer player and of the hero
+State = tuple[int, int, bool, int, int, bool]
+
+
+def _outcome(state: State) -> Optional[float]:
+    """
+    Arena.check_health() from the computer player's point of view
+    """
+
+    health, _, _, hero_health, _, _ = state
+    if health > 0 and hero_health > 0:
+        return None
+    if health < 0 and hero_health < 0:
+        return DRAW
+    if health < 0:
+        return LOSS
+    return WIN
+
+
+def _act(
+    action: int, attacker: Fighter, target: Fighter, unit: tuple, other: tuple
+) -> list[tuple[float, tuple, tuple]]:
+    """
+    BaseUnit.attack() and BaseUnit.use_skill() on (health, stamina, skill used) tuples
+    :returns the (probability, unit, other) outcomes
+    """
+
+    health, stamina, skill_used = unit
+    other_health, other_stamina, other_skill_used = other
+    if action == USE_SKILL:
+        if skill_used or stamina < attacker.skill_cost:
+            return [(1.0, unit, other)]
+        return [
+            (
+                1.0,
+                (health, stamina, True),
+                (other_health - attacker.skill_damage, other_stamina, other_skill_used),
+            )
+        ]
+    if action == SKIP_TURN or stamina < attacker.hit_cost:
+        return [(1.0, unit, other)]
+    armor = target.armor if other_stamina >= target.defence_cost else 0.0
+    unit = (health, stamina - attacker.hit_cost, skill_used)
+    return [
+        (
+            probability,
+            unit,
+            (
+                other_health - max(round(damage - armor), 0),
+                other_stamina - target.defence_cost,
+                other_skill_used,
+            ),
+        )
+        for damage, probability in attacker.damage
+    ]
+
+
+def _regenerate(state: State, fighter: Fighter, hero: Fighter) -> State:
+    health, stamina, skill_used, hero_health, hero_stamina, hero_skill_used = state
+    return (
+        health,
+        min(stamina + fighter.regeneration, fighter.max_stamina),
+        skill_used,
+        hero_health,
+        min(hero_stamina + hero.regeneration, hero.max_stamina),
+        hero_skill_used,
+    )
+
+
+class ExpectimaxAI:
+    """
+    chooses the computer player's actions
+    the searched states are cached in an LRU transposition table shared by all the fights
+    """
+
+    def __init__(
+        self,
+        depth: int = AI_SEARCH_DEPTH,
+        buckets: int = AI_DAMAGE_BUCKETS,
+        cache_size: int = AI_CACHE_SIZE,
+    ):
+        self.depth = depth
+        self.buckets = buckets
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple, float] = OrderedDict()
+        self._lock = Lock()
+        # the precomputed policy tables by matchup (see load_policies)
+        self.policies: dict[str, Union[bytes, memoryview]] = {}
+        self._policy_file: Optional[mmap.mmap] = None
+
+    def fighter(self, unit: BaseUnit, stamina: float) -> Fighter:
+        """
+        returns the parameters of a unit
+        """
+
+        return Fighter.make(
+            unit.unit_class, unit.weapon, unit.armor, stamina, self.buckets
+        )
+
+    def _cached(self, key: tuple) -> Optional[float]:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+            return value
+
+    def _store(self, key: tuple, value: float) -> None:
+        with self._lock:
+            self._cache[key] = value
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _heuristic(self, state: State, fighter: Fighter, hero: Fighter) -> float:
+        health, _, _, hero_health, _, _ = state
+        return (health / fighter.max_health - hero_health / hero.max_health) / 2
+
+    def _hero_turn(  # pylint: disable=too-many-locals
+        self, state: State, fighter: Fighter, hero: Fighter, depth: int
+    ) -> float:
+        """
+        the expected value after the hero's turn (the hero uses the skill as soon as affordable)
+        """
+
+        health, stamina, skill_used, hero_health, hero_stamina, hero_skill_used = state
+        hero_unit = (hero_health, hero_stamina, hero_skill_used)
+        can_use_skill = not hero_skill_used and hero_stamina >= hero.skill_cost
+        value = 0.0
+        for probability, hero_unit, unit in _act(
+            USE_SKILL if can_use_skill else ATTACK,
+            hero,
+            fighter,
+            hero_unit,
+            (health, stamina, skill_used),
+        ):
+            next_state = unit + hero_unit
+            outcome = _outcome(next_state)
+            if outcome is None:
+                outcome = self.value(
+                    _regenerate(next_state, fighter, hero), fighter, hero, depth
+                )
+            value += probability * outcome
+        return value
+
+    def action_value(  # pylint: disable=too-many-locals
+        self, action: int, state: State, fighter: Fighter, hero: Fighter, depth: int
+    ) -> float:
+        """
+        the expected value of the computer player's action
+        """
+
+        health, stamina, skill_used, hero_health, hero_stamina, hero_skill_used = state
+        value = 0.0
+        for probability, unit, hero_unit in _act(
+            action,
+            fighter,
+            hero,
+            (health, stamina, skill_used),
+            (hero_health, hero_stamina, hero_skill_used),
+        ):
+            next_state = unit + hero_unit
+            outcome = _outcome(next_state)
+            if outcome is None:
+                next_state = _regenerate(next_state, fighter, hero)
+                outcome = self._hero_turn(next_state, fighter, hero, depth - 1)
+            value += probability * outcome
+        return value
+
+    def value(self, state: State, fighter: Fighter, hero: Fighter, depth: int) -> float:
+        """
+        the expected value of the state when the computer player moves
+        """
+
+        if depth == 0:
+            return self._heuristic(state, fighter, hero)
+        key = (fighter, hero, state, depth)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        value = max(
+            self.action_value(action, state, fighter, hero, depth) for action in ACTIONS
+        )
+        self._store(key, value)
+        return value
+
+    def search(self, state: State, fighter: Fighter, hero: Fighter) -> int:
+        """
+        returns the best action of the computer player
+        """
+
+        return max(
+            ACTIONS,
+            key=lambda action: self.action_value(
+                action, state, fighter, hero, self.depth
+            ),
+        )
+
+    def choose_action(self, unit: BaseUnit, hero: BaseUnit, stamina: float) -> int:
+        """
+        returns the computer player's action: ATTACK, USE_SKILL or SKIP_TURN
+        """
+
+        fighter, hero_fighter = self.fighter(unit, stamina), self.fighter(hero, stamina)
+        state = (
+            round(unit.health_points * 10),
+            round(unit.stamina_points * 10),
+            unit.skill_used,
+            round(hero.health_points * 10),
+            round(hero.stamina_points * 10),
+            hero.skill_used,
+        )
+        policy = self.policies.get(matchup_key(unit, hero))
+        if policy is not None:
+            return policy[bucket_index(state, fighter, hero_fighter)]
+        return self.search(state, fighter, hero_fighter)
+
+    def load_policies(self, directory: str = AI_POLICY_DIR) -> None:
+        """
+        maps the precomputed policy tables file (see write_policies) into memory,
+        a table is a view of the file, nothing is read until a matchup is played
+        """
+
+        file_name = os.path.join(directory, POLICY_FILE)
+        if not os.path.isfile(file_name):
+            return
+        with open(file_name, "rb") as file_handler:
+            policy_file = mmap.mmap(file_handler.fileno(), 0, access=mmap.ACCESS_READ)
+        signature, table_size, count = POLICY_HEADER.unpack_from(policy_file)
+        if signature != POLICY_SIGNATURE or table_size != TABLE_SIZE:
+            print(
+                f"{file_name} is made by another version, precompute the policy tables again"
+            )
+            policy_file.close()
+            return
+        header = POLICY_HEADER.size
+        tables = header + count * POLICY_MATCHUP.size
+        view = memoryview(policy_file)
+        for number, ids in enumerate(POLICY_MATCHUP.iter_unpack(view[header:tables])):
+            start = tables + number * TABLE_SIZE
+            end = start + TABLE_SIZE
+            self.policies["-".join(map(str, ids))] = view[start:end]
+        self._policy_file = policy_file
+
+
+def write_policies(file_name: str, tables: list[tuple[tuple[int, ...], bytes]]) -> None:
+    """
+    writes the policy tables by the matchups (the computer player's and the hero's
+    setups ids) to the file
+    """
+
+    with open(file_name, "wb") as file_handler:
+        file_handler.write(
+            POLICY_HEADER.pack(POLICY_SIGNATURE, TABLE_SIZE, len(tables))
+        )
+        for ids, _ in tables:
+            file_handler.write(POLICY_MATCHUP.pack(*ids))
+        for _, table in tables:
+            file_handler.write(table)
+
+
+def matchup_key(unit: BaseUnit, hero: BaseUnit) -> str:
+    """
+    the key of the policy table of a matchup: the computer player's and the hero's setups ids
+    """
+
+    return "-".join(
+        str(value)
+        for player in (unit, hero)
+        for value in (player.unit_class.id, player.weapon.id, player.armor.id)
+    )
+
+
+def _bucket(value: int, maximum: int, buckets: int) -> int:
+    return min(max(value, 0) * buckets // maximum, buckets - 1)
+
+
+def bucket_index(state: State, fighter: Fighter, hero: Fighter) -> int:
+    """
+    the policy table index of a state: the buckets of the players' health, stamina and skill
+    """
+
+    health, stamina, skill_used, hero_health, hero_stamina, hero_skill_used = state
+    side = (
+        _bucket(health, fighter.max_health, HEALTH_BUCKETS) * STAMINA_BUCKETS
+        + _bucket(stamina, fighter.max_stamina, STAMINA_BUCKETS)
+    ) * 2 + skill_used
+    hero_side = (
+        _bucket(hero_health, hero.max_health, HEALTH_BUCKETS) * STAMINA_BUCKETS
+        + _bucket(hero_stamina, hero.max_stamina, STAMINA_BUCKETS)
+    ) * 2 + hero_skill_used
+    return side * HEALTH_BUCKETS * STAMINA_BUCKETS * 2 + hero_side
+
+
+def _middle(bucket: int, maximum: int, buckets: int) -> int:
+    return (2 * bucket + 1) * maximum // (2 * buckets)
+
+
+def precompute_policy(ai: ExpectimaxAI, fighter: Fighter, hero: Fighter) -> bytes:
+    """
+    searches the best action for the middle state of every bucket
+    """
+
+    policy = bytearray(TABLE_SIZE)
+    for (
+        health,
+        stamina,
+        skill_used,
+        hero_health,
+        hero_stamina,
+        hero_skill_used,
+    ) in product(
+        range(HEALTH_BUCKETS), range(STAMINA_BUCKETS), (False, True), repeat=2
+    ):
+        state = (
+            _middle(health, fighter.max_health, HEALTH_BUCKETS),
+            _middle(stamina, fighter.max_stamina, STAMINA_BUCKETS),
+            bool(skill_used),
+            _middle(hero_health, hero.max_health, HEALTH_BUCKETS),
+            _middle(hero_stamina, hero.max_stamina, STAMINA_BUCKETS),
+            bool(hero_skill_used),
+        )
+        policy[bucket_index(state, fighter, hero)] = ai.search(state, fighter, hero)
+    return bytes(policy)
+
+
+ai_player = ExpectimaxAI()  # shared by all the fights of a worker
+
+
+def choose_enemy_action(unit: BaseUnit, hero: BaseUnit, stamina: float) -> int:
+    """
+    the computer player's AI used by the arenas (see Arena.enemy_ai)
+    """
+
+    return ai_player.choose_action(unit, hero, stamina)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Precomputes the AI policy tables of the matchups"
+    )
+    parser.add_argument(
+        "--output", default=AI_POLICY_DIR, help="the directory to write the tables to"
+    )
+    parser.add_argument(
+        "--limit", type=int, default=None, help="the max number of matchups"
+    )
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    equipment = Equipment()
+    setups = list(
+        product(
+            UnitClass.instances, equipment.equipment.weapons, equipment.equipment.armors
+        )
+    )
+    policy_tables = []
+    for number_, (enemy_setup, hero_setup) in enumerate(product(setups, repeat=2)):
+        if args.limit is not None and number_ >= args.limit:
+            break
+        table_ = precompute_policy(
+            ai_player,
+            Fighter.make(*enemy_setup, STAMINA_RECOVER_PER_TURN, ai_player.buckets),
+            Fighter.make(*hero_setup, STAMINA_RECOVER_PER_TURN, ai_player.buckets),
+        )
+        policy_tables.append(
+            (tuple(item.id for item in enemy_setup + hero_setup), table_)
+        )
+        print(f"\r{number_ + 1} matchups", end="")
+    print()
+    write_policies(os.path.join(args.output, POLICY_FILE), policy_tables)
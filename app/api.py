@@ -0,0 +1,96 @@
+"""
+This module prepares the fight data for the JSON API:
+the full state of a fight and the changes made by a turn
+"""
+
+from __future__ import annotations
+
+from app.arena import Arena
+from app.unit import BaseUnit
+
+API_VERSION = 1
+
+# the fight results codes
+RESULTS = {
+    "Победил Игрок": "win",
+    "Ничья": "draw",
+    "Победил Противник": "loss",
+    "": None,
+}
+
+
+def unit_state(unit: BaseUnit) -> dict:
+    """
+    returns the changeable fields of a unit
+    """
+
+    return {
+        "health": unit.health_points,
+        "stamina": round(unit.stamina_points, 1),
+        "skill_used": unit.skill_used,
+    }
+
+
+def unit_info(unit: BaseUnit) -> dict:
+    """
+    returns all the fields of a unit
+    """
+
+    return {
+        "name": unit.name,
+        "unit_class": unit.unit_class.name,
+        "max_health": unit.unit_class.max_health,
+        "max_stamina": unit.unit_class.max_stamina,
+        "skill": unit.unit_class.skill_name,
+        "weapon": unit.weapon.name,
+        "armor": unit.armor.name,
+        **unit_state(unit),
+    }
+
+
+def snapshot(arena: Arena) -> dict:
+    """
+    returns the changeable fields of the players to compare them after a turn
+    """
+
+    return {"hero": unit_state(arena.hero), "enemy": unit_state(arena.enemy)}
+
+
+def fight_state(arena: Arena) -> dict:
+    """
+    returns the full state of a fight
+    """
+
+    return {
+        "api": API_VERSION,
+        "version": arena.version,
+        "game_on": arena.is_game_on(),
+        "result": RESULTS[arena.result],
+        "hero": unit_info(arena.hero),
+        "enemy": unit_info(arena.enemy),
+    }
+
+
+def turn_delta(arena: Arena, base_version: int, before: dict) -> dict:
+    """
+    returns the turn events and the fields changed since the snapshot (before)
+    a client having the state of base_version gets the new version by applying the changes
+    """
+
+    after = snapshot(arena)
+    return {
+        "api": API_VERSION,
+        "base_version": base_version,
+        "version": arena.version,
+        "game_on": arena.is_game_on(),
+        "result": RESULTS[arena.result],
+        "events": arena.events if arena.version != base_version else [],
+        "changes": {
+            side: {
+                key: value
+                for key, value in values.items()
+                if before[side][key] != value
+            }
+            for side, values in after.items()
+        },
+    }
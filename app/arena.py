@@ -1,56 +1,178 @@
-""" Contains SingleTone and Arena"""
+"""Contains Arena and ArenaRegistry"""
 
 from __future__ import annotations
 
-from threading import Lock
-from typing import Dict, Any
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from random import Random, SystemRandom
+from threading import Condition, Lock
+from typing import Callable, Dict, Iterator, Optional, Protocol
 
-from app.unit import HumanPlayer, CompPlayer
-from app.const import STAMINA_RECOVER_PER_TURN
+from app.effects import EffectScheduler
+from app.unit import BaseUnit, HumanPlayer, CompPlayer
+from app.const import (
+    STAMINA_RECOVER_PER_TURN,
+    ARENA_REGISTRY_STRIPES,
+    AUTO_BATTLE_MAX_TURNS,
+    ARENA_TTL,
+    ARENA_MEMORY_BUDGET,
+    ARENA_SIZE,
+    ARENA_SWEEP_INTERVAL,
+    TURN_REQUESTS_KEEP,
+    TURN_REQUEST_SIZE,
+)
+from app.metrics import (
+    FIGHTS_STARTED,
+    FIGHTS_FINISHED,
+    TURN_DURATION,
+    ARENAS_EVICTED,
+    ARENAS_RESTORED,
+)
 
+# the players' actions codes in the fight log
+ATTACK, USE_SKILL, SKIP_TURN = 1, 2, 3
 
-class SingletonMeta(type):
-    """
-    Это потокобезопасная реализация класса Singleton.
-    """
+# the computer player's AI: chooses the enemy's action by the enemy, the hero and the stamina factor
+EnemyAI = Callable[[CompPlayer, HumanPlayer, float], int]
+
+# the auto battle policies: choose the player's action
+POLICIES: Dict[str, Callable[[HumanPlayer], int]] = {
+    "attack": lambda hero: ATTACK,  # always attack
+    # the skill as soon as affordable
+    "skill": lambda hero: USE_SKILL if hero.can_use_skill() else ATTACK,
+    "skip": lambda hero: SKIP_TURN,  # always skip the turn
+}
 
-    _instances: Dict[SingletonMeta, SingletonMeta] = {}
 
-    _lock: Lock = Lock()
+def new_seed() -> int:
     """
-    объект-блокировка для синхронизации потоков во время
-    первого доступа к Одиночке.
+    returns a random seed for a fight
     """
 
-    def __call__(cls, *args: Any, **kwargs: Any) -> SingletonMeta:
-        """
-        Данная реализация не учитывает возможное изменение передаваемых
-        аргументов в `__init__`.
-        """
-        with cls._lock:
-            if cls not in cls._instances:
-                instance = super().__call__(*args, **kwargs)
-                cls._instances[cls] = instance
-        return cls._instances[cls]
+    return SystemRandom().getrandbits(64)
 
 
-class Arena(metaclass=SingletonMeta):
+class Arena:  # pylint: disable=too-many-instance-attributes
     """
     provides interaction between players
+    every arena has its own random generator, the fight is reproducible
+    from the seed and the log of the player's actions (see app.replay)
     """
 
-    def __init__(self, stamina: float = STAMINA_RECOVER_PER_TURN):
+    def __init__(
+        self, stamina: float = STAMINA_RECOVER_PER_TURN, seed: Optional[int] = None
+    ):
         self.stamina = stamina
-        self.hero: HumanPlayer = NotImplemented
-        self.enemy: CompPlayer = NotImplemented
+        self.seed = new_seed() if seed is None else seed
+        self.log = bytearray()  # the player's actions, a byte per turn
+        self.rng = Random()
+        self._hero: HumanPlayer = NotImplemented
+        self._enemy: CompPlayer = NotImplemented
         self.game_on = False
+        self.result = ""  # the result of the finished fight
+        # the actions of the last turn (or of an auto battle)
+        self.events: list[dict] = []
+        # the enemy acts randomly if not set (see app.ai)
+        self.enemy_ai: Optional[EnemyAI] = None
+        # called when a fight is over (see app.history)
+        self.on_finish: Optional[Callable[[Arena], None]] = None
+        # the timed effects of the skills, fired at the health checks
+        self.effects = EffectScheduler()
+        # one turn at a time: double clicks and retried requests wait for each other
+        self.turn_lock = Lock()
+        # the responses (compact JSON) and the statuses of the last turn requests by id
+        self.done_turns: OrderedDict[str, tuple[bytes, int]] = OrderedDict()
+        self.done_turns_size = 0  # the estimated memory taken by done_turns
+
+    @property
+    def hero(self) -> HumanPlayer:
+        """
+        the human player
+        """
+
+        return self._hero
 
-    def start_game(self) -> None:
+    @hero.setter
+    def hero(self, unit: HumanPlayer) -> None:
+        if unit is not NotImplemented:
+            unit.rng = self.rng
+        self._hero = unit
+
+    @property
+    def enemy(self) -> CompPlayer:
+        """
+        the computer player
+        """
+
+        return self._enemy
+
+    @enemy.setter
+    def enemy(self, unit: CompPlayer) -> None:
+        if unit is not NotImplemented:
+            unit.rng = self.rng
+        self._enemy = unit
+
+    def start_game(self, seed: Optional[int] = None) -> None:
         """
         sets game_on to True to signal the game started
         being used to show correct messages during the game and to discard other game's instances
+        starts a new fight log with the seed (a random one by default)
         """
         self.game_on = True
+        self.seed = new_seed() if seed is None else seed
+        self.log.clear()
+        self.result = ""
+        self.events = []
+        self.effects.clear()
+        FIGHTS_STARTED.inc()
+
+    @property
+    def version(self) -> int:
+        """
+        the number of turns played, changes with every turn
+        """
+
+        return len(self.log)
+
+    def remember_turn(
+        self, request_id: str, response: bytes, status: int = 200
+    ) -> None:
+        """
+        keeps the response of a turn request to answer its repeats with it
+        (the last TURN_REQUESTS_KEEP requests are kept)
+        """
+
+        old = self.done_turns.pop(request_id, None)
+        if old is not None:
+            self.done_turns_size -= TURN_REQUEST_SIZE + len(request_id) + len(old[0])
+        self.done_turns[request_id] = response, status
+        self.done_turns_size += TURN_REQUEST_SIZE + len(request_id) + len(response)
+        while len(self.done_turns) > TURN_REQUESTS_KEEP:
+            request_id, (response, _) = self.done_turns.popitem(last=False)
+            self.done_turns_size -= TURN_REQUEST_SIZE + len(request_id) + len(response)
+
+    def log_action(self, action: int) -> None:
+        """
+        writes the player's action to the log and seeds the generator for the turn
+        the generator depends on the seed and the turn number only,
+        so the arena state is the seed and the log
+        """
+
+        self.rng.seed((len(self.log) << 64) | self.seed)
+        self.log.append(action)
+        self.events = []
+
+    def add_event(
+        self, unit: str, action: str, target: BaseUnit, target_health: float
+    ) -> None:
+        """
+        adds an action of a player to the turn events
+        target_health - the target's health before the action
+        """
+
+        damage = round(target.decode(target_health - target.health), 1)
+        self.events.append({"unit": unit, "action": action, "damage": damage})
 
     def is_game_on(self) -> bool:
         """
@@ -93,10 +215,17 @@ class Arena(metaclass=SingletonMeta):
                 return ""
             self.end_game()
             if (self.hero.health < 0.0) and (self.enemy.health < 0.0):
-                return "Ничья"
-            if self.enemy.health < 0.0:
-                return "Победил Игрок"
-            return "Победил Противник"
+                self.result = "Ничья"
+                FIGHTS_FINISHED.inc("draw")
+            elif self.enemy.health < 0.0:
+                self.result = "Победил Игрок"
+                FIGHTS_FINISHED.inc("win")
+            else:
+                self.result = "Победил Противник"
+                FIGHTS_FINISHED.inc("loss")
+            if self.on_finish is not None:
+                self.on_finish(self)
+            return self.result
         except AttributeError as error:
             raise NotImplementedError from error
 
@@ -106,11 +235,37 @@ class Arena(metaclass=SingletonMeta):
         :returns the actions results string
         """
 
+        res += self.effects.advance()
         if check_msg := self.check_health():
             return res + check_msg
         self.regenerate_stamina()
         return res
 
+    def enemy_turn(self) -> str:
+        """
+        to conduct the computer player's action: a random one or the one chosen by the AI
+        :returns the action results string
+        """
+
+        health, skill_used = self.hero.health, self.enemy.skill_used
+        if self.enemy.stunned:
+            res, action = self.enemy.skip_stunned(), "stunned"
+        elif self.enemy_ai is None:
+            res = self.enemy.attack_or_use_skill(self.hero)
+            action = "use_skill" if self.enemy.skill_used != skill_used else "attack"
+        else:
+            code = self.enemy_ai(self.enemy, self.hero, self.stamina)
+            if code == USE_SKILL:
+                res, action = self.enemy.use_skill(self.hero), "use_skill"
+            elif code == SKIP_TURN:
+                res, action = self.enemy.skip_turn(), "skip_turn"
+            else:
+                res, action = self.enemy.attack(self.hero), "attack"
+        if self.enemy.skill_used != skill_used:
+            res += self.effects.cast(self.enemy.unit_class.skill, self.enemy, self.hero)
+        self.add_event("enemy", action, self.hero, health)
+        return res
+
     def complete_turn(self, res: str) -> str:
         """
         completes the current turn
@@ -118,14 +273,17 @@ class Arena(metaclass=SingletonMeta):
         :returns the turn results string
         """
 
+        started = time.perf_counter()
         try:
             res = self.check_health_and_regenerate(res)
             if self.is_game_on():
-                res += self.enemy.attack_or_use_skill(self.hero)
+                res += self.enemy_turn()
                 return self.check_health_and_regenerate(res)
             return res
         except AttributeError as error:
             raise NotImplementedError from error
+        finally:
+            TURN_DURATION.observe(time.perf_counter() - started)
 
     def attack(self) -> str:
         """
@@ -135,8 +293,13 @@ class Arena(metaclass=SingletonMeta):
 
         if not self.game_on:
             return self.end_game()
+        self.log_action(ATTACK)
         try:
+            if self.hero.stunned:
+                return self.stunned_turn()
+            health = self.enemy.health
             res = self.hero.attack(self.enemy)
+            self.add_event("hero", "attack", self.enemy, health)
         except AttributeError as error:
             raise NotImplementedError from error
         return self.complete_turn(res)
@@ -149,16 +312,405 @@ class Arena(metaclass=SingletonMeta):
 
         if not self.is_game_on():
             return self.end_game()
+        self.log_action(USE_SKILL)
         try:
+            if self.hero.stunned:
+                return self.stunned_turn()
+            health, skill_used = self.enemy.health, self.hero.skill_used
             res = self.hero.use_skill(self.enemy)
+            if self.hero.skill_used != skill_used:
+                res += self.effects.cast(
+                    self.hero.unit_class.skill, self.hero, self.enemy
+                )
+            self.add_event("hero", "use_skill", self.enemy, health)
         except AttributeError as error:
             raise NotImplementedError from error
         return self.complete_turn(res)
 
+    def stunned_turn(self) -> str:
+        """
+        to skip the stunned player's action (whatever was chosen) and complete the turn
+        :returns the turn results string
+        """
+
+        self.events.append({"unit": "hero", "action": "stunned", "damage": 0.0})
+        return self.complete_turn(self.hero.skip_stunned())
+
     def skip_turn(self) -> str:
         """
         to apply the player's skip turn and do all the steps to complete the turn
         :returns the skip turn results string
         """
 
+        if self.is_game_on():
+            self.log_action(SKIP_TURN)
+            self.events.append({"unit": "hero", "action": "skip_turn", "damage": 0.0})
         return self.complete_turn("")
+
+    def auto_battle(self, policy: str = "attack", turns: Optional[int] = None) -> int:
+        """
+        plays the turns (or the whole fight) choosing the player's actions with the policy,
+        the events of all the turns played are kept in events
+        :returns the number of turns played
+        """
+
+        choose_action = POLICIES[policy]
+        actions = {
+            ATTACK: self.attack,
+            USE_SKILL: self.use_skill,
+            SKIP_TURN: self.skip_turn,
+        }
+        limit = (
+            AUTO_BATTLE_MAX_TURNS
+            if turns is None
+            else min(turns, AUTO_BATTLE_MAX_TURNS)
+        )
+        played = 0
+        events: list[dict] = []
+        while played < limit and self.is_game_on():
+            actions[choose_action(self.hero)]()
+            played += 1
+            events += self.events
+        self.events = events
+        return played
+
+
+class StaleArenaError(Exception):
+    """
+    the arena was saved by another request since it was read (see
+    app.storage.SqliteArenaStore.save())
+    """
+
+
+class ArenaSpill(Protocol):
+    """
+    a store the arenas evicted from the memory are spilled to (e.g. app.storage.SqliteArenaStore)
+    """
+
+    def get(self, session_id: str) -> Arena:
+        """
+        returns the spilled arena of the session
+        """
+
+    def save(self, session_id: str, arena: Arena) -> None:
+        """
+        spills the arena of the session
+        """
+
+    def remove(self, session_id: str) -> None:
+        """
+        removes the spilled arena of the session
+        """
+
+    def __contains__(self, session_id: str) -> bool:
+        """
+        whether an arena of the session is spilled
+        """
+
+
+def arena_size(arena: Arena) -> int:
+    """
+    estimates the memory taken by the arena, in bytes
+    """
+
+    return ARENA_SIZE + len(arena.log) + arena.done_turns_size
+
+
+class _Entry:  # pylint: disable=too-few-public-methods
+    """
+    an arena kept by the registry, when it was used last, its estimated size
+    and the number of the requests using it (got and not saved yet)
+    """
+
+    __slots__ = ("arena", "touched", "size", "users")
+
+    def __init__(self, arena: Arena, touched: float, users: int = 0):
+        self.arena = arena
+        self.touched = touched
+        self.size = arena_size(arena)
+        self.users = users
+
+    def in_use(self) -> bool:
+        """
+        whether a request uses the arena (it is not evicted then, or the request's changes are lost)
+        """
+
+        return self.users > 0 or self.arena.turn_lock.locked()
+
+
+class _Stripe:  # pylint: disable=too-few-public-methods
+    """
+    a part of the registry with its own lock, keeps the arenas in the order they were used (LRU)
+    """
+
+    def __init__(self) -> None:
+        self.entries: OrderedDict[str, _Entry] = OrderedDict()
+        self.size = 0  # the estimated memory taken by the arenas
+        self.lock = Lock()
+        # the sessions which spilled copy is written (the evicted arena) or read or removed
+        # (None); the spill store is used out of the lock, the other requests of such
+        # a session wait for moved
+        self.spilling: dict[str, Optional[Arena]] = {}
+        self.moved = Condition(self.lock)
+
+
+class ArenaRegistry:
+    """
+    stores an arena per session (a player's browser)
+    the sessions are spread over stripes, each stripe has its own lock,
+    so players creating arenas at the same time don't wait for each other
+
+    the arenas idle for longer than ttl expire, the least recently used ones are evicted
+    when the stripe takes more than its share of the memory budget (the arenas in use are kept);
+    the evicted fights which are on are spilled (if there is a spill store) and
+    restored on the next request,
+    the spill store is read and written out of the stripe's lock
+    """
+
+    def __init__(
+        self,
+        stripes: int = ARENA_REGISTRY_STRIPES,
+        ttl: float = ARENA_TTL,
+        budget: int = ARENA_MEMORY_BUDGET,
+        spill: Optional[ArenaSpill] = None,
+    ):
+        self.ttl = ttl
+        self.stripe_budget = budget // stripes
+        self.spill = spill
+        self._stripes = [_Stripe() for _ in range(stripes)]
+        self._spill_lock = Lock()
+        self._next_sweep = time.monotonic() + ARENA_SWEEP_INTERVAL
+
+    def _get_stripe(self, session_id: str) -> _Stripe:
+        return self._stripes[hash(session_id) % len(self._stripes)]
+
+    def get(self, session_id: str) -> Arena:
+        """
+        returns the arena of the session: the kept one, the spilled one or a new one
+        the arena is in use (kept in the memory) until it is saved
+        """
+
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + ARENA_SWEEP_INTERVAL
+            self.sweep(now)
+        stripe = self._get_stripe(session_id)
+        with stripe.lock:
+            arena = self._take(stripe, session_id, now)
+            if arena is not None:
+                return arena
+            if self.spill is not None:
+                stripe.spilling[session_id] = None
+        restored = None
+        if self.spill is not None:
+            with self._using_spill(stripe, session_id):
+                if session_id in self.spill:
+                    restored = self.spill.get(session_id)
+                    self.spill.remove(session_id)
+                    ARENAS_RESTORED.inc()
+        with stripe.lock:
+            if self.spill is not None:
+                self._release(stripe, session_id)
+            arena = Arena() if restored is None else restored
+            spills = self._put(stripe, session_id, _Entry(arena, now, users=1))
+        self._spill(stripe, spills)
+        return arena
+
+    def save(self, session_id: str, arena: Arena) -> None:
+        """
+        marks the arena as used and updates its size (the arenas are changed in place);
+        puts it back if it was removed while the request used it
+        """
+
+        now = time.monotonic()
+        stripe = self._get_stripe(session_id)
+        with stripe.lock:
+            entry = stripe.entries.get(session_id)
+            kept = entry is not None and entry.arena is arena
+            spills = []
+            if entry is not None and kept:
+                size = arena_size(arena)
+                stripe.size += size - entry.size
+                entry.size = size
+                entry.touched = now
+                entry.users = max(entry.users - 1, 0)
+                stripe.entries.move_to_end(session_id)
+                spills = self._evict(stripe, now)
+            elif self.spill is not None:
+                while session_id in stripe.spilling:
+                    stripe.moved.wait()
+                stripe.spilling[session_id] = None
+        if not kept:
+            if self.spill is not None:
+                with self._using_spill(stripe, session_id):
+                    # the spilled copy (if any) is older than the arena
+                    self.spill.remove(session_id)
+            with stripe.lock:
+                if self.spill is not None:
+                    self._release(stripe, session_id)
+                spills = self._put(stripe, session_id, _Entry(arena, now))
+        self._spill(stripe, spills)
+
+    def remove(self, session_id: str) -> None:
+        """
+        removes the arena of the session
+        """
+
+        stripe = self._get_stripe(session_id)
+        with stripe.lock:
+            entry = stripe.entries.pop(session_id, None)
+            if entry is not None:
+                stripe.size -= entry.size
+
+    def sweep(self, now: Optional[float] = None) -> None:
+        """
+        removes the expired arenas of all the stripes
+        (the stripes are swept on use too, this catches the ones nobody uses)
+        """
+
+        now = time.monotonic() if now is None else now
+        for stripe in self._stripes:
+            with stripe.lock:
+                spills = self._evict(stripe, now)
+            self._spill(stripe, spills)
+
+    @staticmethod
+    def _take(stripe: _Stripe, session_id: str, now: float) -> Optional[Arena]:
+        """
+        returns the kept arena of the session marked as in use (an arena being spilled
+        is taken back),
+        None if there is none; waits while the spilled copy of the session is read or removed
+        (called with the stripe's lock)
+        """
+
+        while True:
+            entry = stripe.entries.get(session_id)
+            if entry is not None:
+                entry.touched = now
+                entry.users += 1
+                stripe.entries.move_to_end(session_id)
+                return entry.arena
+            if session_id not in stripe.spilling:
+                return None
+            arena = stripe.spilling[session_id]
+            if arena is None:
+                stripe.moved.wait()
+                continue
+            # the spilled copy is removed once it is written
+            stripe.spilling[session_id] = None
+            entry = stripe.entries[session_id] = _Entry(arena, now)
+            stripe.size += entry.size
+
+    @staticmethod
+    def _release(stripe: _Stripe, session_id: str) -> None:
+        """
+        the spill store is done with the session (called with the stripe's lock)
+        """
+
+        del stripe.spilling[session_id]
+        stripe.moved.notify_all()
+
+    @contextmanager
+    def _using_spill(self, stripe: _Stripe, session_id: str) -> Iterator[None]:
+        """
+        uses the spill store for a session in spilling: the requests of the worker use
+        it one at a time,
+        so the threads don't pile up on the database lock;
+        if the store fails, the session is released (an arena which wasn't written is
+        kept in the memory)
+        """
+
+        try:
+            with self._spill_lock:
+                yield
+        except Exception:
+            with stripe.lock:
+                arena = stripe.spilling[session_id]
+                if arena is not None and session_id not in stripe.entries:
+                    entry = stripe.entries[session_id] = _Entry(arena, time.monotonic())
+                    stripe.size += entry.size
+                self._release(stripe, session_id)
+            raise
+
+    def _put(
+        self, stripe: _Stripe, session_id: str, entry: _Entry
+    ) -> list[tuple[str, Arena]]:
+        old = stripe.entries.pop(session_id, None)
+        if old is not None:
+            stripe.size -= old.size
+        stripe.entries[session_id] = entry
+        stripe.size += entry.size
+        return self._evict(stripe, entry.touched)
+
+    def _evict(self, stripe: _Stripe, now: float) -> list[tuple[str, Arena]]:
+        """
+        removes the expired arenas and the least recently used ones over the budget
+        (the most recently used arena and the arenas in use are kept)
+        :returns the evicted arenas to spill with _spill() out of the stripe's lock
+        """
+
+        deadline = now - self.ttl
+        evicted = []
+        size, count = stripe.size, len(stripe.entries)
+        for session_id, entry in stripe.entries.items():
+            if entry.touched < deadline:
+                reason = "expired"
+            elif size > self.stripe_budget and count > 1:
+                reason = "memory"
+            else:
+                break
+            if entry.in_use() or session_id in stripe.spilling:
+                continue
+            evicted.append((session_id, entry, reason))
+            size -= entry.size
+            count -= 1
+        spills = []
+        for session_id, entry, reason in evicted:
+            del stripe.entries[session_id]
+            stripe.size -= entry.size
+            ARENAS_EVICTED.inc(reason)
+            if (
+                reason == "memory"
+                and self.spill is not None
+                and entry.arena.is_game_on()
+            ):
+                stripe.spilling[session_id] = entry.arena
+                spills.append((session_id, entry.arena))
+        return spills
+
+    def _spill(self, stripe: _Stripe, spills: list[tuple[str, Arena]]) -> None:
+        """
+        writes the evicted arenas to the spill store
+        (the copy of an arena a request took back meanwhile is removed)
+        """
+
+        if self.spill is None:
+            return
+        for session_id, arena in spills:
+            with self._using_spill(stripe, session_id):
+                try:
+                    self.spill.save(session_id, arena)
+                except StaleArenaError:
+                    pass  # a newer copy of the arena is spilled
+            with stripe.lock:
+                if stripe.spilling[session_id] is arena:
+                    self._release(stripe, session_id)
+                    continue
+            with self._using_spill(stripe, session_id):
+                self.spill.remove(session_id)
+            with stripe.lock:
+                self._release(stripe, session_id)
+
+    @property
+    def memory(self) -> int:
+        """
+        the estimated memory taken by the arenas, in bytes
+        """
+
+        return sum(stripe.size for stripe in self._stripes)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._get_stripe(session_id).entries
+
+    def __len__(self) -> int:
+        return sum(len(stripe.entries) for stripe in self._stripes)
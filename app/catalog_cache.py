@@ -0,0 +1,59 @@
+"""
+This module contains a cache of the validated data files:
+a file is validated once, the result is kept in a compact binary file (marshal)
+named after the hash of the source file, so the workers starting later load it without validation
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import marshal
+import os
+from typing import Callable
+
+from app.const import CATALOG_CACHE_DIR, CATALOG_CACHE_VERSION
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR_WITH_PATH = os.path.join(BASE_DIR, CATALOG_CACHE_DIR)
+
+
+def load_cached(
+    file_name: str, parse: Callable[[bytes], dict], cache_dir: str = CACHE_DIR_WITH_PATH
+) -> dict:
+    """
+    returns the parsed data of the file: from the cache if the file hasn't changed,
+    parses it otherwise
+    parse - validates the file content, returns the data as plain dicts, lists, strings and numbers
+    """
+
+    with open(file_name, "rb") as file_handler:
+        raw = file_handler.read()
+    prefix = os.path.basename(file_name) + "."
+    cache_file = os.path.join(
+        cache_dir,
+        f"{prefix}{hashlib.sha256(raw).hexdigest()[:16]}"
+        f".{CATALOG_CACHE_VERSION}.{marshal.version}.bin",
+    )
+    try:
+        with open(cache_file, "rb") as file_handler:
+            return marshal.load(file_handler)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass  # no cache yet or a broken one
+
+    data = parse(raw)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_file = f"{cache_file}.{os.getpid()}"
+        with open(temp_file, "wb") as file_handler:
+            marshal.dump(data, file_handler)
+        # the other workers see the whole file or none
+        os.replace(temp_file, cache_file)
+        for entry in os.scandir(cache_dir):
+            if entry.name.startswith(prefix) and entry.path != cache_file:
+                # removed by another worker
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(entry.path)  # the caches of the old versions of the file
+    except OSError as error:
+        print("Can't write the data file cache:", error)
+    return data
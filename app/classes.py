@@ -3,18 +3,26 @@ This module contains classes for heroes' types (to not confuse with python class
 1. ProUnitClass - a parent dataclass to get it easy (using all benefits of dataclasses
 2. MetaUnitClass - a meta class to implement a list of instances of the class
 3. UnitClass - a base class to build heroes' types
+The heroes' types and their skills are loaded from a JSON file (validated by app.schemas)
 """
 
 from __future__ import annotations
 
+import os
+import sys
 from dataclasses import dataclass
 from typing import Generator, Any
 
+from app.catalog_cache import load_cached
+from app.const import CLASSES_FILE
 from app.skills import ConcreteSkill
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CLASSES_FILE_WITH_PATH = os.path.join(BASE_DIR, CLASSES_FILE)
 
-@dataclass
-class ProUnitClass:
+
+@dataclass(frozen=True)
+class ProUnitClass:  # pylint: disable=too-many-instance-attributes
     """
     A predecessor for the heroes' base class
     """
@@ -26,6 +34,7 @@ class ProUnitClass:
     stamina_mod: float  # модификатор выносливости
     armor: float  # модификатор защиты
     skill: ConcreteSkill = NotImplemented
+    id: int = 0
 
     def get_stamina_mod(self) -> float:
         """
@@ -53,9 +62,13 @@ class ProUnitClass:
 class MetaUnitClass(type):
     """
     A metaclass to provide child classes with iteration and length calculation
+    and to index the instances by name and id
     """
 
     instances: list[UnitClass] = []
+    by_name: dict[str, UnitClass] = {}
+    by_id: dict[int, UnitClass] = {}
+    names: tuple[str, ...] = ()
 
     def __getitem__(cls, index: int) -> ProUnitClass:
         return cls.instances[index]
@@ -74,15 +87,20 @@ class UnitClass(ProUnitClass, metaclass=MetaUnitClass):
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
+        if self.name in self.__class__.by_name or self.id in self.__class__.by_id:
+            raise ValueError(f"Duplicate hero class: {self.id} {self.name}")
         self.__class__.instances.append(self)
+        self.__class__.by_name[self.name] = self
+        self.__class__.by_id[self.id] = self
+        self.__class__.names = self.__class__.names + (self.name,)
 
     @classmethod
-    def get_unit_names(cls) -> list[str]:
+    def get_unit_names(cls) -> tuple[str, ...]:
         """
         To get a list of the class instances' names
         """
 
-        return [instance.name for instance in cls.instances]
+        return cls.names
 
     @classmethod
     def get_unit_by_name(cls, name: str) -> UnitClass:
@@ -90,44 +108,54 @@ class UnitClass(ProUnitClass, metaclass=MetaUnitClass):
         To get a instance with the specified name
         """
 
-        for instance in cls.instances:
-            if instance.name == name:
-                return instance
-        return NotImplemented
+        return cls.by_name.get(name, NotImplemented)
+
+    @classmethod
+    def get_unit_by_id(cls, unit_id: int) -> UnitClass:
+        """
+        To get a instance with the specified id
+        """
+
+        return cls.by_id.get(unit_id, NotImplemented)
+
+
+skills_by_name: dict[str, ConcreteSkill] = {}
+skills_by_id: dict[int, ConcreteSkill] = {}
+
+
+def _parse(raw: bytes) -> dict:
+    # pydantic is imported if there is no valid cache only
+    from app.schemas import parse_classes  # pylint: disable=import-outside-toplevel
+
+    return parse_classes(raw)
+
+
+def load_unit_classes(file_name: str = CLASSES_FILE_WITH_PATH) -> None:
+    """
+    loads the skills and the heroes' types from a JSON file
+    """
+
+    try:
+        data = load_cached(file_name, _parse)
+        for skill_data in data["skills"]:
+            skill = ConcreteSkill(**skill_data)
+            if skill.name in skills_by_name or skill.id in skills_by_id:
+                raise ValueError(f"Duplicate skill: {skill.id} {skill.name}")
+            skills_by_name[skill.name] = skills_by_id[skill.id] = skill
+        for class_data in data["classes"]:
+            if class_data["skill"] not in skills_by_id:
+                raise ValueError(
+                    f"Unknown skill {class_data['skill']} of {class_data['name']}"
+                )
+            UnitClass(**{**class_data, "skill": skills_by_id[class_data["skill"]]})
+    except FileNotFoundError as error:
+        print(error)
+        sys.exit(1)
+    except (TypeError, AttributeError, ValueError) as error:
+        print("Error while parsing the JSON file:", error)
+        sys.exit(1)
 
 
 # heroes types (classes) implementation ---------------------------------------------
 
-ferocious_kick = ConcreteSkill(name="Свирепый пинок", damage=12.0, required_stamina=6.0)
-stiff_shot = ConcreteSkill(name="Мощный укол", damage=15.0, required_stamina=5.0)
-tickling = ConcreteSkill(name="Щекотка", damage=5.0, required_stamina=3.0)
-
-warrior = UnitClass(
-    name="Воин",
-    max_health=60.0,
-    max_stamina=30.0,
-    attack=0.8,
-    stamina_mod=0.9,
-    armor=1.2,
-    skill=stiff_shot,
-)
-
-ranger = UnitClass(
-    name="Рейнджер",
-    max_health=60.0,
-    max_stamina=30.0,
-    attack=0.8,
-    stamina_mod=0.9,
-    armor=1.2,
-    skill=ferocious_kick,
-)
-
-thief = UnitClass(
-    name="Вор",
-    max_health=50.0,
-    max_stamina=25.0,
-    attack=1.5,
-    stamina_mod=1.2,
-    armor=1.0,
-    skill=tickling,
-)
+load_unit_classes()
@@ -1,4 +1,36 @@
 """This module contains constants for the application"""
 
 EQUIPMENT_FILE = "data/equipment.json"
+EQUIPMENT_RELOAD_INTERVAL = 1.0  # how often the equipment file is checked, in seconds
+CLASSES_FILE = "data/classes.json"
 STAMINA_RECOVER_PER_TURN = 2
+ARENA_REGISTRY_STRIPES = 64  # number of locks the arenas are spread over
+ARENA_TTL = 30 * 60  # an arena idle for this number of seconds is removed
+ARENA_MEMORY_BUDGET = 256 * 2**20  # the memory the arenas of a worker may take, bytes
+ARENA_SIZE = 3500  # the memory of an arena without its log, bytes (by tracemalloc)
+ARENA_SWEEP_INTERVAL = 60  # how often all the arenas are checked to expire, seconds
+SIMULATION_MAX_TURNS = 500  # fights not finished in this number of turns are unfinished
+TOURNAMENT_CACHE_FILE = "tournament_cache.csv"  # the matchups, see app.tournament
+STREAM_KEEP_ALIVE = 15  # seconds between the keep-alives of an idle fight stream
+STREAM_MAX_OPEN = 32  # the streams a worker holds (a thread each, keep under --threads)
+TURN_REQUESTS_KEEP = 32  # the last turn requests ids an arena remembers for the repeats
+TURN_REQUEST_SIZE = 160  # a remembered turn but its id and response takes, bytes
+REQUEST_ID_HEADER = "Idempotency-Key"  # the header with the id of a turn request
+TURN_SAVE_ATTEMPTS = 10  # a turn is made again if another request saved the arena
+REQUEST_ID_MAX_LENGTH = 64  # the longer ids are rejected (they are kept with the arena)
+AUTO_BATTLE_MAX_TURNS = 500  # the max number of turns played by an auto battle request
+AI_SEARCH_DEPTH = 2  # the computer player's AI looks this number of turns ahead
+AI_DAMAGE_BUCKETS = 4  # the damage values the AI considers per attack
+AI_CACHE_SIZE = 100_000  # the max number of states in the AI transposition table
+AI_POLICY_DIR = "policies"  # the precomputed AI policy tables, see app.ai
+ODDS_CACHE_FILE = "odds_cache.csv"  # the calculated matchup odds, see app.odds
+ODDS_WORKERS = 1  # the threads calculating the odds shown when choosing the enemy
+ODDS_BOARD_SIZE = 4096  # the max number of the matchups odds kept in memory
+PROFILE_HEADER = "X-Profile"  # the header to profile a request ("1"), see app.profiling
+PROFILE_KEEP = 100  # the number of the last request profiles to keep
+HISTORY_FILE = "history.db"  # the finished fights and the leaderboard, see app.history
+HISTORY_BATCH_SIZE = 256  # the max number of the finished fights written at once
+HISTORY_FLUSH_INTERVAL = 1.0  # the max wait of a finished fight to be written, seconds
+HISTORY_CACHE_TTL = 5.0  # how long the leaderboard and the class win rates are cached
+CATALOG_CACHE_DIR = "data/.cache"  # the validated data files, see app.catalog_cache
+CATALOG_CACHE_VERSION = 2  # changes with the schemas (app.schemas), older caches unused
@@ -0,0 +1,238 @@
+"""
+This module contains the timed effects of the skills (damage over time, armor and stamina
+buffs and debuffs, stuns) and their scheduler:
+the effects of a fight are kept in a heap by the step of their next tick, so applying,
+ticking and expiring an effect costs O(log n) however many effects are active
+
+the scheduler's clock is the number of the health checks passed
+(Arena.check_health_and_regenerate(),
+two per turn: after the player's action and after the enemy's one); an effect ticks a turn after
+it is cast, and then every turn, the given number of times, and expires with its last tick
+"""
+
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Any, Callable, Iterator, Protocol
+
+from app.skills import EXHAUST, FORTIFY, INVIGORATE, POISON, STUN, WEAKEN, Skill
+
+STEPS_PER_TURN = 2  # the health checks per turn
+ON_CASTER = (FORTIFY, INVIGORATE)  # the buffs, the other effects are cast on the target
+
+
+class EffectTarget(Protocol):
+    """
+    a unit the effects are applied to (a BaseUnit, or a unit of a squad, see app.team)
+    the values are in the unit's inner representation (see BaseUnit.encode())
+    """
+
+    health: float
+    stamina: float
+    armor_bonus: float
+    stunned: int
+
+    @property
+    def name(self) -> str:
+        """
+        the unit's name
+        """
+
+    def encode(self, value: float) -> float:
+        """
+        converts a value to the unit's inner representation
+        """
+
+    def decode(self, value: float) -> float:
+        """
+        converts a value from the unit's inner representation
+        """
+
+    def get_damage(self, damage: float) -> None:
+        """
+        takes the damage
+        """
+
+
+@dataclass(eq=False)
+class Effect:
+    """
+    an effect cast on a unit: ticks_left more ticks, the next one at the due step
+    """
+
+    name: str  # the skill's name
+    kind: str
+    power: float
+    target: Any = field(repr=False)  # an EffectTarget
+    ticks_left: int
+    due: int = 0
+
+
+def _poison(effect: Effect) -> str:
+    target = effect.target
+    damage = target.encode(effect.power)
+    target.get_damage(damage)
+    return f"{target.name} получает {target.decode(damage)} урона от «{effect.name}». "
+
+
+def _fortify(effect: Effect, sign: int = 1) -> str:
+    effect.target.armor_bonus += sign * effect.target.encode(effect.power)
+    return ""
+
+
+def _weaken(effect: Effect, sign: int = 1) -> str:
+    effect.target.armor_bonus -= sign * effect.target.encode(effect.power)
+    return ""
+
+
+def _invigorate(effect: Effect) -> str:
+    effect.target.stamina += effect.target.encode(effect.power)
+    return ""
+
+
+def _exhaust(effect: Effect) -> str:
+    target = effect.target
+    target.stamina = max(target.stamina - target.encode(effect.power), 0)
+    return ""
+
+
+def _stun(effect: Effect, sign: int = 1) -> str:
+    effect.target.stunned += sign
+    return ""
+
+
+def _nothing(_effect: Effect) -> str:
+    return ""
+
+
+# what an effect does when it is cast, on every tick and when it expires
+ON_APPLY: dict[str, Callable[[Effect], str]] = {
+    FORTIFY: _fortify,
+    WEAKEN: _weaken,
+    STUN: _stun,
+}
+ON_TICK: dict[str, Callable[[Effect], str]] = {
+    POISON: _poison,
+    INVIGORATE: _invigorate,
+    EXHAUST: _exhaust,
+}
+ON_EXPIRE: dict[str, Callable[[Effect], str]] = {
+    FORTIFY: lambda effect: _fortify(effect, -1),
+    WEAKEN: lambda effect: _weaken(effect, -1),
+    STUN: lambda effect: _stun(effect, -1),
+}
+
+
+class EffectScheduler:
+    """
+    the active effects of a fight in a heap by their next tick
+    """
+
+    def __init__(self) -> None:
+        self.now = 0  # the health checks passed
+        self._heap: list[tuple[int, int, Effect]] = []
+        # to keep the effects due at the same step in the order they were cast
+        self._order = count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __iter__(self) -> Iterator[Effect]:
+        return (effect for _, _, effect in self._heap)
+
+    def apply(self, effect: Effect) -> str:
+        """
+        casts the effect (unless its due step is set, e.g. a restored one, it ticks a turn later)
+        :returns the effect's message
+        """
+
+        if not effect.due:
+            effect.due = self.now + STEPS_PER_TURN
+        heapq.heappush(self._heap, (effect.due, next(self._order), effect))
+        return ON_APPLY.get(effect.kind, _nothing)(effect)
+
+    def cast(self, skill: Skill, caster: EffectTarget, target: EffectTarget) -> str:
+        """
+        casts the effect of the skill (if it has one) on the caster or on the target by its kind
+        :returns the effect's message
+        """
+
+        if not skill.effect:
+            return ""
+        recipient = caster if skill.effect in ON_CASTER else target
+        self.apply(
+            Effect(skill.name, skill.effect, skill.power, recipient, skill.duration)
+        )
+        return f"«{skill.name}» действует на {recipient.name} {skill.duration} ход(а). "
+
+    def advance(self) -> str:
+        """
+        moves the clock a step: ticks the effects due, expires the ones with no ticks left
+        :returns the effects' messages
+        """
+
+        self.now += 1
+        messages = ""
+        heap = self._heap
+        while heap and heap[0][0] <= self.now:
+            effect = heap[0][2]
+            messages += ON_TICK.get(effect.kind, _nothing)(effect)
+            effect.ticks_left -= 1
+            if effect.ticks_left > 0:
+                effect.due += STEPS_PER_TURN
+                heapq.heapreplace(heap, (effect.due, next(self._order), effect))
+            else:
+                heapq.heappop(heap)
+                messages += ON_EXPIRE.get(effect.kind, _nothing)(effect)
+        return messages
+
+    def clear(self) -> None:
+        """
+        removes all the effects (a new fight)
+        """
+
+        self.now = 0
+        self._heap.clear()
+
+
+# for debug only
+if __name__ == "__main__":
+    import time
+
+    from app.classes import UnitClass
+    from app.equipment import Equipment
+    from app.unit import HumanPlayer
+
+    equipment = Equipment()
+    unit_class = UnitClass.get_unit_by_name("Воин")
+    units = [
+        HumanPlayer(
+            f"Воин {number}",
+            unit_class,
+            1e9,
+            unit_class.max_stamina,
+            _weapon=equipment.get_weapon("ножик"),
+            _armor=equipment.get_armor("панцирь"),
+        )
+        for number in range(1000)
+    ]
+    skills = [
+        Skill("Яд", 0.0, 0.0, effect=POISON, duration=5, power=1.5),
+        Skill("Щит", 0.0, 0.0, effect=FORTIFY, duration=3, power=1.0),
+        Skill("Оглушение", 0.0, 0.0, effect=STUN, duration=1, power=0.0),
+    ]
+    scheduler = EffectScheduler()
+    started = time.perf_counter()
+    for step in range(100):
+        for number in range(0, len(units), 2):
+            scheduler.cast(
+                skills[(step + number) % len(skills)], units[number], units[number + 1]
+            )
+        scheduler.advance()
+    spent = time.perf_counter() - started
+    print(
+        f"{len(scheduler)} effects active, {spent / 100 * 1000:.2f} ms per step with 500 casts"
+    )
+    print(units[1])
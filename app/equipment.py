@@ -2,10 +2,12 @@
 
 import sys
 import os
-import json
-from pydantic.dataclasses import dataclass
+import time
+from dataclasses import dataclass
+from threading import Lock
 
-from app.const import EQUIPMENT_FILE
+from app.catalog_cache import load_cached
+from app.const import EQUIPMENT_FILE, EQUIPMENT_RELOAD_INTERVAL
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 EQUIPMENT_FILE_WITH_PATH = os.path.join(BASE_DIR, EQUIPMENT_FILE)
@@ -39,70 +41,162 @@ class Armor:
 @dataclass
 class EquipmentData:
     """
-    to store the parsed equipment data
+    to store the parsed equipment data (validated by app.schemas)
     """
 
     weapons: list[Weapon]
     armors: list[Armor]
 
 
+class Catalog:  # pylint: disable=too-many-instance-attributes,too-few-public-methods
+    """
+    an immutable snapshot of the equipment file with the indexes to look up items
+    """
+
+    def __init__(self, data: EquipmentData, version: int, mtime: int):
+        self.data = data
+        self.version = version
+        self.mtime = mtime
+        self.weapons_by_name = {weapon.name: weapon for weapon in data.weapons}
+        self.weapons_by_id = {weapon.id: weapon for weapon in data.weapons}
+        self.armors_by_name = {armor.name: armor for armor in data.armors}
+        self.armors_by_id = {armor.id: armor for armor in data.armors}
+        self.weapon_names = tuple(weapon.name for weapon in data.weapons)
+        self.armor_names = tuple(armor.name for armor in data.armors)
+
+
 class Equipment:
     """
     to get data from a JSON file and store in an object
     to interact with a character
+    the file is reloaded when it changes (replace it atomically, e.g. with mv)
     """
 
-    def __init__(self, file_name: str = EQUIPMENT_FILE_WITH_PATH):
+    def __init__(
+        self,
+        file_name: str = EQUIPMENT_FILE_WITH_PATH,
+        reload_interval: float = EQUIPMENT_RELOAD_INTERVAL,
+    ):
+        self.file_name = file_name
+        # how often to check the file, in seconds
+        self.reload_interval = reload_interval
+        self._reload_lock = Lock()
+        self._checked_at = time.monotonic()
+        self._failed_mtime = 0  # the mtime of the file version failed to load
         try:
-            self.equipment: EquipmentData = EquipmentData(**self._read_json(file_name))
+            self._catalog = self._load_catalog(version=1)
+        except FileNotFoundError as error:
+            print(error)
+            sys.exit(1)
         except (TypeError, AttributeError) as error:
             print("Error while parsing the JSON file:", error)
             # raise ValueError
             sys.exit(1)
 
     @staticmethod
-    def _read_json(file_name: str) -> dict:
-        try:
-            with open(file_name, "r", encoding="utf-8") as file_handler:
-                data = json.load(file_handler)
-        except FileNotFoundError as error:
-            print(error)
-            sys.exit(1)
-        return data
+    def _parse(raw: bytes) -> dict:
+        # pydantic is imported if there is no valid cache only
+        # pylint: disable-next=import-outside-toplevel
+        from app.schemas import parse_equipment
+
+        return parse_equipment(raw)
+
+    def _load_catalog(self, version: int) -> Catalog:
+        mtime = os.stat(self.file_name).st_mtime_ns
+        data = load_cached(self.file_name, self._parse)
+        return Catalog(
+            EquipmentData(
+                weapons=[Weapon(**weapon) for weapon in data["weapons"]],
+                armors=[Armor(**armor) for armor in data["armors"]],
+            ),
+            version,
+            mtime,
+        )
+
+    @property
+    def catalog(self) -> Catalog:
+        """
+        returns the current catalog, reloads the file if it has been changed
+        the requests being served keep the catalog they've got,
+        the reload is done by one thread, the others don't wait for it
+        """
+
+        if time.monotonic() - self._checked_at < self.reload_interval:
+            return self._catalog
+        # a non-blocking acquire can't be a with block, the lock is released in the finally below
+        # pylint: disable-next=consider-using-with
+        if self._reload_lock.acquire(blocking=False):
+            try:
+                self._checked_at = time.monotonic()
+                mtime = os.stat(self.file_name).st_mtime_ns
+                if mtime not in (self._catalog.mtime, self._failed_mtime):
+                    self._failed_mtime = mtime
+                    self._catalog = self._load_catalog(self._catalog.version + 1)
+            except (OSError, TypeError, AttributeError, ValueError) as error:
+                print(
+                    "Error while reloading the JSON file, the old one is used:", error
+                )
+            finally:
+                self._reload_lock.release()
+        return self._catalog
+
+    @property
+    def equipment(self) -> EquipmentData:
+        """
+        the parsed equipment data
+        """
+
+        return self.catalog.data
+
+    @property
+    def version(self) -> int:
+        """
+        the catalog version, incremented on every reload
+        """
+
+        return self.catalog.version
 
     def get_weapon(self, weapon_name: str) -> Weapon:
         """
         returns a weapon with the specified name
         """
 
-        for weapon in self.equipment.weapons:
-            if weapon.name == weapon_name:
-                return weapon
-        return NotImplemented
+        return self.catalog.weapons_by_name.get(weapon_name, NotImplemented)
 
     def get_armor(self, armor_name: str) -> Armor:
         """
         returns an armor with the specified name
         """
 
-        for armor in self.equipment.armors:
-            if armor.name == armor_name:
-                return armor
-        return NotImplemented
+        return self.catalog.armors_by_name.get(armor_name, NotImplemented)
+
+    def get_weapon_by_id(self, weapon_id: int) -> Weapon:
+        """
+        returns a weapon with the specified id
+        """
+
+        return self.catalog.weapons_by_id.get(weapon_id, NotImplemented)
+
+    def get_armor_by_id(self, armor_id: int) -> Armor:
+        """
+        returns an armor with the specified id
+        """
+
+        return self.catalog.armors_by_id.get(armor_id, NotImplemented)
 
-    def get_weapon_names(self) -> list:
+    def get_weapon_names(self) -> tuple[str, ...]:
         """
         returns weapons' names
         """
 
-        return [weapon.name for weapon in self.equipment.weapons]
+        return self.catalog.weapon_names
 
-    def get_armor_names(self) -> list:
+    def get_armor_names(self) -> tuple[str, ...]:
         """
         returns armors' names
         """
 
-        return [armor.name for armor in self.equipment.armors]
+        return self.catalog.armor_names
 
 
 # for debug only
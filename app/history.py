@@ -0,0 +1,261 @@
+"""
+This module contains the history of the finished fights and the leaderboard:
+the fights are queued by the request and written to an SQLite database (in WAL mode)
+in batches by a background thread, so a request never waits for the disk
+
+the writer keeps a summary table per player (the leaderboard) in the same transaction,
+the win rates per class are summed up from the fights added since the last refresh;
+both are cached for HISTORY_CACHE_TTL seconds (the workers share the database)
+"""
+
+from __future__ import annotations
+
+import atexit
+import sqlite3
+import threading
+import time
+from queue import Empty, SimpleQueue
+from typing import NamedTuple, Optional
+
+from app.arena import Arena
+from app.classes import UnitClass
+from app.const import HISTORY_BATCH_SIZE, HISTORY_FLUSH_INTERVAL, HISTORY_CACHE_TTL
+
+OUTCOMES = {"Победил Игрок": "win", "Ничья": "draw", "Победил Противник": "loss"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fights (
+    id INTEGER PRIMARY KEY,
+    finished_at REAL NOT NULL,
+    hero_name TEXT NOT NULL,
+    hero_class INTEGER NOT NULL,
+    hero_weapon INTEGER NOT NULL,
+    hero_armor INTEGER NOT NULL,
+    enemy_class INTEGER NOT NULL,
+    enemy_weapon INTEGER NOT NULL,
+    enemy_armor INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    turns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS players (
+    name TEXT PRIMARY KEY,
+    fights INTEGER NOT NULL,
+    wins INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS players_by_wins ON players (wins DESC, fights);
+"""
+
+
+class FightRecord(NamedTuple):
+    """
+    a finished fight: the players' classes and equipment ids,
+    the outcome (from the hero's side) and the turns
+    """
+
+    finished_at: float
+    hero_name: str
+    hero_class: int
+    hero_weapon: int
+    hero_armor: int
+    enemy_class: int
+    enemy_weapon: int
+    enemy_armor: int
+    outcome: str
+    turns: int
+
+    @classmethod
+    def from_arena(cls, arena: Arena) -> FightRecord:
+        """
+        makes the record of the arena's finished fight
+        """
+
+        hero, enemy = arena.hero, arena.enemy
+        return cls(
+            time.time(),
+            hero.name,
+            hero.unit_class.id,
+            hero.weapon.id,
+            hero.armor.id,
+            enemy.unit_class.id,
+            enemy.weapon.id,
+            enemy.armor.id,
+            OUTCOMES[arena.result],
+            arena.version,
+        )
+
+
+INSERT_FIGHT = (
+    f"INSERT INTO fights ({', '.join(FightRecord._fields)})"
+    f" VALUES ({', '.join('?' * len(FightRecord._fields))})"
+)
+
+
+class FightHistory:  # pylint: disable=too-many-instance-attributes
+    """
+    records the finished fights in the background and answers the leaderboard queries from a cache
+    """
+
+    def __init__(
+        self,
+        file_name: str,
+        batch_size: int = HISTORY_BATCH_SIZE,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL,
+        cache_ttl: float = HISTORY_CACHE_TTL,
+    ):
+        self.file_name = file_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.cache_ttl = cache_ttl
+        self._queue: SimpleQueue[Optional[FightRecord]] = SimpleQueue()
+        self._local = threading.local()  # sqlite connections can't be shared by threads
+        with self._connection as connection:
+            connection.executescript(SCHEMA)
+        self._summary_lock = threading.Lock()
+        # fights, wins, draws, losses per the hero's class
+        self._class_counts: dict[int, list[int]] = {}
+        self._last_id = 0  # the last fight summed up into the class counts
+        self._classes_expire = 0.0
+        # the expiry time and the top by size
+        self._leaderboards: dict[int, tuple[float, list[dict]]] = {}
+        self._writer = threading.Thread(
+            target=self._write_loop, name="fight-history", daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.file_name, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def record(self, arena: Arena) -> None:
+        """
+        queues the arena's finished fight to be written (doesn't wait for the disk)
+        """
+
+        self._queue.put(FightRecord.from_arena(arena))
+
+    @property
+    def pending(self) -> int:
+        """
+        the fights queued and not written yet
+        """
+
+        return self._queue.qsize()
+
+    def close(self) -> None:
+        """
+        writes the queued fights and stops the writer
+        """
+
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def _write_loop(self) -> None:
+        """
+        writes the queued fights in batches: up to batch_size or what came in flush_interval
+        """
+
+        stopping = False
+        while not stopping:
+            record = self._queue.get()
+            if record is None:
+                return
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get(
+                        timeout=max(deadline - time.monotonic(), 0)
+                    )
+                except Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            try:
+                self._write(batch)
+            except sqlite3.Error as error:
+                print(f"Can't write {len(batch)} fights to the history:", error)
+
+    def _write(self, batch: list[FightRecord]) -> None:
+        players: dict[str, list[int]] = {}
+        for record in batch:
+            fights_wins = players.setdefault(record.hero_name, [0, 0])
+            fights_wins[0] += 1
+            fights_wins[1] += record.outcome == "win"
+        with self._connection as connection:
+            connection.executemany(INSERT_FIGHT, batch)
+            connection.executemany(
+                "INSERT INTO players (name, fights, wins) VALUES (?, ?, ?)"
+                " ON CONFLICT (name) DO UPDATE"
+                " SET fights = fights + excluded.fights, wins = wins + excluded.wins",
+                [(name, fights, wins) for name, (fights, wins) in players.items()],
+            )
+
+    def leaderboard(self, size: int = 10) -> list[dict]:
+        """
+        returns the players with the most wins
+        """
+
+        now = time.monotonic()
+        cached = self._leaderboards.get(size)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        rows = self._connection.execute(
+            "SELECT name, fights, wins FROM players ORDER BY wins DESC, fights LIMIT ?",
+            (size,),
+        ).fetchall()
+        top = [
+            {"name": name, "fights": fights, "wins": wins, "win_rate": wins / fights}
+            for name, fights, wins in rows
+        ]
+        self._leaderboards[size] = (now + self.cache_ttl, top)
+        return top
+
+    def class_win_rates(self) -> dict[str, dict]:
+        """
+        returns the fights, the outcomes and the win rate of the heroes per class
+        (the fights added since the last refresh are summed up into the cached counts)
+        """
+
+        with self._summary_lock:
+            now = time.monotonic()
+            if now >= self._classes_expire:
+                rows = self._connection.execute(
+                    "SELECT hero_class, outcome, COUNT(*), MAX(id) FROM fights"
+                    " WHERE id > ? GROUP BY hero_class, outcome",
+                    (self._last_id,),
+                ).fetchall()
+                for class_id, outcome, fights, last_id in rows:
+                    counts = self._class_counts.setdefault(class_id, [0, 0, 0, 0])
+                    counts[0] += fights
+                    counts[1 + ("win", "draw", "loss").index(outcome)] += fights
+                    self._last_id = max(self._last_id, last_id)
+                self._classes_expire = now + self.cache_ttl
+            counts_by_class = {
+                class_id: list(counts)
+                for class_id, counts in self._class_counts.items()
+            }
+
+        summary = {}
+        for class_id, (fights, wins, draws, losses) in sorted(counts_by_class.items()):
+            unit_class = UnitClass.get_unit_by_id(class_id)
+            name = (
+                unit_class.name if unit_class is not NotImplemented else str(class_id)
+            )
+            summary[name] = {
+                "fights": fights,
+                "wins": wins,
+                "draws": draws,
+                "losses": losses,
+                "win_rate": wins / fights,
+            }
+        return summary
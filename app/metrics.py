@@ -0,0 +1,271 @@
+"""
+This module contains the app metrics exported in the Prometheus text format (see /metrics)
+every thread counts to its own shard without locks, the shards are summed up on a scrape;
+the shards of the finished threads are merged into one, so they don't pile up
+"""
+
+from __future__ import annotations
+
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Iterable, Optional
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)  # in seconds
+TURN_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.01,
+)
+
+METRICS: list = []  # all the metrics to export
+
+
+class _Metric(ABC):
+    """
+    a metric keeping a value per labels tuple in the shard of every thread
+    the subclasses set the kind and define the value's layout and rendering
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._local = threading.local()
+        self._shards: list[tuple[threading.Thread, dict]] = []
+        self._retired: dict = {}  # the merged shards of the finished threads
+        self._lock = threading.Lock()  # taken once per thread and on a scrape only
+        METRICS.append(self)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    @abstractmethod
+    def _new_value(self) -> list[float]:
+        """
+        returns the initial value of a labels tuple
+        """
+
+    def _value(self, labels: tuple[str, ...]) -> list[float]:
+        shard = self._shard()
+        value = shard.get(labels)
+        if value is None:
+            value = shard[labels] = self._new_value()
+        return value
+
+    def collect(self) -> dict[tuple[str, ...], list[float]]:
+        """
+        returns the values summed up over the threads
+        """
+
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    _merge(self._retired, shard.copy())
+            self._shards = alive
+            total: dict = {}
+            _merge(total, self._retired)
+            for _, shard in alive:
+                # dict.copy() is atomic, the thread may be adding a key
+                _merge(total, shard.copy())
+        return total
+
+    def _label_text(self, labels: tuple[str, ...], extra: str = "") -> str:
+        pairs = [
+            f'{name}="{_escape(value)}"' for name, value in zip(self.labels, labels)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> Iterable[str]:
+        """
+        returns the lines of the metric in the Prometheus text format
+        """
+
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._render_values(self.collect())
+
+    @abstractmethod
+    def _render_values(
+        self, values: dict[tuple[str, ...], list[float]]
+    ) -> Iterable[str]:
+        """
+        returns the lines of the values
+        """
+
+
+def _merge(total: dict, shard: dict) -> None:
+    for labels, value in shard.items():
+        summed = total.setdefault(labels, [0.0] * len(value))
+        for index, item in enumerate(value):
+            summed[index] += item
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter(_Metric):
+    """
+    a counter, only grows
+    """
+
+    kind = "counter"
+
+    def _new_value(self) -> list[float]:
+        return [0.0]
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """
+        increments the counter of the labels values
+        """
+
+        self._value(labels)[0] += amount
+
+    def _render_values(
+        self, values: dict[tuple[str, ...], list[float]]
+    ) -> Iterable[str]:
+        for labels, (value,) in sorted(values.items()):
+            yield f"{self.name}{self._label_text(labels)} {value:g}"
+
+
+class Histogram(_Metric):
+    """
+    a histogram: the number of the observations per bucket, their sum and count
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+
+    def _new_value(self) -> list[float]:
+        return [0.0] * (len(self.buckets) + 2)  # the buckets, +Inf and the sum
+
+    def observe(self, amount: float, *labels: str) -> None:
+        """
+        adds an observation of the labels values
+        """
+
+        value = self._value(labels)
+        value[bisect_left(self.buckets, amount)] += 1
+        value[-1] += amount
+
+    def _render_values(
+        self, values: dict[tuple[str, ...], list[float]]
+    ) -> Iterable[str]:
+        for labels, value in sorted(values.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + ("+Inf",), value):
+                cumulative += count
+                bound_label = f'le="{bound}"'
+                yield f"{self.name}_bucket{self._label_text(labels, bound_label)} {cumulative:g}"
+            yield f"{self.name}_sum{self._label_text(labels)} {value[-1]:g}"
+            yield f"{self.name}_count{self._label_text(labels)} {cumulative:g}"
+
+
+class Gauge:  # pylint: disable=too-few-public-methods
+    """
+    a value read on a scrape (e.g. the number of the arenas)
+    """
+
+    def __init__(
+        self, name: str, description: str, read: Optional[Callable[[], float]] = None
+    ):
+        self.name = name
+        self.description = description
+        self.read = read
+        METRICS.append(self)
+
+    def render(self) -> Iterable[str]:
+        """
+        returns the lines of the metric in the Prometheus text format
+        """
+
+        if self.read is None:
+            return
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self.read():g}"
+
+
+REQUEST_DURATION = Histogram(
+    "skywars_request_duration_seconds",
+    "The time to serve a request by route",
+    ("method", "route"),
+)
+RENDER_DURATION = Histogram(
+    "skywars_render_duration_seconds", "The time to render the fight page"
+)
+TURN_DURATION = Histogram(
+    "skywars_turn_duration_seconds",
+    "The time of Arena.complete_turn()",
+    buckets=TURN_BUCKETS,
+)
+FIGHTS_STARTED = Counter("skywars_fights_started_total", "The fights started")
+FIGHTS_FINISHED = Counter(
+    "skywars_fights_finished_total", "The fights finished by outcome", ("outcome",)
+)
+ARENAS_EVICTED = Counter(
+    "skywars_arenas_evicted_total",
+    "The arenas removed from the memory by reason (expired or memory)",
+    ("reason",),
+)
+ARENAS_RESTORED = Counter(
+    "skywars_arenas_restored_total", "The spilled arenas restored on a request"
+)
+ARENA_MEMORY = Gauge(
+    "skywars_arena_memory_bytes",
+    "The estimated memory taken by the arenas of the worker",
+)
+HISTORY_PENDING = Gauge(
+    "skywars_history_pending", "The finished fights queued to be written to the history"
+)
+ACTIVE_ARENAS = Gauge(
+    "skywars_active_arenas", "The arenas kept by the worker (or by the shared store)"
+)
+
+
+def render_metrics() -> str:
+    """
+    returns all the metrics in the Prometheus text format
+    """
+
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
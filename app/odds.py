@@ -0,0 +1,269 @@
+"""
+This module contains the exact win probabilities of the matchups:
+the calculator (the NumPy engine in app.odds_engine is imported on the first calculation),
+its cache and the board of the odds shown to the players
+
+usage: python -m app.odds (prints the odds of the matchups next to the simulated ones)
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+from threading import Lock
+from typing import Optional
+
+from app.classes import UnitClass
+from app.const import (
+    STAMINA_RECOVER_PER_TURN,
+    SIMULATION_MAX_TURNS,
+    ODDS_CACHE_FILE,
+    ODDS_WORKERS,
+    ODDS_BOARD_SIZE,
+)
+from app.equipment import Equipment
+from app.outcomes import Odds
+from app.unit import Setup
+
+ATTACK = "attack"  # the hero's default policy (see app.simulator)
+CACHE_FIELDS = ["key", "win", "draw", "loss", "unresolved"]
+
+
+def calculate_odds(
+    hero: Setup,
+    enemy: Setup,
+    hero_policy: str = ATTACK,
+    max_turns: int = SIMULATION_MAX_TURNS,
+    stamina: float = STAMINA_RECOVER_PER_TURN,
+) -> Odds:
+    """
+    calculates the probabilities of the outcomes of the hero's (a human player's)
+    fights against the enemy (a computer player)
+    """
+
+    # NumPy is imported on the first calculation, not on the app start
+    from app import odds_engine  # pylint: disable=import-outside-toplevel
+
+    return odds_engine.calculate_odds(hero, enemy, hero_policy, max_turns, stamina)
+
+
+class OddsCalculator:
+    """
+    calculates the odds of the matchups and caches them in memory and in an append-only CSV file
+    the cache key is a hash of the setups (the classes and the equipment items' values),
+    so a changed catalog item changes the keys of its matchups only
+    """
+
+    def __init__(self, cache_file: Optional[str] = ODDS_CACHE_FILE):
+        self.cache_file = cache_file
+        self._cache: dict[str, Odds] = {}
+        self._lock = Lock()
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, "r", encoding="utf-8", newline="") as file_handler:
+                for row in csv.reader(file_handler):
+                    # the header is repeated in the files of the older versions
+                    # (the workers raced to make them)
+                    if row == CACHE_FIELDS:
+                        continue
+                    key, win, draw, loss, unresolved = row
+                    self._cache[key] = Odds(
+                        float(win), float(draw), float(loss), float(unresolved)
+                    )
+
+    @staticmethod
+    def key(
+        hero: Setup, enemy: Setup, hero_policy: str, max_turns: int, stamina: float
+    ) -> str:
+        """
+        a hash of everything the odds of a matchup depend on
+        """
+
+        return hashlib.sha256(
+            repr((hero, enemy, hero_policy, max_turns, stamina)).encode()
+        ).hexdigest()
+
+    def odds(
+        self,
+        hero: Setup,
+        enemy: Setup,
+        hero_policy: str = ATTACK,
+        max_turns: int = SIMULATION_MAX_TURNS,
+        stamina: float = STAMINA_RECOVER_PER_TURN,
+    ) -> Odds:
+        """
+        returns the cached odds of the matchup, calculates them if there are none
+        """
+
+        key = self.key(hero, enemy, hero_policy, max_turns, stamina)
+        odds = self._cache.get(key)
+        if odds is None:
+            odds = calculate_odds(hero, enemy, hero_policy, max_turns, stamina)
+            with self._lock:
+                self._cache[key] = odds
+                if self.cache_file:
+                    self._append(
+                        self.cache_file,
+                        [key, odds.win, odds.draw, odds.loss, odds.unresolved],
+                    )
+        return odds
+
+    @staticmethod
+    def _append(cache_file: str, row: list) -> None:
+        """
+        appends the row to the cache file; the header is written by the one worker (process)
+        which creates the file, the lines are written with one call each (not interleaved)
+        """
+
+        rows = [row]
+        try:
+            descriptor = os.open(
+                cache_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL, 0o644
+            )
+            rows.insert(0, CACHE_FIELDS)
+        except FileExistsError:
+            descriptor = os.open(cache_file, os.O_WRONLY | os.O_APPEND)
+        lines = io.StringIO()
+        csv.writer(lines).writerows(rows)
+        with os.fdopen(descriptor, "wb") as file_handler:
+            file_handler.write(lines.getvalue().encode("utf-8"))
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+class OddsBoard:  # pylint: disable=too-many-instance-attributes
+    """
+    the odds shown to the players: read from an LRU cache, never calculated in the request
+    the missing odds are calculated by a background thread pool (started with the app)
+    and are "pending" meanwhile
+    """
+
+    def __init__(
+        self,
+        equipment: Equipment,
+        calculator: Optional[OddsCalculator] = None,
+        workers: int = ODDS_WORKERS,
+        size: int = ODDS_BOARD_SIZE,
+    ):
+        self.equipment = equipment
+        self.calculator = calculator or OddsCalculator()
+        self.size = size
+        self._cache: OrderedDict[str, Odds] = OrderedDict()
+        self._pending: set[str] = set()
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="odds"
+        )
+        # the instrumentation
+        self.hits = self.misses = self.fills = 0
+        self.fill_time = self.max_fill_time = 0.0
+
+    def setups(self) -> list[Setup]:
+        """
+        returns all the (class, weapon, armor) combinations of the current catalog
+        """
+
+        equipment = self.equipment.equipment
+        return [
+            Setup(unit_class, weapon, armor)
+            for unit_class, weapon, armor in product(
+                UnitClass.instances, equipment.weapons, equipment.armors
+            )
+        ]
+
+    def _fill(self, key: str, hero: Setup, enemy: Setup, stamina: float) -> None:
+        started = time.perf_counter()
+        try:
+            odds = self.calculator.odds(hero, enemy, stamina=stamina)
+            spent = time.perf_counter() - started
+            with self._lock:
+                self._cache[key] = odds
+                if len(self._cache) > self.size:
+                    self._cache.popitem(last=False)
+                self.fills += 1
+                self.fill_time += spent
+                self.max_fill_time = max(self.max_fill_time, spent)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def get(
+        self, hero: Setup, enemy: Setup, stamina: float = STAMINA_RECOVER_PER_TURN
+    ) -> Optional[Odds]:
+        """
+        returns the odds of the matchup or None if they are pending (queues the calculation)
+        """
+
+        key = self.calculator.key(hero, enemy, ATTACK, SIMULATION_MAX_TURNS, stamina)
+        with self._lock:
+            odds = self._cache.get(key)
+            if odds is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return odds
+            self.misses += 1
+            if key in self._pending:
+                return None
+            self._pending.add(key)
+        self._executor.submit(self._fill, key, hero, enemy, stamina)
+        return None
+
+    def get_all(
+        self, hero: Setup, stamina: float = STAMINA_RECOVER_PER_TURN
+    ) -> list[tuple[Setup, Optional[Odds]]]:
+        """
+        returns the odds of the hero against every enemy setup (None for the pending ones)
+        """
+
+        return [(enemy, self.get(hero, enemy, stamina)) for enemy in self.setups()]
+
+    def stats(self) -> dict:
+        """
+        returns the cache and the background pool figures
+        """
+
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "fills": self.fills,
+                "mean_fill_time": self.fill_time / self.fills if self.fills else 0.0,
+                "max_fill_time": self.max_fill_time,
+            }
+
+    def shutdown(self) -> None:
+        """
+        stops the background pool (the pending calculations are cancelled)
+        """
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# for debug only
+if __name__ == "__main__":
+
+    from app.tournament import get_setups, setup_name
+    from app.simulator import simulate
+
+    calculator_ = OddsCalculator(cache_file=None)
+    setups = get_setups()
+    for hero_, enemy_ in product(setups[::4], repeat=2):
+        started_ = time.perf_counter()
+        odds_ = calculator_.odds(hero_, enemy_)
+        spent_ = time.perf_counter() - started_
+        simulated = simulate(hero_, enemy_, fights=20000, seed=0)
+        print(
+            f"{setup_name(hero_):>32} vs {setup_name(enemy_):<32}"
+            f" win {odds_.win:.4f} (simulated {simulated.win_rate:.4f})"
+            f" loss {odds_.loss:.4f} unresolved {odds_.unresolved:.4f}  {spent_ * 1000:.0f} ms"
+        )
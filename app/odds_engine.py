@@ -0,0 +1,261 @@
+"""
+This module contains the exact win probability calculator (see app.odds):
+the fights of a matchup are played turn by turn over the probability distributions
+of the damage taken by the hero and by the enemy (in integer tenths, like in the fixed point mode)
+instead of sampling them like the simulator does
+
+the damage taken by the hero and by the enemy in a turn depends on the players' stamina only,
+and the stamina doesn't depend on the damage, so the state of the fights having the same
+stamina history is a pair of independent distributions (a branch);
+the fights branch when the enemy tries to use its skill (a 10% chance, see CompPlayer)
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import numpy as np
+
+from app.ai import Fighter
+from app.const import STAMINA_RECOVER_PER_TURN, SIMULATION_MAX_TURNS
+from app.outcomes import Odds
+from app.simulator import ATTACK, SKILL, POLICIES
+from app.unit import Setup
+
+ENEMY_SKILL_CHANCE = 0.1  # CompPlayer.attack_or_use_skill(): randint(1, 10) == 5
+NEGLIGIBLE = 1e-12  # the branches less probable than this are left unresolved
+
+
+class _Player:  # pylint: disable=too-few-public-methods
+    """
+    a player's parameters and damage distributions (an array of probabilities per damage in tenths)
+    """
+
+    def __init__(self, setup: Setup, stamina: float):
+        self.fighter = Fighter.make(
+            setup.unit_class, setup.weapon, setup.armor, stamina
+        )
+        self.skill = _distribution([(self.fighter.skill_damage, 1.0)])
+
+    def hit(self, target: _Player, armored: bool) -> np.ndarray:
+        """
+        the distribution of the final damage of a hit (BaseUnit._get_final_damage())
+        """
+
+        armor = target.fighter.armor if armored else 0.0
+        return _distribution(
+            [
+                (max(round(damage - armor), 0), probability)
+                for damage, probability in self.fighter.damage
+            ]
+        )
+
+
+def _distribution(values: list[tuple[int, float]]) -> np.ndarray:
+    distribution = np.zeros(max(value for value, _ in values) + 1)
+    for value, probability in values:
+        distribution[value] += probability
+    return distribution
+
+
+def _take(
+    taken: np.ndarray, damage: np.ndarray, max_health: int
+) -> tuple[np.ndarray, float, float]:
+    """
+    applies a damage distribution to the distribution of the damage taken by a player
+    :returns the players alive, the probability of health == 0 and of health < 0
+    """
+
+    result = np.convolve(taken, damage)
+    end = max_health + 1
+    return (
+        result[:max_health],
+        float(result[max_health:end].sum()),
+        float(result[end:].sum()),
+    )
+
+
+@dataclass
+class _Branch:
+    """
+    the fights having the same stamina history
+    the probability of a (hero's damage, enemy's damage) pair is hero_taken[i] * enemy_taken[j]
+    """
+
+    hero_stamina: int
+    hero_skill_used: bool
+    enemy_stamina: int
+    enemy_skill_used: bool
+    hero_taken: np.ndarray
+    enemy_taken: np.ndarray
+
+    def key(self) -> tuple:
+        """
+        the stamina history of the branch
+        """
+
+        return (
+            self.hero_stamina,
+            self.hero_skill_used,
+            self.enemy_stamina,
+            self.enemy_skill_used,
+        )
+
+    def same_as(self, other: _Branch) -> bool:
+        """
+        checks whether the other branch has the same fights (a loop)
+        """
+
+        return (
+            self.key() == other.key()
+            and np.array_equal(self.hero_taken, other.hero_taken)
+            and np.array_equal(self.enemy_taken, other.enemy_taken)
+        )
+
+
+class _Match:  # pylint: disable=too-many-instance-attributes
+    """
+    plays the branches of a matchup with the rules of Arena and BaseUnit
+    """
+
+    def __init__(self, hero: Setup, enemy: Setup, hero_policy: str, stamina: float):
+        if hero_policy not in POLICIES:
+            raise ValueError(f"Unknown policy: {hero_policy}")
+        self.hero, self.enemy = _Player(hero, stamina), _Player(enemy, stamina)
+        self.hero_policy = hero_policy
+        self.hero_hits = {
+            armored: self.hero.hit(self.enemy, armored) for armored in (False, True)
+        }
+        self.enemy_hits = {
+            armored: self.enemy.hit(self.hero, armored) for armored in (False, True)
+        }
+        self.win = self.draw = self.loss = 0.0
+
+    def start(self) -> _Branch:
+        """
+        the branch of all the fights before the first turn
+        """
+
+        hero, enemy = self.hero.fighter, self.enemy.fighter
+        return _Branch(
+            hero.max_stamina, False, enemy.max_stamina, False, np.ones(1), np.ones(1)
+        )
+
+    def _regenerate(self, branch: _Branch) -> None:
+        hero, enemy = self.hero.fighter, self.enemy.fighter
+        branch.hero_stamina = min(
+            branch.hero_stamina + hero.regeneration, hero.max_stamina
+        )
+        branch.enemy_stamina = min(
+            branch.enemy_stamina + enemy.regeneration, enemy.max_stamina
+        )
+
+    def hero_turn(self, branch: _Branch) -> Optional[_Branch]:
+        """
+        the hero's action and Arena.check_health_and_regenerate()
+        :returns the branch of the fights going on
+        """
+
+        hero, enemy = self.hero.fighter, self.enemy.fighter
+        if (
+            self.hero_policy == SKILL
+            and not branch.hero_skill_used
+            and branch.hero_stamina >= hero.skill_cost
+        ):
+            damage = self.hero.skill
+            branch.hero_skill_used = True
+        elif branch.hero_stamina >= hero.hit_cost:
+            damage = self.hero_hits[branch.enemy_stamina >= enemy.defence_cost]
+            branch.hero_stamina -= hero.hit_cost
+            branch.enemy_stamina -= enemy.defence_cost
+        else:
+            damage = np.ones(1)  # not enough stamina to attack
+        branch.enemy_taken, zero, below = _take(
+            branch.enemy_taken, damage, enemy.max_health
+        )
+        alive = float(branch.hero_taken.sum())
+        self.win += alive * below
+        self.loss += alive * zero  # Arena.check_health(): the enemy with 0 health wins
+        self._regenerate(branch)
+        return branch if branch.enemy_taken.any() else None
+
+    def _enemy_action(self, branch: _Branch, use_skill: bool) -> Optional[_Branch]:
+        hero, enemy = self.hero.fighter, self.enemy.fighter
+        if use_skill:
+            if branch.enemy_stamina < enemy.skill_cost:
+                damage = np.ones(1)  # not enough stamina to use the skill
+            else:
+                damage = self.enemy.skill
+                branch.enemy_skill_used = True
+        elif branch.enemy_stamina >= enemy.hit_cost:
+            damage = self.enemy_hits[branch.hero_stamina >= hero.defence_cost]
+            branch.enemy_stamina -= enemy.hit_cost
+            branch.hero_stamina -= hero.defence_cost
+        else:
+            damage = np.ones(1)
+        branch.hero_taken, zero, below = _take(
+            branch.hero_taken, damage, hero.max_health
+        )
+        self.loss += float(branch.enemy_taken.sum()) * (zero + below)
+        self._regenerate(branch)
+        return branch if branch.hero_taken.any() else None
+
+    def enemy_turn(self, branch: _Branch) -> list[_Branch]:
+        """
+        the enemy's action (CompPlayer.attack_or_use_skill())
+        and Arena.check_health_and_regenerate()
+        :returns the branches of the fights going on
+        """
+
+        if branch.enemy_skill_used:
+            branches = [self._enemy_action(branch, use_skill=False)]
+        else:
+            using_skill = replace(
+                branch, hero_taken=branch.hero_taken * ENEMY_SKILL_CHANCE
+            )
+            branch.hero_taken = branch.hero_taken * (1 - ENEMY_SKILL_CHANCE)
+            branches = [
+                self._enemy_action(using_skill, use_skill=True),
+                self._enemy_action(branch, use_skill=False),
+            ]
+        return [branch for branch in branches if branch is not None]
+
+
+def calculate_odds(
+    hero: Setup,
+    enemy: Setup,
+    hero_policy: str = ATTACK,
+    max_turns: int = SIMULATION_MAX_TURNS,
+    stamina: float = STAMINA_RECOVER_PER_TURN,
+) -> Odds:
+    """
+    calculates the probabilities of the outcomes of the hero's (a human player's)
+    fights against the enemy (a computer player)
+    """
+
+    match = _Match(hero, enemy, hero_policy, stamina)
+    branches = [match.start()]
+    unresolved = 0.0
+    for _ in range(max_turns):
+        if not branches:
+            break
+        next_branches = []
+        for branch in branches:
+            before = replace(branch)
+            if match.hero_turn(branch) is None:
+                continue
+            for child in match.enemy_turn(branch):
+                probability = float(child.hero_taken.sum() * child.enemy_taken.sum())
+                if probability < NEGLIGIBLE or (
+                    child.enemy_skill_used and child.same_as(before)
+                ):
+                    # negligible or nobody can hurt anybody anymore
+                    unresolved += probability
+                else:
+                    next_branches.append(child)
+        branches = next_branches
+    unresolved += sum(
+        float(branch.hero_taken.sum() * branch.enemy_taken.sum()) for branch in branches
+    )
+    return Odds(match.win, match.draw, match.loss, unresolved)
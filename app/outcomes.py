@@ -0,0 +1,16 @@
+"""This module contains the odds of a matchup (see app.odds and its engine app.odds_engine)"""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Odds:
+    """
+    the probabilities of a matchup's outcomes (from the hero's point of view)
+    """
+
+    win: float
+    draw: float  # always 0 by the current rules: an action damages one player only
+    loss: float
+    # the fights not finished in the max number of turns or looping forever
+    unresolved: float
@@ -0,0 +1,100 @@
+"""
+This module contains an opt-in request profiler:
+the selected requests (a share of them or the ones with the header) are profiled with cProfile,
+the profiles are written to a directory with the context (the route, the arena and the turn),
+the oldest ones are removed
+
+read a profile with: python -m pstats <file>.prof
+"""
+
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import re
+import time
+from random import Random
+from threading import Lock
+
+from app.const import PROFILE_HEADER, PROFILE_KEEP
+
+
+class RequestProfiler:
+    """
+    profiles the sampled requests and keeps the last profiles in the directory
+    rate - the share of the requests to profile (0 - the ones with the header only)
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        rate: float = 0.0,
+        keep: int = PROFILE_KEEP,
+        header: str = PROFILE_HEADER,
+    ):
+        self.directory = directory
+        self.rate = rate
+        self.keep = keep
+        self.header = header
+        self._rng = Random()
+        self._lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def should_profile(self, headers: dict) -> bool:
+        """
+        whether to profile a request with the headers
+        """
+
+        return headers.get(self.header) == "1" or (
+            self.rate > 0 and self._rng.random() < self.rate
+        )
+
+    @staticmethod
+    def start() -> cProfile.Profile:
+        """
+        starts profiling the current thread
+        """
+
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile: cProfile.Profile, name: str, context: dict) -> str:
+        """
+        stops profiling, writes the profile and its context (a JSON file next to it)
+        :returns the profile file name
+        """
+
+        profile.disable()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(
+            self.directory,
+            f"{stamp}-{time.perf_counter_ns() % 10 ** 9:09d}-{_slug(name)}",
+        )
+        profile.dump_stats(f"{base}.prof")
+        with open(f"{base}.json", "w", encoding="utf-8") as file_handler:
+            json.dump(context, file_handler, ensure_ascii=False, indent=2)
+        self._rotate()
+        return f"{base}.prof"
+
+    def _rotate(self) -> None:
+        with self._lock:
+            profiles = sorted(
+                (
+                    entry
+                    for entry in os.scandir(self.directory)
+                    if entry.name.endswith(".prof")
+                ),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+            for entry in profiles[: max(len(profiles) - self.keep, 0)]:
+                for file_name in (entry.path, entry.path[:-5] + ".json"):
+                    try:
+                        os.remove(file_name)
+                    except FileNotFoundError:
+                        pass  # removed by another thread or worker
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_") or "root"
@@ -0,0 +1,143 @@
+"""
+This module contains fight replays:
+a fight is stored as the seed, the setups of the players and a byte per turn,
+and is re-simulated without Flask to check the final state
+
+replay format (little endian):
+- header: seed (8 bytes), flags (1 byte: fixed point, smart enemy), the hero's and the enemy's
+  class, weapon and armor ids (2 bytes each)
+- the player's actions, a byte per turn (see app.arena)
+- the CRC32 of the final state (4 bytes)
+"""
+
+from __future__ import annotations
+
+import struct
+import zlib
+from typing import Sequence, Type, TypeVar
+
+from app.ai import choose_enemy_action
+from app.arena import Arena, ATTACK, USE_SKILL, SKIP_TURN
+from app.classes import UnitClass
+from app.equipment import Equipment
+from app.unit import (
+    BaseUnit,
+    HumanPlayer,
+    CompPlayer,
+    FixedPointUnit,
+    FIXED_POINT_PLAYERS,
+)
+
+HEADER = struct.Struct("<QB6H")
+CHECKSUM = struct.Struct("<I")
+FIXED_POINT_FLAG = 1
+SMART_ENEMY_FLAG = 2  # the enemy is played by the AI (see app.ai)
+
+Unit = TypeVar("Unit", bound=BaseUnit)
+
+
+def state_checksum(arena: Arena) -> int:
+    """
+    returns the CRC32 of the players' state
+    """
+
+    state = b"".join(
+        struct.pack("<dd?", unit.health_points, unit.stamina_points, unit.skill_used)
+        for unit in (arena.hero, arena.enemy)
+    )
+    return zlib.crc32(state)
+
+
+def dump_replay(arena: Arena) -> bytes:
+    """
+    packs the arena's fight into a replay
+    """
+
+    hero, enemy = arena.hero, arena.enemy
+    header = HEADER.pack(
+        arena.seed,
+        (FIXED_POINT_FLAG if isinstance(hero, FixedPointUnit) else 0)
+        | (SMART_ENEMY_FLAG if arena.enemy_ai is not None else 0),
+        hero.unit_class.id,
+        hero.weapon.id,
+        hero.armor.id,
+        enemy.unit_class.id,
+        enemy.weapon.id,
+        enemy.armor.id,
+    )
+    return header + bytes(arena.log) + CHECKSUM.pack(state_checksum(arena))
+
+
+def _make_unit(
+    class_name: Type[Unit], ids: Sequence[int], equipment: Equipment
+) -> Unit:
+    class_id, weapon_id, armor_id = ids
+    unit_class = UnitClass.get_unit_by_id(class_id)
+    return class_name(
+        name=unit_class.name,
+        unit_class=unit_class,
+        health=class_name.encode(unit_class.max_health),
+        stamina=class_name.encode(unit_class.max_stamina),
+        _weapon=equipment.get_weapon_by_id(weapon_id),
+        _armor=equipment.get_armor_by_id(armor_id),
+    )
+
+
+def replay(data: bytes, equipment: Equipment) -> Arena:
+    """
+    re-simulates a fight from its replay
+    :returns the arena with the final state
+    """
+
+    seed, flags, *ids = HEADER.unpack_from(data)
+    hero_class: type = HumanPlayer
+    enemy_class: type = CompPlayer
+    if flags & FIXED_POINT_FLAG:
+        hero_class, enemy_class = (
+            FIXED_POINT_PLAYERS[HumanPlayer],
+            FIXED_POINT_PLAYERS[CompPlayer],
+        )
+
+    arena = Arena()
+    if flags & SMART_ENEMY_FLAG:
+        arena.enemy_ai = choose_enemy_action
+    arena.start_game(seed)
+    arena.hero = _make_unit(hero_class, ids[:3], equipment)
+    arena.enemy = _make_unit(enemy_class, ids[3:], equipment)
+    actions = {
+        ATTACK: arena.attack,
+        USE_SKILL: arena.use_skill,
+        SKIP_TURN: arena.skip_turn,
+    }
+    start, end = HEADER.size, len(data) - CHECKSUM.size
+    for action in data[start:end]:
+        actions[action]()
+    return arena
+
+
+def verify_replay(data: bytes, equipment: Equipment) -> bool:
+    """
+    re-simulates a fight and checks its final state
+    """
+
+    (checksum,) = CHECKSUM.unpack_from(data, len(data) - CHECKSUM.size)
+    return state_checksum(replay(data, equipment)) == checksum
+
+
+# for debug only
+if __name__ == "__main__":
+    import time
+
+    equipment_ = Equipment()
+    fight = Arena()
+    fight.start_game()
+    fight.hero = _make_unit(HumanPlayer, (1, 1, 2), equipment_)
+    fight.enemy = _make_unit(CompPlayer, (3, 2, 1), equipment_)
+    while fight.is_game_on():
+        fight.attack()
+    record = dump_replay(fight)
+    print("turns:", len(fight.log), "bytes:", len(record))
+
+    started = time.perf_counter()
+    print("verified:", verify_replay(record, equipment_))
+    print(f"replayed in {(time.perf_counter() - started) * 1000:.2f} ms")
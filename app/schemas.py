@@ -0,0 +1,122 @@
+"""
+This module contains the pydantic models validating the JSON data files
+it is imported only when a file has to be parsed (see app.catalog_cache),
+so the models repeat the fields of the plain dataclasses of app.equipment and app.classes
+"""
+
+# pylint: disable=duplicate-code
+
+from __future__ import annotations
+
+import dataclasses
+import json
+
+from pydantic import validator
+from pydantic.dataclasses import dataclass
+
+from app.skills import EFFECTS
+
+
+@dataclass
+class WeaponData:
+    """
+    to validate a weapon's data
+    """
+
+    id: int
+    name: str
+    min_damage: float
+    max_damage: float
+    stamina_per_hit: float
+
+
+@dataclass
+class ArmorData:
+    """
+    to validate an armor's data
+    """
+
+    id: int
+    name: str
+    defence: float
+    stamina_per_turn: float
+
+
+@dataclass
+class EquipmentFileData:
+    """
+    to validate the equipment file
+    """
+
+    weapons: list[WeaponData]
+    armors: list[ArmorData]
+
+
+@dataclass
+class SkillData:
+    """
+    to validate a skill's data
+    """
+
+    id: int
+    name: str
+    damage: float
+    required_stamina: float
+    effect: str = ""
+    duration: int = 0
+    power: float = 0.0
+
+    @validator("effect")
+    @classmethod
+    def known_effect(cls, effect: str) -> str:
+        """
+        checks the effect's kind
+        """
+
+        if effect and effect not in EFFECTS:
+            raise ValueError(f"Unknown effect: {effect}")
+        return effect
+
+
+@dataclass
+class UnitClassData:  # pylint: disable=too-many-instance-attributes
+    """
+    to validate a hero type's data, the skill is referenced by id
+    """
+
+    id: int
+    name: str
+    max_health: float
+    max_stamina: float
+    attack: float
+    stamina_mod: float
+    armor: float
+    skill: int
+
+
+@dataclass
+class ClassesData:
+    """
+    to validate the heroes' types file
+    """
+
+    skills: list[SkillData]
+    classes: list[UnitClassData]
+
+
+def parse_equipment(raw: bytes) -> dict:
+    """
+    validates the equipment file
+    :returns the data as plain dicts and lists
+    """
+
+    return dataclasses.asdict(EquipmentFileData(**json.loads(raw)))
+
+
+def parse_classes(raw: bytes) -> dict:
+    """
+    validates the heroes' types file
+    :returns the data as plain dicts and lists
+    """
+
+    return dataclasses.asdict(ClassesData(**json.loads(raw)))
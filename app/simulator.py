@@ -0,0 +1,390 @@
+"""
+This module contains a headless battle simulator
+It plays many fights at once with the rules of BaseUnit and Arena,
+every fight is a row of NumPy arrays
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from random import Random
+from typing import Any, Iterator, Optional, Type, TypeVar
+
+import numpy as np
+
+from app.arena import Arena
+from app.classes import UnitClass
+from app.const import STAMINA_RECOVER_PER_TURN, SIMULATION_MAX_TURNS
+from app import unit as unit_module
+from app.unit import Setup
+from app.unit_array import UnitArray
+
+Unit = TypeVar("Unit", bound=unit_module.BaseUnit)
+
+# fight outcomes (from the hero's point of view)
+UNFINISHED, WIN, DRAW, LOSS = 0, 1, 2, 3
+
+# hero policies
+ATTACK = "attack"  # always attack
+SKILL = "skill"  # use the skill as soon as it is affordable, attack otherwise
+POLICIES = (ATTACK, SKILL)
+
+
+@dataclass
+class SimulationResult:
+    """
+    outcomes and lengths of the simulated fights
+    """
+
+    outcomes: np.ndarray  # UNFINISHED, WIN, DRAW or LOSS per fight
+    turns: np.ndarray  # turns played per fight
+    hero_health: np.ndarray = field(repr=False)
+    enemy_health: np.ndarray = field(repr=False)
+
+    def _rate(self, outcome: int) -> float:
+        return float(np.count_nonzero(self.outcomes == outcome)) / len(self.outcomes)
+
+    @property
+    def win_rate(self) -> float:
+        """
+        the share of the fights the hero won
+        """
+
+        return self._rate(WIN)
+
+    @property
+    def draw_rate(self) -> float:
+        """
+        the share of the fights ended in a draw
+        """
+
+        return self._rate(DRAW)
+
+    @property
+    def loss_rate(self) -> float:
+        """
+        the share of the fights the hero lost
+        """
+
+        return self._rate(LOSS)
+
+    @property
+    def unfinished_rate(self) -> float:
+        """
+        the share of the fights not finished in the max number of turns
+        """
+
+        return self._rate(UNFINISHED)
+
+    def turn_distribution(self) -> np.ndarray:
+        """
+        the number of finished fights per number of turns
+        """
+
+        return np.bincount(self.turns[self.outcomes != UNFINISHED])
+
+
+class _Side:
+    """
+    the state of one side of all the fights: the unit of the setup in every fight,
+    packed into a UnitArray (the arrays are its views)
+    """
+
+    def __init__(self, setup: Setup, fights: int):
+        self.setup = setup
+        self.units = UnitArray.repeat(_make_unit(unit_module.BaseUnit, setup), fights)
+        self.health = np.frombuffer(self.units.health)
+        self.stamina = np.frombuffer(self.units.stamina)
+        self.skill_used = np.frombuffer(self.units.skill_used, dtype=bool)
+
+    def attack(self, other: _Side, rows: np.ndarray, draw: np.ndarray) -> None:
+        """
+        BaseUnit.attack() and BaseUnit._get_final_damage() for the rows
+        draw - random numbers in [0, 1) to choose the weapon damage
+        """
+
+        weapon = self.setup.weapon
+        rows = rows & (self.stamina >= weapon.stamina_per_hit)
+        damage_from_weapon = (
+            weapon.min_damage + (weapon.max_damage - weapon.min_damage) * draw
+        )
+        attacking_damage = np.round(
+            damage_from_weapon * self.setup.unit_class.attack, 1
+        )
+        armor = other.setup.armor
+        target_armor = np.where(
+            other.stamina >= armor.stamina_per_turn,
+            armor.defence * other.setup.unit_class.armor,
+            0.0,
+        )
+        final_damage = np.round(np.maximum(attacking_damage - target_armor, 0.0), 1)
+        np.copyto(other.health, np.round(other.health - final_damage, 1), where=rows)
+        np.subtract(self.stamina, weapon.stamina_per_hit, out=self.stamina, where=rows)
+        np.subtract(
+            other.stamina, armor.stamina_per_turn, out=other.stamina, where=rows
+        )
+
+    def use_skill(self, other: _Side, rows: np.ndarray) -> None:
+        """
+        BaseUnit.use_skill() for the rows
+        """
+
+        rows = (
+            rows
+            & ~self.skill_used
+            & (self.stamina >= self.setup.unit_class.get_required_stamina())
+        )
+        self.skill_used |= rows
+        np.copyto(
+            other.health,
+            np.round(other.health - self.setup.unit_class.skill.damage, 1),
+            where=rows,
+        )
+
+    def can_use_skill(self) -> np.ndarray:
+        """
+        whether the skill is not used yet and is affordable
+        """
+
+        return ~self.skill_used & (
+            self.stamina >= self.setup.unit_class.get_required_stamina()
+        )
+
+    def regenerate_stamina(self, factor: float, rows: np.ndarray) -> None:
+        """
+        BaseUnit.regenerate_stamina() for the rows
+        """
+
+        unit_class = self.setup.unit_class
+        regenerated = np.minimum(
+            np.round(self.stamina + factor * unit_class.get_stamina_mod(), 1),
+            unit_class.max_stamina,
+        )
+        np.copyto(self.stamina, regenerated, where=rows)
+
+
+def _check_health_and_regenerate(
+    hero: _Side, enemy: _Side, active: np.ndarray, outcomes: np.ndarray, stamina: float
+) -> None:
+    """
+    Arena.check_health_and_regenerate() for the active fights
+    finished fights get their outcomes and are removed from active
+    """
+
+    finished = active & ~((hero.health > 0.0) & (enemy.health > 0.0))
+    draw = (hero.health < 0.0) & (enemy.health < 0.0)
+    outcomes[finished] = np.where(draw, DRAW, np.where(enemy.health < 0.0, WIN, LOSS))[
+        finished
+    ]
+    active &= ~finished
+    hero.regenerate_stamina(stamina, active)
+    enemy.regenerate_stamina(stamina, active)
+
+
+def _play(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    hero_setup: Setup,
+    enemy_setup: Setup,
+    fights: int,
+    draws: Iterator[np.ndarray],
+    hero_policy: str,
+    max_turns: int,
+    stamina: float,
+) -> SimulationResult:
+    """
+    plays the fights turn by turn with Arena.complete_turn() rules
+    draws - a random array of shape (3, fights) for every turn:
+    the hero's damage, the enemy's choice, the enemy's damage
+    """
+
+    if hero_policy not in POLICIES:
+        raise ValueError(f"Unknown policy: {hero_policy}")
+    hero, enemy = _Side(hero_setup, fights), _Side(enemy_setup, fights)
+    active = np.ones(fights, dtype=bool)
+    outcomes = np.full(fights, UNFINISHED, dtype=np.int8)
+    turns = np.zeros(fights, dtype=np.int32)
+
+    for _ in range(max_turns):
+        if not active.any():
+            break
+        hero_draw, choice_draw, enemy_draw = next(draws)
+        turns += active
+
+        # the hero's action
+        using_skill = (
+            active & hero.can_use_skill()
+            if hero_policy == SKILL
+            else np.zeros_like(active)
+        )
+        hero.use_skill(enemy, using_skill)
+        hero.attack(enemy, active & ~using_skill, hero_draw)
+        _check_health_and_regenerate(hero, enemy, active, outcomes, stamina)
+
+        # CompPlayer.attack_or_use_skill(): randint(1, 10) == 5
+        using_skill = (
+            active & ((choice_draw * 10).astype(np.int8) == 4) & ~enemy.skill_used
+        )
+        enemy.use_skill(hero, using_skill)
+        enemy.attack(hero, active & ~using_skill, enemy_draw)
+        _check_health_and_regenerate(hero, enemy, active, outcomes, stamina)
+
+    return SimulationResult(outcomes, turns, hero.health, enemy.health)
+
+
+def _random_draws(rng: np.random.Generator, fights: int) -> Iterator[np.ndarray]:
+    while True:
+        yield rng.random((3, fights))
+
+
+def simulate(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    hero: Setup,
+    enemy: Setup,
+    fights: int = 100000,
+    seed: Optional[int] = None,
+    hero_policy: str = ATTACK,
+    max_turns: int = SIMULATION_MAX_TURNS,
+    stamina: float = STAMINA_RECOVER_PER_TURN,
+) -> SimulationResult:
+    """
+    simulates the fights of the hero (a human player) against the enemy (a computer player)
+    """
+
+    rng = np.random.default_rng(seed)
+    return _play(
+        hero, enemy, fights, _random_draws(rng, fights), hero_policy, max_turns, stamina
+    )
+
+
+def check_parity(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    hero: Setup,
+    enemy: Setup,
+    fights: int = 200,
+    seed: int = 0,
+    hero_policy: str = ATTACK,
+    max_turns: int = SIMULATION_MAX_TURNS,
+) -> int:
+    """
+    plays the same fights with the same random numbers by the simulator and by Arena
+    :returns the number of fights which results differ
+    """
+
+    rng = np.random.default_rng(seed)
+    turn_draws = [rng.random((3, fights)) for _ in range(max_turns)]
+    result = _play(
+        hero,
+        enemy,
+        fights,
+        iter(turn_draws),
+        hero_policy,
+        max_turns,
+        STAMINA_RECOVER_PER_TURN,
+    )
+
+    mismatches = 0
+    for fight in range(fights):
+        outcome, turns = _play_in_arena(hero, enemy, fight, turn_draws, hero_policy)
+        if (outcome, turns) != (result.outcomes[fight], result.turns[fight]):
+            mismatches += 1
+    return mismatches
+
+
+class _DrawsRandom(Random):
+    """
+    a generator returning the simulator's random numbers of a turn to the arena's units
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.draws: dict = {}
+
+    def seed(self, *args: Any, **kwargs: Any) -> None:
+        """
+        the arena seeds the generator every turn, the numbers are set by the simulator
+        """
+
+    def uniform(self, a: float, b: float) -> float:
+        return a + (b - a) * self.draws["enemy" if "enemy" in self.draws else "hero"]
+
+    def randint(self, a: int, b: int) -> int:
+        self.draws["enemy"] = self.draws.pop("enemy_damage")
+        return a + int(self.draws["choice"] * (b - a + 1))
+
+
+def _make_unit(class_name: Type[Unit], setup: Setup) -> Unit:
+    return class_name(
+        name="",
+        unit_class=setup.unit_class,
+        health=setup.unit_class.max_health,
+        stamina=setup.unit_class.max_stamina,
+        _weapon=setup.weapon,
+        _armor=setup.armor,
+    )
+
+
+def _play_in_arena(
+    hero_setup: Setup,
+    enemy_setup: Setup,
+    fight: int,
+    turn_draws: list,
+    hero_policy: str,
+) -> tuple[int, int]:
+    """
+    plays a fight in Arena feeding it with the simulator's random numbers
+    """
+
+    rng = _DrawsRandom()
+    arena = Arena()
+    arena.rng = rng
+    arena.hero = _make_unit(unit_module.HumanPlayer, hero_setup)
+    arena.enemy = _make_unit(unit_module.CompPlayer, enemy_setup)
+    arena.start_game()
+    outcome = ""
+    for turn, turn_draw in enumerate(turn_draws, 1):
+        rng.draws = dict(zip(("hero", "choice", "enemy_damage"), turn_draw[:, fight]))
+        use_skill = (
+            hero_policy == SKILL
+            and not arena.hero.skill_used
+            and arena.hero.stamina >= arena.hero.unit_class.get_required_stamina()
+        )
+        outcome = arena.use_skill() if use_skill else arena.attack()
+        if not arena.is_game_on():
+            break
+    else:
+        return UNFINISHED, turn
+    for code, message in (
+        (DRAW, "Ничья"),
+        (WIN, "Победил Игрок"),
+        (LOSS, "Победил Противник"),
+    ):
+        if outcome.endswith(message):
+            return code, turn
+    return UNFINISHED, turn
+
+
+# for debug only
+if __name__ == "__main__":
+    from app.equipment import Equipment
+
+    equipment = Equipment()
+    hero_setup_ = Setup(
+        UnitClass.get_unit_by_name("Воин"),
+        equipment.get_weapon("топорик"),
+        equipment.get_armor("кожаная броня"),
+    )
+    enemy_setup_ = Setup(
+        UnitClass.get_unit_by_name("Вор"),
+        equipment.get_weapon("ножик"),
+        equipment.get_armor("футболка"),
+    )
+
+    for policy in POLICIES:
+        res = simulate(
+            hero_setup_, enemy_setup_, fights=1000000, seed=1, hero_policy=policy
+        )
+        print(
+            policy, "win:", res.win_rate, "draw:", res.draw_rate, "loss:", res.loss_rate
+        )
+        print("turns:", res.turn_distribution())
+        print(
+            "parity mismatches:",
+            check_parity(hero_setup_, enemy_setup_, hero_policy=policy),
+        )
@@ -2,8 +2,17 @@
 
 from dataclasses import dataclass
 
+# the kinds of the skills' timed effects (applied by app.effects)
+POISON = "poison"  # the target takes power damage every turn
+FORTIFY = "fortify"  # the caster's armor is stronger by power
+WEAKEN = "weaken"  # the target's armor is weaker by power
+INVIGORATE = "invigorate"  # the caster gains power stamina every turn
+EXHAUST = "exhaust"  # the target loses power stamina every turn
+STUN = "stun"  # the target skips its actions
+EFFECTS = (POISON, FORTIFY, WEAKEN, INVIGORATE, EXHAUST, STUN)
 
-@dataclass
+
+@dataclass(frozen=True)
 class Skill:
     """
     abstract class for skills
@@ -12,6 +21,11 @@ class Skill:
     name: str
     damage: float
     required_stamina: float
+    id: int = 0
+    # the timed effect's kind (see EFFECTS and app.effects), none by default
+    effect: str = ""
+    duration: int = 0  # the effect's turns
+    power: float = 0.0  # the effect's damage, armor or stamina per turn
 
     def get_required_stamina(self) -> float:
         """
@@ -0,0 +1,272 @@
+"""
+This module contains a shared arena store
+to let several gunicorn workers (processes) serve the same fight
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+from typing import Optional, Type, TypeVar
+from weakref import WeakKeyDictionary, WeakValueDictionary
+
+from app.ai import choose_enemy_action
+from app.arena import Arena, StaleArenaError
+from app.classes import UnitClass
+from app.effects import Effect
+from app.equipment import Equipment
+from app.unit import (
+    BaseUnit,
+    HumanPlayer,
+    CompPlayer,
+    FixedPointUnit,
+    FIXED_POINT_PLAYERS,
+)
+
+Unit = TypeVar("Unit", bound=BaseUnit)
+
+
+def dump_unit(unit: BaseUnit) -> Optional[list]:
+    """
+    packs a unit into a compact list, the equipment is referenced by id
+    """
+
+    if unit is NotImplemented:
+        return None
+    return [
+        unit.name,
+        unit.unit_class.name,
+        unit.health_points,
+        unit.stamina_points,
+        unit.weapon.id,
+        unit.armor.id,
+        unit.skill_used,
+        isinstance(unit, FixedPointUnit),
+    ]
+
+
+def load_unit(
+    class_name: Type[Unit], data: Optional[list], equipment: Equipment
+) -> Unit:
+    """
+    unpacks a unit packed with dump_unit()
+    """
+
+    if data is None:
+        return NotImplemented
+    name, unit_class, health, stamina, weapon_id, armor_id, skill_used, fixed_point = (
+        data
+    )
+    if fixed_point:
+        class_name = FIXED_POINT_PLAYERS[class_name]
+    return class_name(
+        name=name,
+        unit_class=UnitClass.get_unit_by_name(unit_class),
+        health=class_name.encode(health),
+        stamina=class_name.encode(stamina),
+        _weapon=equipment.get_weapon_by_id(weapon_id),
+        _armor=equipment.get_armor_by_id(armor_id),
+        skill_used=skill_used,
+    )
+
+
+def dump_arena(arena: Arena) -> bytes:
+    """
+    serializes an arena
+    """
+
+    state = [
+        arena.stamina,
+        arena.game_on,
+        dump_unit(arena.hero),
+        dump_unit(arena.enemy),
+        arena.seed,
+        arena.log.hex(),
+        arena.enemy_ai is not None,
+        dump_effects(arena),
+        arena.result,
+        [
+            [request_id, status, response.decode()]
+            for request_id, (response, status) in arena.done_turns.items()
+        ],
+    ]
+    return json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def load_arena(  # pylint: disable=too-many-locals
+    data: bytes, equipment: Equipment
+) -> Arena:
+    """
+    deserializes an arena serialized with dump_arena()
+    """
+
+    stamina, game_on, hero, enemy, seed, log, *extra = json.loads(data)
+    arena = Arena(stamina, seed)
+    # missing in the arenas saved by the older versions
+    saved = len(extra)
+    smart_enemy, effects, result, done_turns = (extra + [False, None, "", []][saved:])[
+        :4
+    ]
+    if smart_enemy:
+        arena.enemy_ai = choose_enemy_action
+    arena.game_on = game_on
+    arena.result = result
+    arena.log = bytearray.fromhex(log)
+    arena.hero = load_unit(HumanPlayer, hero, equipment)
+    arena.enemy = load_unit(CompPlayer, enemy, equipment)
+    if effects:
+        load_effects(arena, effects)
+    for request_id, status, response in done_turns:
+        arena.remember_turn(request_id, response.encode(), status)
+    return arena
+
+
+def _digest(state: bytes) -> bytes:
+    return hashlib.blake2b(state, digest_size=16).digest()
+
+
+def dump_effects(arena: Arena) -> list:
+    """
+    packs the active effects of the arena: the scheduler's clock and an effect per list,
+    the target is referenced by its side
+    """
+
+    sides = {id(arena.hero): "hero", id(arena.enemy): "enemy"}
+    return [
+        arena.effects.now,
+        *(
+            [
+                effect.name,
+                effect.kind,
+                effect.power,
+                sides[id(effect.target)],
+                effect.ticks_left,
+                effect.due,
+            ]
+            for effect in arena.effects
+        ),
+    ]
+
+
+def load_effects(arena: Arena, data: list) -> None:
+    """
+    unpacks the effects packed with dump_effects() and applies them to the arena's units again
+    """
+
+    now, *effects = data
+    arena.effects.now = now
+    sides = {"hero": arena.hero, "enemy": arena.enemy}
+    for name, kind, power, side, ticks_left, due in effects:
+        arena.effects.apply(Effect(name, kind, power, sides[side], ticks_left, due))
+
+
+class SqliteArenaStore:
+    """
+    stores the arenas in an SQLite database (in WAL mode)
+    the same database file is shared by all the workers,
+    so a player's request can be served by any of them;
+    a save is optimistic: it fails with StaleArenaError if the arena was saved by another request
+    since it was read (every save makes a new revision),
+    an arena not changed since it was read isn't written
+    """
+
+    def __init__(self, file_name: str, equipment: Equipment):
+        self.file_name = file_name
+        self.equipment = equipment
+        self._local = threading.local()  # sqlite connections can't be shared by threads
+        # the revision and the state digest of the arenas read (while they are used)
+        self._read: WeakKeyDictionary[Arena, tuple[int, bytes]] = WeakKeyDictionary()
+        # the arena read or saved last
+        self._last: WeakValueDictionary[str, Arena] = WeakValueDictionary()
+        with self._connection as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS arenas"
+                " (session_id TEXT PRIMARY KEY, state BLOB, revision INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = [
+                row[1] for row in connection.execute("PRAGMA table_info(arenas)")
+            ]
+            if "revision" not in columns:  # a database made by an older version
+                connection.execute(
+                    "ALTER TABLE arenas ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"
+                )
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.file_name, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, session_id: str) -> Arena:
+        """
+        returns the arena of the session, or a new one if there is none
+        """
+
+        row = self._connection.execute(
+            "SELECT state, revision FROM arenas WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return Arena()
+        arena = load_arena(row[0], self.equipment)
+        self._read[arena] = row[1], _digest(row[0])
+        self._last[session_id] = arena
+        return arena
+
+    def save(self, session_id: str, arena: Arena) -> None:
+        """
+        saves the arena of the session if nobody saved it since it was read
+        (a new arena if nobody saved one since), raises StaleArenaError otherwise
+        """
+
+        state = dump_arena(arena)
+        digest = _digest(state)
+        read = self._read.get(arena)
+        if read is not None and read[1] == digest:
+            return
+        revision = 0 if read is None else read[0] + 1
+        with self._connection as connection:
+            updated = (
+                read is not None
+                and connection.execute(
+                    "UPDATE arenas SET state = ?, revision = ?"
+                    " WHERE session_id = ? AND revision = ?",
+                    (state, revision, session_id, read[0]),
+                ).rowcount
+            )
+            if not updated:
+                try:  # a new arena, or the read one was removed since
+                    connection.execute(
+                        "INSERT INTO arenas (session_id, state, revision) VALUES (?, ?, ?)",
+                        (session_id, state, revision),
+                    )
+                except sqlite3.IntegrityError as error:
+                    raise StaleArenaError(session_id) from error
+        self._read[arena] = revision, digest
+        self._last[session_id] = arena
+
+    def remove(self, session_id: str) -> None:
+        """
+        removes the arena of the session
+        (the arena read last is forgotten, so its next save writes it even if it isn't changed)
+        """
+
+        with self._connection as connection:
+            connection.execute("DELETE FROM arenas WHERE session_id = ?", (session_id,))
+        arena = self._last.pop(session_id, None)
+        if arena is not None:
+            self._read.pop(arena, None)
+
+    def __contains__(self, session_id: str) -> bool:
+        row = self._connection.execute(
+            "SELECT 1 FROM arenas WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM arenas").fetchone()[0]
@@ -0,0 +1,52 @@
+"""This module contains a broker delivering the fight updates to the fight pages (SSE)"""
+
+from __future__ import annotations
+
+from queue import SimpleQueue
+from threading import Lock
+
+
+class EventBroker:
+    """
+    keeps a queue per open stream (a fight page) and puts the published messages to them
+    works within a worker process, the streams and the actions of a player
+    have to be served by the same worker
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: dict[str, list[SimpleQueue]] = {}
+        self._lock = Lock()
+
+    def subscribe(self, session_id: str) -> SimpleQueue:
+        """
+        opens a stream of the session
+        :returns the queue to read the messages from
+        """
+
+        messages: SimpleQueue = SimpleQueue()
+        with self._lock:
+            self._subscribers.setdefault(session_id, []).append(messages)
+        return messages
+
+    def unsubscribe(self, session_id: str, messages: SimpleQueue) -> None:
+        """
+        closes a stream of the session
+        """
+
+        with self._lock:
+            queues = self._subscribers.get(session_id, [])
+            if messages in queues:
+                queues.remove(messages)
+            if not queues:
+                self._subscribers.pop(session_id, None)
+
+    def publish(self, session_id: str, message: str) -> None:
+        """
+        sends the message to all the streams of the session
+        """
+
+        for messages in self._subscribers.get(session_id, ()):
+            messages.put(message)
+
+    def __len__(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
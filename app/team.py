@@ -0,0 +1,493 @@
+"""
+This module contains team battles: a squad of heroes against a squad of enemies
+every side is kept as NumPy arrays (a unit per row), a turn is resolved for all the units at once
+with the rules of BaseUnit and Arena:
+1. the heroes act: every living hero attacks the target chosen by the targeting policy
+   (or uses the skill with the "skill" policy), then the health is checked
+   and the stamina regenerated
+2. the enemies act the same way (the skill with a 10% chance, like CompPlayer)
+the attacks of a side are simultaneous: a target's armor is checked once before them,
+every hit drains the target's armor stamina; the timed effects of the skills (app.effects) are fired
+at the health checks and work on the units as on the arena's ones;
+a unit with no health left (0 or less) is dead
+(Arena counts a fight the enemy ends with exactly 0 as lost)
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from app.const import STAMINA_RECOVER_PER_TURN, SIMULATION_MAX_TURNS
+from app.effects import EffectScheduler
+from app.unit import BaseUnit
+from app.unit_array import UnitArray
+
+ENEMY_SKILL_CHANCE = 0.1  # CompPlayer.attack_or_use_skill(): randint(1, 10) == 5
+
+# choose the targets: by the attackers' side, the targets' side and the generator
+# :returns the target's index per attacker
+TargetPolicy = Callable[["Squad", "Squad", np.random.Generator], np.ndarray]
+
+# the heroes' action policies
+ATTACK = "attack"  # always attack
+SKILL = "skill"  # use the skill as soon as it is affordable, attack otherwise
+POLICIES = (ATTACK, SKILL)
+
+
+class Squad:  # pylint: disable=too-many-instance-attributes
+    """
+    the units of a side as arrays, a unit per row
+    the state of the units is packed into a UnitArray (the arrays are its views),
+    the classes and the equipment are unpacked once, so a turn needs no per-unit calls
+    """
+
+    def __init__(self, units: Sequence[BaseUnit]):
+        if not units:
+            raise ValueError("A squad needs at least one unit")
+        # the state of the units, the arrays below are its views
+        self.units = UnitArray()
+        for unit in units:
+            self.units.append(unit)
+        self.names = self.units.names
+        self.health = np.frombuffer(self.units.health)
+        self.stamina = np.frombuffer(self.units.stamina)
+        self.skill_used = np.frombuffer(self.units.skill_used, dtype=bool)
+        self.armor_bonus = np.frombuffer(self.units.armor_bonus)
+        self.stunned = np.frombuffer(self.units.stunned, dtype=np.intc)
+        self.max_stamina = np.array(
+            [unit.unit_class.max_stamina for unit in units], dtype=float
+        )
+        self.stamina_mod = np.array(
+            [unit.get_stamina_mod() for unit in units], dtype=float
+        )
+        self.attack = np.array([unit.unit_class.attack for unit in units], dtype=float)
+        self.min_damage = np.array(
+            [unit.weapon.min_damage for unit in units], dtype=float
+        )
+        self.damage_range = np.array(
+            [unit.weapon.max_damage - unit.weapon.min_damage for unit in units],
+            dtype=float,
+        )
+        self.hit_cost = np.array(
+            [unit.weapon.stamina_per_hit for unit in units], dtype=float
+        )
+        self.defence = np.array(
+            [unit.armor.defence * unit.unit_class.armor for unit in units], dtype=float
+        )
+        self.defence_cost = np.array(
+            [unit.armor.stamina_per_turn for unit in units], dtype=float
+        )
+        self.skill_damage = np.array(
+            [unit.unit_class.skill.damage for unit in units], dtype=float
+        )
+        self.skill_cost = np.array(
+            [unit.unit_class.get_required_stamina() for unit in units], dtype=float
+        )
+        self.skills = [unit.unit_class.skill for unit in units]
+        self.has_effect = np.array(
+            [bool(skill.effect) for skill in self.skills], dtype=bool
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def alive(self) -> np.ndarray:
+        """
+        whether every unit is alive
+        """
+
+        return self.health > 0.0
+
+    def can_use_skill(self) -> np.ndarray:
+        """
+        whether the skill of every unit is not used yet and is affordable
+        """
+
+        return ~self.skill_used & (self.stamina >= self.skill_cost)
+
+    def act(
+        self,
+        other: Squad,
+        attackers: np.ndarray,
+        skill_users: np.ndarray,
+        targets: np.ndarray,
+        draw: np.ndarray,
+    ) -> np.ndarray:
+        """
+        BaseUnit.attack() and BaseUnit.use_skill() of the units against their targets
+        (the stunned units skip)
+        attackers, skill_users - the masks of the units attacking and using their skill
+        targets - the target's index per unit,
+        draw - random numbers in [0, 1) to choose the weapon damage
+        :returns the mask of the units which used their skill
+        """
+
+        ready = self.stunned == 0
+        attackers = attackers & ready & (self.stamina >= self.hit_cost)
+        skill_users = skill_users & ready & self.can_use_skill()
+        attacking_damage = np.round(
+            (self.min_damage + self.damage_range * draw) * self.attack, 1
+        )
+        armor = np.maximum(other.defence + other.armor_bonus, 0.0)
+        target_armor = np.where(other.stamina >= other.defence_cost, armor, 0.0)[
+            targets
+        ]
+        final_damage = np.round(np.maximum(attacking_damage - target_armor, 0.0), 1)
+        damage = np.where(attackers, final_damage, 0.0) + np.where(
+            skill_users, self.skill_damage, 0.0
+        )
+
+        size = len(other)
+        other.health[:] = np.round(
+            other.health - np.bincount(targets, weights=damage, minlength=size), 1
+        )
+        other.stamina -= (
+            np.bincount(targets[attackers], minlength=size) * other.defence_cost
+        )
+        self.stamina -= np.where(attackers, self.hit_cost, 0.0)
+        self.skill_used |= skill_users
+        return skill_users
+
+    def unit(self, index: int) -> SquadUnit:
+        """
+        returns a unit of the squad as the target of the effects
+        """
+
+        return SquadUnit(self, index)
+
+    def regenerate_stamina(self, factor: float) -> None:
+        """
+        BaseUnit.regenerate_stamina() of the living units
+        """
+
+        regenerated = np.minimum(
+            np.round(self.stamina + factor * self.stamina_mod, 1), self.max_stamina
+        )
+        np.copyto(self.stamina, regenerated, where=self.alive)
+
+    def store(self, units: Sequence[BaseUnit]) -> None:
+        """
+        writes the state of the units back to the unit objects the squad was made of
+        """
+
+        for index, unit in enumerate(units):
+            self.units.restore(index, unit)
+
+
+class SquadUnit:
+    """
+    a unit of a squad (a row of its arrays) with the attributes of BaseUnit the effects change
+    """
+
+    __slots__ = ("squad", "index")
+
+    def __init__(self, squad: Squad, index: int):
+        self.squad = squad
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        """
+        the unit's name
+        """
+
+        return self.squad.names[self.index]
+
+    @property
+    def health(self) -> float:
+        """
+        the unit's health
+        """
+
+        return float(self.squad.health[self.index])
+
+    @health.setter
+    def health(self, value: float) -> None:
+        self.squad.health[self.index] = value
+
+    @property
+    def stamina(self) -> float:
+        """
+        the unit's stamina
+        """
+
+        return float(self.squad.stamina[self.index])
+
+    @stamina.setter
+    def stamina(self, value: float) -> None:
+        self.squad.stamina[self.index] = value
+
+    @property
+    def armor_bonus(self) -> float:
+        """
+        added to the unit's armor by the effects
+        """
+
+        return float(self.squad.armor_bonus[self.index])
+
+    @armor_bonus.setter
+    def armor_bonus(self, value: float) -> None:
+        self.squad.armor_bonus[self.index] = value
+
+    @property
+    def stunned(self) -> int:
+        """
+        the stun effects on the unit
+        """
+
+        return int(self.squad.stunned[self.index])
+
+    @stunned.setter
+    def stunned(self, value: int) -> None:
+        self.squad.stunned[self.index] = value
+
+    @staticmethod
+    def encode(value: float) -> float:
+        """
+        the squads keep the values as they are (see BaseUnit.encode())
+        """
+
+        return value
+
+    @staticmethod
+    def decode(value: float) -> float:
+        """
+        the squads keep the values as they are (see BaseUnit.decode())
+        """
+
+        return value
+
+    def get_damage(self, damage: float) -> None:
+        """
+        BaseUnit.get_damage()
+        """
+
+        self.health = round(self.health - damage, 1)
+
+
+def _living(squad: Squad) -> np.ndarray:
+    return np.flatnonzero(squad.alive)
+
+
+def target_random(
+    attackers: Squad, targets: Squad, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    every unit attacks a random living target
+    """
+
+    living = _living(targets)
+    return living[rng.integers(len(living), size=len(attackers))]
+
+
+def target_weakest(
+    attackers: Squad, targets: Squad, _rng: np.random.Generator
+) -> np.ndarray:
+    """
+    all the units attack the living target with the least health (focus fire)
+    """
+
+    living = _living(targets)
+    return np.full(len(attackers), living[np.argmin(targets.health[living])])
+
+
+def target_spread(
+    attackers: Squad, targets: Squad, _rng: np.random.Generator
+) -> np.ndarray:
+    """
+    the units spread their attacks over the living targets evenly
+    """
+
+    living = _living(targets)
+    return living[np.arange(len(attackers)) % len(living)]
+
+
+TARGET_POLICIES: dict[str, TargetPolicy] = {
+    "random": target_random,
+    "weakest": target_weakest,
+    "spread": target_spread,
+}
+
+
+class TeamBattle:  # pylint: disable=too-many-instance-attributes
+    """
+    a battle of a squad of heroes (the human player's)
+    against a squad of enemies (the computer player's)
+    the battle is reproducible from the seed
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        heroes: Squad,
+        enemies: Squad,
+        hero_policy: str = ATTACK,
+        hero_targeting: str = "random",
+        enemy_targeting: str = "random",
+        stamina: float = STAMINA_RECOVER_PER_TURN,
+        seed: Optional[int] = None,
+    ):
+        if hero_policy not in POLICIES:
+            raise ValueError(f"Unknown policy: {hero_policy}")
+        if (
+            hero_targeting not in TARGET_POLICIES
+            or enemy_targeting not in TARGET_POLICIES
+        ):
+            raise ValueError(f"Unknown targeting: {hero_targeting}, {enemy_targeting}")
+        self.heroes = heroes
+        self.enemies = enemies
+        self.hero_policy = hero_policy
+        self.hero_targeting = TARGET_POLICIES[hero_targeting]
+        self.enemy_targeting = TARGET_POLICIES[enemy_targeting]
+        self.stamina = stamina
+        self.rng = np.random.default_rng(seed)
+        self.effects = EffectScheduler()
+        self.turns = 0
+        # "win", "draw" or "loss" (from the heroes' point of view) when the battle is over
+        self.result = ""
+
+    def is_game_on(self) -> bool:
+        """
+        returns True until a side is wiped out
+        """
+
+        return not self.result
+
+    def check_health_and_regenerate(self) -> None:
+        """
+        Arena.check_health_and_regenerate() for the squads: ends the battle if a side is wiped out,
+        regenerates the living units' stamina otherwise
+        """
+
+        self.effects.advance()
+        heroes_alive, enemies_alive = self.heroes.alive.any(), self.enemies.alive.any()
+        if heroes_alive and enemies_alive:
+            self.heroes.regenerate_stamina(self.stamina)
+            self.enemies.regenerate_stamina(self.stamina)
+        elif heroes_alive:
+            self.result = "win"
+        elif enemies_alive:
+            self.result = "loss"
+        else:
+            self.result = "draw"
+
+    def complete_turn(self) -> None:
+        """
+        plays a turn of both sides
+        """
+
+        if not self.is_game_on():
+            return
+        self.turns += 1
+        heroes, enemies = self.heroes, self.enemies
+        if self.hero_policy == SKILL:
+            skill_users = heroes.alive & heroes.can_use_skill()
+        else:
+            skill_users = np.zeros(len(heroes), dtype=bool)
+        targets = self.hero_targeting(heroes, enemies, self.rng)
+        skill_users = heroes.act(
+            enemies,
+            heroes.alive & ~skill_users,
+            skill_users,
+            targets,
+            self.rng.random(len(heroes)),
+        )
+        self.cast_effects(heroes, enemies, skill_users, targets)
+        self.check_health_and_regenerate()
+        if not self.is_game_on():
+            return
+
+        skill_users = (
+            enemies.alive
+            & ~enemies.skill_used
+            & (self.rng.random(len(enemies)) < ENEMY_SKILL_CHANCE)
+        )
+        targets = self.enemy_targeting(enemies, heroes, self.rng)
+        skill_users = enemies.act(
+            heroes,
+            enemies.alive & ~skill_users,
+            skill_users,
+            targets,
+            self.rng.random(len(enemies)),
+        )
+        self.cast_effects(enemies, heroes, skill_users, targets)
+        self.check_health_and_regenerate()
+
+    def cast_effects(
+        self,
+        casters: Squad,
+        others: Squad,
+        skill_users: np.ndarray,
+        targets: np.ndarray,
+    ) -> None:
+        """
+        casts the effects of the skills used (a unit uses its skill once a fight, so these are few)
+        """
+
+        for index in np.flatnonzero(skill_users & casters.has_effect):
+            self.effects.cast(
+                casters.skills[index],
+                casters.unit(int(index)),
+                others.unit(int(targets[index])),
+            )
+
+    def play(self, max_turns: int = SIMULATION_MAX_TURNS) -> str:
+        """
+        plays the turns until the battle is over (or max_turns are played)
+        :returns the result ("" if not finished)
+        """
+
+        while self.is_game_on() and self.turns < max_turns:
+            self.complete_turn()
+        return self.result
+
+
+# for debug only
+if __name__ == "__main__":
+    from app.classes import UnitClass
+    from app.equipment import Equipment
+    from app.unit import HumanPlayer, CompPlayer
+
+    equipment = Equipment()
+
+    def make_squad(
+        class_name: type, size: int, unit_class: str, weapon: str, armor: str
+    ) -> Squad:
+        """
+        makes a squad of the same units
+        """
+
+        unit_type = UnitClass.get_unit_by_name(unit_class)
+        return Squad(
+            [
+                class_name(
+                    f"{unit_class} {number}",
+                    unit_type,
+                    unit_type.max_health,
+                    unit_type.max_stamina,
+                    _weapon=equipment.get_weapon(weapon),
+                    _armor=equipment.get_armor(armor),
+                )
+                for number in range(size)
+            ]
+        )
+
+    for targeting in TARGET_POLICIES:
+        battle = TeamBattle(
+            make_squad(HumanPlayer, 300, "Воин", "топорик", "кожаная броня"),
+            make_squad(CompPlayer, 300, "Вор", "ножик", "панцирь"),
+            hero_targeting=targeting,
+            seed=0,
+        )
+        started = time.perf_counter()
+        result = battle.play()
+        spent = time.perf_counter() - started
+        print(
+            f"300 vs 300, {targeting:>8}: {result or 'unfinished'} in {battle.turns} turns,"
+            f" heroes left {np.count_nonzero(battle.heroes.alive)},"
+            f" enemies left {np.count_nonzero(battle.enemies.alive)},"
+            f" {spent / max(battle.turns, 1) * 1000:.3f} ms per turn"
+        )
@@ -0,0 +1,214 @@
+"""
+This module contains a tournament runner:
+every hero setup (class, weapon, armor) fights every enemy setup,
+the win rates are written to a CSV matrix
+
+usage: python -m app.tournament --fights 10000 --output matrix.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import os
+import sys
+from itertools import product
+from multiprocessing import Pool
+from typing import Iterator, Optional
+
+from app.classes import UnitClass
+from app.const import SIMULATION_MAX_TURNS, TOURNAMENT_CACHE_FILE
+from app.equipment import Equipment
+from app.simulator import Setup, simulate, ATTACK, POLICIES
+
+CACHE_FIELDS = ["key", "win", "draw", "loss", "unfinished", "mean_turns"]
+
+_setups: list[Setup] = []  # the catalog of a worker process
+
+
+def get_setups() -> list[Setup]:
+    """
+    returns all the (class, weapon, armor) combinations of the catalog
+    """
+
+    if not _setups:
+        equipment = Equipment()
+        _setups.extend(
+            Setup(unit_class, weapon, armor)
+            for unit_class, weapon, armor in product(
+                UnitClass.instances,
+                equipment.equipment.weapons,
+                equipment.equipment.armors,
+            )
+        )
+    return _setups
+
+
+def setup_name(setup: Setup) -> str:
+    """
+    a human readable name of a setup
+    """
+
+    return f"{setup.unit_class.name}/{setup.weapon.name}/{setup.armor.name}"
+
+
+def matchup_key(
+    hero: Setup, enemy: Setup, fights: int, policy: str, max_turns: int
+) -> str:
+    """
+    a hash of everything a matchup result depends on
+    a changed class or item changes the keys of its matchups only
+    """
+
+    data = repr((hero, enemy, fights, policy, max_turns)).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def play_chunk(
+    chunk: list[tuple[int, int, str]], fights: int, policy: str, max_turns: int
+) -> list[list]:
+    """
+    simulates a chunk of matchups (hero index, enemy index, key) in a worker process
+    :returns cache rows
+    """
+
+    setups = get_setups()
+    rows = []
+    for hero, enemy, key in chunk:
+        result = simulate(
+            setups[hero],
+            setups[enemy],
+            fights=fights,
+            seed=int(key[:16], 16),
+            hero_policy=policy,
+            max_turns=max_turns,
+        )
+        rows.append(
+            [
+                key,
+                result.win_rate,
+                result.draw_rate,
+                result.loss_rate,
+                result.unfinished_rate,
+                float(result.turns.mean()),
+            ]
+        )
+    return rows
+
+
+def _play_chunk(args: tuple) -> list[list]:
+    return play_chunk(*args)
+
+
+def read_cache(file_name: str) -> dict[str, dict]:
+    """
+    reads the results of the matchups simulated earlier (by this run if it was interrupted too)
+    """
+
+    if not os.path.exists(file_name):
+        return {}
+    with open(file_name, "r", encoding="utf-8", newline="") as file_handler:
+        return {row["key"]: row for row in csv.DictReader(file_handler)}
+
+
+def chunks(items: list, size: int) -> Iterator[list]:
+    """
+    splits the items into chunks of the size
+    """
+
+    for start in range(0, len(items), size):
+        end = start + size
+        yield items[start:end]
+
+
+def run_tournament(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    output: str,
+    fights: int = 10000,
+    policy: str = ATTACK,
+    max_turns: int = SIMULATION_MAX_TURNS,
+    processes: Optional[int] = None,
+    chunk_size: int = 4,
+    cache_file: str = TOURNAMENT_CACHE_FILE,
+) -> None:
+    """
+    simulates all the matchups not found in the cache and writes the win rate matrix
+    the chunks are small and handed out one by one, so an idle process takes the next one
+    every finished chunk is appended to the cache, an interrupted run resumes from it
+    """
+
+    setups = get_setups()
+    cache = read_cache(cache_file)
+    keys = {
+        (hero, enemy): matchup_key(
+            setups[hero], setups[enemy], fights, policy, max_turns
+        )
+        for hero, enemy in product(range(len(setups)), repeat=2)
+    }
+    todo = [
+        (hero, enemy, key) for (hero, enemy), key in keys.items() if key not in cache
+    ]
+    print(f"matchups: {len(keys)}, cached: {len(keys) - len(todo)}", file=sys.stderr)
+
+    if todo:
+        new_file = not os.path.exists(cache_file)
+        with open(cache_file, "a", encoding="utf-8", newline="") as file_handler, Pool(
+            processes
+        ) as pool:
+            writer = csv.writer(file_handler)
+            if new_file:
+                writer.writerow(CACHE_FIELDS)
+            tasks = (
+                (chunk, fights, policy, max_turns) for chunk in chunks(todo, chunk_size)
+            )
+            done = 0
+            for rows in pool.imap_unordered(_play_chunk, tasks):
+                writer.writerows(rows)
+                file_handler.flush()  # a checkpoint
+                for row in rows:
+                    cache[row[0]] = dict(zip(CACHE_FIELDS, row))
+                done += len(rows)
+                print(f"\rsimulated: {done}/{len(todo)}", end="", file=sys.stderr)
+        print(file=sys.stderr)
+
+    with open(output, "w", encoding="utf-8", newline="") as file_handler:
+        writer = csv.writer(file_handler)
+        writer.writerow(["hero \\ enemy"] + [setup_name(setup) for setup in setups])
+        for hero, setup in enumerate(setups):
+            writer.writerow(
+                [setup_name(setup)]
+                + [cache[keys[hero, enemy]]["win"] for enemy in range(len(setups))]
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Simulates every hero setup against every enemy setup"
+    )
+    parser.add_argument(
+        "--output", default="matrix.csv", help="the win rate matrix CSV file"
+    )
+    parser.add_argument("--fights", type=int, default=10000, help="fights per matchup")
+    parser.add_argument(
+        "--policy", choices=POLICIES, default=ATTACK, help="the hero's policy"
+    )
+    parser.add_argument("--max-turns", type=int, default=SIMULATION_MAX_TURNS)
+    parser.add_argument(
+        "--processes", type=int, default=None, help="all the cores by default"
+    )
+    parser.add_argument("--chunk-size", type=int, default=4, help="matchups per task")
+    parser.add_argument(
+        "--cache",
+        default=TOURNAMENT_CACHE_FILE,
+        help="the results cache (checkpoint) file",
+    )
+    args_ = parser.parse_args()
+    run_tournament(
+        args_.output,
+        fights=args_.fights,
+        policy=args_.policy,
+        max_turns=args_.max_turns,
+        processes=args_.processes,
+        chunk_size=args_.chunk_size,
+        cache_file=args_.cache,
+    )
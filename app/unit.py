@@ -1,18 +1,34 @@
 """Sets up a hero's logics"""
 
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from random import uniform, randint
+from random import Random
 
-from app.classes import UnitClass, warrior, thief
+from app.classes import UnitClass
 from app.equipment import Weapon, Armor, Equipment
 
+# for the units out of an arena (an arena gives its units its own generator)
+_rng = Random()
+
 
 @dataclass
-class BaseUnit:
+class Setup:
+    """
+    a unit's class and equipment (see app.simulator and app.odds)
+    """
+
+    unit_class: UnitClass
+    weapon: Weapon
+    armor: Armor
+
+
+@dataclass(slots=True)
+class BaseUnit:  # pylint: disable=too-many-instance-attributes
     """
     an base class for a hero
+    the instances are slotted (no __dict__), the equipment is shared with the catalog,
+    so a unit takes a few dozen bytes (see also app.unit_array)
     """
 
     name: str
@@ -22,6 +38,9 @@ class BaseUnit:
     _weapon: Weapon = NotImplemented
     _armor: Armor = NotImplemented
     skill_used: bool = False
+    armor_bonus: float = 0.0  # added to the armor by the effects (see app.effects)
+    stunned: int = 0  # the stun effects on the unit, a stunned unit skips its actions
+    rng: Random = field(default=_rng, repr=False, compare=False)
 
     @property
     def weapon(self) -> Weapon:
@@ -53,6 +72,38 @@ class BaseUnit:
         else:
             print("Not a valid instance of Armor")
 
+    @classmethod
+    def encode(cls, value: float) -> float:
+        """
+        converts a value (health, stamina, damage) to the unit's inner representation
+        """
+
+        return value
+
+    @classmethod
+    def decode(cls, value: float) -> float:
+        """
+        converts a value from the unit's inner representation (to show or save it)
+        """
+
+        return value
+
+    @property
+    def health_points(self) -> float:
+        """
+        the health to show or save
+        """
+
+        return self.decode(self.health)
+
+    @property
+    def stamina_points(self) -> float:
+        """
+        the stamina to show or save
+        """
+
+        return self.decode(self.stamina)
+
     def get_damage(self, damage: float) -> None:
         """
         вычисление полученного урона персонажем (см. шаг IV)
@@ -67,29 +118,47 @@ class BaseUnit:
 
         return self.unit_class.get_stamina_mod()
 
+    def get_hit_cost(self) -> float:
+        """
+        to get the stamina consumed by a hit
+        """
+
+        return self._weapon.stamina_per_hit
+
+    def get_defence_cost(self) -> float:
+        """
+        to get the stamina consumed by the armor per turn
+        """
+
+        return self._armor.stamina_per_turn
+
     def stamina_for_defend_enough(self) -> bool:
         """
         checks whether stamina for defend is enough
         """
 
-        return self.stamina >= self.armor.stamina_per_turn
+        return self.stamina >= self.get_defence_cost()
 
     def stamina_for_attack_enough(self) -> bool:
         """
         checks whether stamina for attack is enough
         """
 
-        return self.stamina >= self.weapon.stamina_per_hit
+        return self.stamina >= self.get_hit_cost()
 
     def _get_final_damage(self, other: BaseUnit) -> float:
         """
         calculates the final damage of an attack
         """
 
-        damage_from_weapon = uniform(self.weapon.min_damage, self.weapon.max_damage)
+        damage_from_weapon = self.rng.uniform(
+            self._weapon.min_damage, self._weapon.max_damage
+        )
         attacking_damage = round(damage_from_weapon * self.unit_class.attack, 1)
 
-        _armor = other.armor.defence * other.unit_class.armor
+        _armor = max(
+            other.armor.defence * other.unit_class.armor + other.armor_bonus, 0.0
+        )
         target_armor = _armor if other.stamina_for_defend_enough() else 0.0
 
         return round(max(attacking_damage - target_armor, 0.0), 1)
@@ -101,26 +170,36 @@ class BaseUnit:
 
         if not self.stamina_for_attack_enough():
             return (
-                f"{self.name} пытался использовать {self.weapon.name},"
+                f"{self.name} пытался использовать {self._weapon.name},"
                 f" но у него не хватило выносливости. "
             )
 
         final_damage = self._get_final_damage(other)
         other.get_damage(final_damage)
 
-        self.stamina -= self.weapon.stamina_per_hit
-        other.stamina -= other.armor.stamina_per_turn
+        self.stamina -= self.get_hit_cost()
+        other.stamina -= other.get_defence_cost()
 
         if final_damage > 0:
             return (
-                f"{self.name}, используя {self.weapon.name},"
-                f" пробивает {other.armor.name} соперника и наносит {final_damage} урона. "
+                f"{self.name}, используя {self._weapon.name},"
+                f" пробивает {other.armor.name} соперника"
+                f" и наносит {self.decode(final_damage)} урона. "
             )
         return (
-            f"{self.name}, используя {self.weapon.name}, наносит удар,"
+            f"{self.name}, используя {self._weapon.name}, наносит удар,"
             f" но {other.armor.name} соперника его останавливает. "
         )
 
+    def can_use_skill(self) -> bool:
+        """
+        checks whether the skill is not used yet and stamina for it is enough
+        """
+
+        return not self.skill_used and self.stamina >= self.encode(
+            self.unit_class.get_required_stamina()
+        )
+
     def use_skill(self, other: BaseUnit) -> str:
         """
         применение умения к цели (см. шаг IV)
@@ -130,9 +209,9 @@ class BaseUnit:
             return "Навык уже использован. "
 
         # if stamina is enough:
-        if self.stamina >= self.unit_class.get_required_stamina():
+        if self.stamina >= self.encode(self.unit_class.get_required_stamina()):
             self.skill_used = True
-            other.get_damage(self.unit_class.skill.damage)
+            other.get_damage(other.encode(self.unit_class.skill.damage))
             return (
                 f"{self.name} использует {self.unit_class.skill_name}"
                 f" и наносит {self.unit_class.skill.damage} урона сопернику. "
@@ -142,6 +221,13 @@ class BaseUnit:
             f" но у него не хватило выносливости. "
         )
 
+    def skip_stunned(self) -> str:
+        """
+        to skip the action of a stunned unit
+        """
+
+        return f"{self.name} оглушён и пропускает ход. "
+
     def regenerate_stamina(self, factor: float) -> None:
         """
         to regenerate the player's stamina
@@ -153,39 +239,119 @@ class BaseUnit:
         )
 
 
+class FixedPointUnit(BaseUnit):
+    """
+    a unit keeping health, stamina and damage in integer tenths (fixed point)
+    no float rounding on every step, so the results are the same on every machine
+    the values are converted with encode() and decode() to be shown or saved
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def encode(cls, value: float) -> int:
+        return round(value * 10)
+
+    @classmethod
+    def decode(cls, value: float) -> float:
+        return value / 10
+
+    def get_damage(self, damage: float) -> None:
+        self.health -= damage
+
+    def get_hit_cost(self) -> int:
+        return round(self._weapon.stamina_per_hit * 10)
+
+    def get_defence_cost(self) -> int:
+        return round(self._armor.stamina_per_turn * 10)
+
+    def _get_final_damage(self, other: BaseUnit) -> int:
+        damage_from_weapon = self.rng.uniform(
+            self._weapon.min_damage, self._weapon.max_damage
+        )
+        attacking_damage = round(damage_from_weapon * self.unit_class.attack * 10)
+
+        _armor = max(
+            other.armor.defence * other.unit_class.armor * 10 + other.armor_bonus, 0
+        )
+        target_armor = _armor if other.stamina_for_defend_enough() else 0.0
+
+        return max(round(attacking_damage - target_armor), 0)
+
+    def regenerate_stamina(self, factor: float) -> None:
+        self.stamina = min(
+            self.stamina + round(factor * self.get_stamina_mod() * 10),
+            round(self.unit_class.max_stamina * 10),
+        )
+
+
 class HumanPlayer(BaseUnit):
     """
     A human player's class
     """
 
+    __slots__ = ()
+
 
 class CompPlayer(BaseUnit):
     """
     A computer player's class
     """
 
+    __slots__ = ()
+
     def attack_or_use_skill(self, other: HumanPlayer) -> str:
         """
         to conduct the comp player's attack or skill usage
         """
 
         if (
-            randint(1, 10) == 5
+            self.rng.randint(1, 10) == 5
         ) and not self.skill_used:  # 10% chance to use the hero's skill
             return self.use_skill(other)
         return self.attack(other)
 
+    def skip_turn(self) -> str:
+        """
+        to skip the comp player's turn (to save stamina)
+        """
+
+        return f"{self.name} пропускает ход. "
+
+
+class FixedPointHumanPlayer(FixedPointUnit, HumanPlayer):
+    """
+    A human player's class in the fixed point mode
+    """
+
+    __slots__ = ()
+
+
+class FixedPointCompPlayer(FixedPointUnit, CompPlayer):
+    """
+    A computer player's class in the fixed point mode
+    """
+
+    __slots__ = ()
+
+
+# the players' classes to use in the fixed point mode
+FIXED_POINT_PLAYERS: dict[type, type] = {
+    HumanPlayer: FixedPointHumanPlayer,
+    CompPlayer: FixedPointCompPlayer,
+}
+
 
 # for debug only
 if __name__ == "__main__":
     equipment = Equipment()
 
-    hero = HumanPlayer("Отважный герой", warrior, 10.0, 10.0)
+    hero = HumanPlayer("Отважный герой", UnitClass.get_unit_by_name("Воин"), 10.0, 10.0)
     hero.weapon = equipment.get_weapon("топорик")
     hero.armor = equipment.get_armor("кожаная броня")
     print(hero)
 
-    enemy = CompPlayer("Гнусный вор", thief, 10.0, 10.0)
+    enemy = CompPlayer("Гнусный вор", UnitClass.get_unit_by_name("Вор"), 10.0, 10.0)
     enemy.weapon = equipment.get_weapon("ножик")
     enemy.armor = equipment.get_armor("футболка")
     print(enemy)
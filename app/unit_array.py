@@ -0,0 +1,125 @@
+"""This module contains a struct-of-arrays container to keep many units compactly"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Optional, Type, TypeVar
+
+from app.classes import UnitClass
+from app.equipment import Equipment
+from app.unit import BaseUnit
+
+Unit = TypeVar("Unit", bound=BaseUnit)
+
+# the typed arrays of the units, a value per unit
+FIELDS = (
+    "health",
+    "stamina",
+    "class_ids",
+    "weapon_ids",
+    "armor_ids",
+    "skill_used",
+    "armor_bonus",
+    "stunned",
+)
+
+
+class UnitArray:  # pylint: disable=too-many-instance-attributes
+    """
+    packs units into contiguous typed arrays, one array per field
+    the classes and the equipment are referenced by id,
+    the values are kept decoded (see BaseUnit.decode()),
+    a unit takes 35 bytes plus a reference to its name
+    the arrays support the buffer protocol: the batch tools (app.team, app.simulator) work on
+    numpy.frombuffer() views of them, a unit is unpacked with load() to play in Arena
+    (the equipment catalog is only needed by load())
+    """
+
+    def __init__(self, equipment: Optional[Equipment] = None):
+        self.equipment = equipment
+        self.names: list[str] = []
+        self.health = array("d")
+        self.stamina = array("d")
+        self.class_ids = array("H")
+        self.weapon_ids = array("H")
+        self.armor_ids = array("H")
+        self.skill_used = array("B")
+        self.armor_bonus = array("d")
+        self.stunned = array("i")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def repeat(
+        cls, unit: BaseUnit, count: int, equipment: Optional[Equipment] = None
+    ) -> UnitArray:
+        """
+        packs count copies of a unit (e.g. the same unit in many simulated fights)
+        """
+
+        units = cls(equipment)
+        units.append(unit)
+        units.names *= count
+        for name in FIELDS:
+            setattr(units, name, getattr(units, name) * count)
+        return units
+
+    def append(self, unit: BaseUnit) -> int:
+        """
+        packs a unit
+        :returns its index
+        """
+
+        self.names.append(unit.name)
+        self.health.append(unit.health_points)
+        self.stamina.append(unit.stamina_points)
+        self.class_ids.append(unit.unit_class.id)
+        self.weapon_ids.append(unit.weapon.id)
+        self.armor_ids.append(unit.armor.id)
+        self.skill_used.append(unit.skill_used)
+        self.armor_bonus.append(unit.decode(unit.armor_bonus))
+        self.stunned.append(unit.stunned)
+        return len(self.names) - 1
+
+    def store(self, index: int, unit: BaseUnit) -> None:
+        """
+        writes the changeable state of a unit (e.g. after a turn) back
+        """
+
+        self.health[index] = unit.health_points
+        self.stamina[index] = unit.stamina_points
+        self.skill_used[index] = unit.skill_used
+        self.armor_bonus[index] = unit.decode(unit.armor_bonus)
+        self.stunned[index] = unit.stunned
+
+    def restore(self, index: int, unit: BaseUnit) -> None:
+        """
+        writes the changeable state of a packed unit (e.g. after a batch of turns) to
+        the unit object
+        """
+
+        unit.health = unit.encode(self.health[index])
+        unit.stamina = unit.encode(self.stamina[index])
+        unit.skill_used = bool(self.skill_used[index])
+        unit.armor_bonus = unit.encode(self.armor_bonus[index])
+        unit.stunned = self.stunned[index]
+
+    def load(self, index: int, class_name: Type[Unit]) -> Unit:
+        """
+        unpacks a unit to play with it
+        """
+
+        if self.equipment is None:
+            raise ValueError("The units are packed without the equipment catalog")
+        return class_name(
+            name=self.names[index],
+            unit_class=UnitClass.get_unit_by_id(self.class_ids[index]),
+            health=class_name.encode(self.health[index]),
+            stamina=class_name.encode(self.stamina[index]),
+            _weapon=self.equipment.get_weapon_by_id(self.weapon_ids[index]),
+            _armor=self.equipment.get_armor_by_id(self.armor_ids[index]),
+            skill_used=bool(self.skill_used[index]),
+            armor_bonus=class_name.encode(self.armor_bonus[index]),
+            stunned=self.stunned[index],
+        )
@@ -0,0 +1,84 @@
+"""
+Measures the computer player's AI decision time per turn:
+the expectimax search (without and with the transposition table) and the precomputed policy table
+
+usage: python -m benchmarks.bench_ai
+"""
+
+import time
+
+from app.ai import ExpectimaxAI, matchup_key, precompute_policy
+from app.arena import Arena
+from app.classes import UnitClass
+from app.const import STAMINA_RECOVER_PER_TURN
+from app.equipment import Equipment
+from app.unit import HumanPlayer, CompPlayer
+
+FIGHTS = 20
+
+
+def make_arena(equipment: Equipment, seed: int) -> Arena:
+    """
+    returns a started fight of the benchmark matchup
+    """
+
+    arena = Arena(seed=seed)
+    arena.start_game(seed)
+    arena.hero = HumanPlayer(
+        "Герой",
+        UnitClass.get_unit_by_name("Воин"),
+        60.0,
+        30.0,
+        _weapon=equipment.get_weapon("топорик"),
+        _armor=equipment.get_armor("кожаная броня"),
+    )
+    arena.enemy = CompPlayer(
+        "Противник",
+        UnitClass.get_unit_by_name("Вор"),
+        50.0,
+        25.0,
+        _weapon=equipment.get_weapon("ножик"),
+        _armor=equipment.get_armor("футболка"),
+    )
+    return arena
+
+
+def measure(title: str, ai: ExpectimaxAI, equipment: Equipment) -> None:
+    """
+    plays the fights against the AI and prints the time per decision
+    """
+
+    decisions, spent = 0, 0.0
+
+    def choose(enemy: CompPlayer, hero: HumanPlayer, stamina: float) -> int:
+        nonlocal decisions, spent
+        started = time.perf_counter()
+        action = ai.choose_action(enemy, hero, stamina)
+        spent += time.perf_counter() - started
+        decisions += 1
+        return action
+
+    for seed in range(FIGHTS):
+        arena = make_arena(equipment, seed)
+        arena.enemy_ai = choose
+        arena.auto_battle("skill")
+    print(
+        f"{title:<22} {decisions:>5} decisions  {spent / decisions * 1e6:>8.0f} us/decision"
+    )
+
+
+if __name__ == "__main__":
+    equipment_ = Equipment()
+    measure("search, no cache", ExpectimaxAI(cache_size=0), equipment_)
+    measure("search, cache", ExpectimaxAI(), equipment_)
+
+    ai_ = ExpectimaxAI()
+    probe = make_arena(equipment_, 0)
+    started = time.perf_counter()
+    ai_.policies[matchup_key(probe.enemy, probe.hero)] = precompute_policy(
+        ExpectimaxAI(),
+        ai_.fighter(probe.enemy, STAMINA_RECOVER_PER_TURN),
+        ai_.fighter(probe.hero, STAMINA_RECOVER_PER_TURN),
+    )
+    print(f"policy table precomputed in {time.perf_counter() - started:.1f} s")
+    measure("policy table", ai_, equipment_)
@@ -0,0 +1,62 @@
+"""
+Compares the bytes and the server CPU time per turn of the HTML and the JSON API routes
+
+usage: python -m benchmarks.bench_api
+"""
+
+import time
+from typing import Callable
+
+from flask.testing import FlaskClient
+from werkzeug.test import TestResponse
+
+from run import app
+
+TURNS = 2000
+FORM = {"name": "Герой", "unit_class": "Воин", "weapon": "ладошки", "armor": "панцирь"}
+
+
+def start_fight(client: FlaskClient) -> None:
+    """
+    starts a new fight of the client's player
+    """
+
+    client.get("/fight/end-fight")
+    client.get("/choose-hero/")
+    client.post("/choose-hero/", data=FORM)
+    client.post("/choose-enemy/", data=FORM)
+
+
+def measure(
+    turn: Callable[[FlaskClient], TestResponse], is_over: Callable[[TestResponse], bool]
+) -> None:
+    """
+    prints the bytes and the CPU time per turn
+    """
+
+    client = app.test_client()
+    start_fight(client)
+    size, cpu = 0, 0.0
+    for _ in range(TURNS):
+        started = time.process_time()
+        response = turn(client)
+        cpu += time.process_time() - started
+        size += len(response.data)
+        if is_over(response):
+            start_fight(client)
+    print(f"{size / TURNS:>8.0f} bytes/turn  {cpu / TURNS * 1e6:>6.0f} us CPU/turn")
+
+
+if __name__ == "__main__":
+    print("HTML /fight/hit:      ", end="")
+    measure(
+        lambda client: client.get("/fight/hit"),
+        lambda response: any(
+            result in response.get_data(as_text=True) for result in ("Победил", "Ничья")
+        ),
+    )
+    print("JSON /api/fight/hit:  ", end="")
+    measure(
+        lambda client: client.post("/api/fight/hit"),
+        lambda response: not (response.get_json() or {}).get("game_on"),
+    )
@@ -0,0 +1,65 @@
+"""
+Compares the per-turn time (Arena.attack) of the float and the fixed point units
+
+usage: python -m benchmarks.bench_fixed_point
+"""
+
+import timeit
+from typing import Type
+
+from app.arena import Arena
+from app.classes import UnitClass
+from app.equipment import Equipment
+from app.unit import (
+    HumanPlayer,
+    CompPlayer,
+    FixedPointHumanPlayer,
+    FixedPointCompPlayer,
+)
+
+TURNS = 100000
+
+equipment = Equipment()
+warrior, thief = UnitClass.get_unit_by_name("Воин"), UnitClass.get_unit_by_name("Вор")
+
+
+def make_arena(hero_class: Type[HumanPlayer], enemy_class: Type[CompPlayer]) -> Arena:
+    """
+    makes an arena with the units which never die
+    """
+
+    arena = Arena()
+    arena.hero = hero_class(
+        name="Герой",
+        unit_class=warrior,
+        health=hero_class.encode(1e9),
+        stamina=hero_class.encode(warrior.max_stamina),
+        _weapon=equipment.get_weapon("топорик"),
+        _armor=equipment.get_armor("кожаная броня"),
+    )
+    arena.enemy = enemy_class(
+        name="Вор",
+        unit_class=thief,
+        health=enemy_class.encode(1e9),
+        stamina=enemy_class.encode(thief.max_stamina),
+        _weapon=equipment.get_weapon("ножик"),
+        _armor=equipment.get_armor("панцирь"),
+    )
+    arena.start_game()
+    return arena
+
+
+def measure(hero_class: Type[HumanPlayer], enemy_class: Type[CompPlayer]) -> float:
+    """
+    returns ns per turn
+    """
+
+    arena = make_arena(hero_class, enemy_class)
+    return timeit.timeit(arena.attack, number=TURNS) / TURNS * 1e9
+
+
+if __name__ == "__main__":
+    float_time = measure(HumanPlayer, CompPlayer)
+    fixed_time = measure(FixedPointHumanPlayer, FixedPointCompPlayer)
+    print(f"float:       {float_time:.0f} ns/turn")
+    print(f"fixed point: {fixed_time:.0f} ns/turn ({float_time / fixed_time:.2f}x)")
@@ -0,0 +1,166 @@
+"""
+Micro-benchmarks of the combat hot path and of the equipment catalog,
+compares the figures with a saved baseline and fails on a regression
+(the figures are compared relative to a reference workload, so a machine running slower
+for a while doesn't look like a regression)
+
+usage:
+python -m benchmarks.bench_hot_path --save  (measures and saves the baseline)
+python -m benchmarks.bench_hot_path  (measures and compares with the baseline, exit code 1 on a regression)
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from typing import Callable
+
+from app.arena import Arena
+from app.classes import UnitClass
+from app.equipment import Equipment
+from app.unit import HumanPlayer, CompPlayer
+
+BASELINE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baseline.json"
+)
+# a benchmark regressed if it is slower than the baseline by this share
+THRESHOLD = 0.25
+REPEATS = 15
+REFERENCE = "reference"  # a fixed workload, the machine speed the other figures are normalized by
+ENDLESS = 1e12  # the health and stamina of the benchmark units, they never run out
+
+
+def make_arena(equipment: Equipment) -> Arena:
+    """
+    returns an arena with the units which never die nor run out of stamina
+    """
+
+    arena = Arena(seed=0)
+    arena.start_game(0)
+    arena.hero = HumanPlayer(
+        "Герой",
+        UnitClass.get_unit_by_name("Воин"),
+        ENDLESS,
+        ENDLESS,
+        _weapon=equipment.get_weapon("топорик"),
+        _armor=equipment.get_armor("кожаная броня"),
+    )
+    arena.enemy = CompPlayer(
+        "Противник",
+        UnitClass.get_unit_by_name("Вор"),
+        ENDLESS,
+        ENDLESS,
+        _weapon=equipment.get_weapon("ножик"),
+        _armor=equipment.get_armor("панцирь"),
+    )
+    arena.rng.seed(0)
+    return arena
+
+
+def use_skill(hero: HumanPlayer, enemy: CompPlayer) -> str:
+    """
+    applies the skill (it is never used up)
+    """
+
+    hero.skill_used = False
+    return hero.use_skill(enemy)
+
+
+def get_benchmarks(equipment: Equipment) -> dict[str, Callable[[], object]]:
+    """
+    returns the benchmarks by name, every one has its own arena
+    (regenerate_stamina() caps the endless stamina, the others must not see it)
+    """
+
+    arenas = [make_arena(equipment) for _ in range(6)]
+    return {
+        REFERENCE: lambda: sorted(str(number) for number in range(100)),
+        "unit.attack": lambda: arenas[0].hero.attack(arenas[0].enemy),
+        "unit._get_final_damage": lambda: arenas[1].hero._get_final_damage(
+            arenas[1].enemy
+        ),
+        "unit.use_skill": lambda: use_skill(arenas[2].hero, arenas[2].enemy),
+        "unit.regenerate_stamina": lambda: arenas[3].hero.regenerate_stamina(
+            arenas[3].stamina
+        ),
+        "arena.check_health_and_regenerate": lambda: arenas[
+            4
+        ].check_health_and_regenerate(""),
+        "arena.complete_turn": lambda: arenas[5].complete_turn(""),
+        "equipment.load": Equipment,
+        "equipment.get_weapon": lambda: equipment.get_weapon("ладошки"),
+        "equipment.get_armor_by_id": lambda: equipment.get_armor_by_id(3),
+        "equipment.get_weapon_names": equipment.get_weapon_names,
+    }
+
+
+def measure(benchmarks: dict[str, Callable[[], object]]) -> dict[str, float]:
+    """
+    returns the time of a call of every benchmark in ns
+    the repeats of the benchmarks are interleaved, so a slow moment of the system
+    doesn't hit all the repeats of a benchmark, and the best one is taken (the least disturbed)
+    """
+
+    timers = {name: timeit.Timer(func) for name, func in benchmarks.items()}
+    numbers = {name: timer.autorange()[0] for name, timer in timers.items()}
+    best = {name: float("inf") for name in timers}
+    for _ in range(REPEATS):
+        for name, timer in timers.items():
+            best[name] = min(
+                best[name], timer.timeit(numbers[name]) / numbers[name] * 1e9
+            )
+    return best
+
+
+def run(save: bool, threshold: float, baseline_file: str) -> int:
+    """
+    runs the benchmarks, saves or compares with the baseline
+    :returns the exit code
+    """
+
+    baseline: dict[str, float] = {}
+    if not save and os.path.exists(baseline_file):
+        with open(baseline_file, "r", encoding="utf-8") as file_handler:
+            baseline = json.load(file_handler)
+
+    results, regressions = measure(get_benchmarks(Equipment())), []
+    for name in results:
+        line = f"{name:<36} {results[name]:>12.0f} ns/op"
+        if name != REFERENCE and name in baseline:
+            change = (results[name] / results[REFERENCE]) / (
+                baseline[name] / baseline[REFERENCE]
+            ) - 1
+            line += f"  {change:>+7.1%}"
+            if change > threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if save:
+        with open(baseline_file, "w", encoding="utf-8") as file_handler:
+            json.dump(results, file_handler, indent=2)
+        print(f"the baseline is saved to {baseline_file}")
+    elif not baseline:
+        print("no baseline to compare with, run with --save first")
+    if regressions:
+        print(
+            f"{len(regressions)} regressed by more than {threshold:.0%}: {', '.join(regressions)}"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the combat hot path")
+    parser.add_argument(
+        "--save", action="store_true", help="save the results as the baseline"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=THRESHOLD, help="the allowed slowdown share"
+    )
+    parser.add_argument(
+        "--baseline", default=BASELINE_FILE, help="the baseline JSON file"
+    )
+    args = parser.parse_args()
+    sys.exit(run(args.save, args.threshold, args.baseline))
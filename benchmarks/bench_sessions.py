@@ -0,0 +1,69 @@
+"""
+Measures requests/sec and p99 latency of /fight/hit
+for different numbers of concurrent players (sessions)
+
+usage: python -m benchmarks.bench_sessions [sessions ...] (1 100 10000 by default)
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import quantiles
+
+from flask.testing import FlaskClient
+
+from run import app
+
+THREADS = 8
+REQUESTS_PER_RUN = 20000
+
+
+def start_fight() -> FlaskClient:
+    """
+    creates a player with their own cookies and starts a fight
+    """
+
+    client = app.test_client()
+    client.get("/choose-hero/")
+    form = {
+        "name": "Герой",
+        "unit_class": "Воин",
+        "weapon": "ладошки",
+        "armor": "панцирь",
+    }
+    client.post("/choose-hero/", data=form)
+    client.post("/choose-enemy/", data=form)
+    return client
+
+
+def hit(client: FlaskClient) -> float:
+    """
+    makes a hit and returns its latency
+    """
+
+    started = time.perf_counter()
+    client.get("/fight/hit")
+    return time.perf_counter() - started
+
+
+def run(sessions: int) -> None:
+    """
+    runs the benchmark for the number of sessions
+    """
+
+    clients = [start_fight() for _ in range(sessions)]
+    turns = [clients[i % sessions] for i in range(REQUESTS_PER_RUN)]
+    with ThreadPoolExecutor(THREADS) as executor:
+        started = time.perf_counter()
+        latencies = list(executor.map(hit, turns))
+        elapsed = time.perf_counter() - started
+    p99 = quantiles(latencies, n=100)[98] * 1000
+    print(
+        f"sessions: {sessions:>6}  arenas: {len(app.config['ARENAS']):>6}"
+        f"  rps: {REQUESTS_PER_RUN / elapsed:>8.0f}  p99: {p99:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    for count in map(int, sys.argv[1:] or (1, 100, 10000)):
+        run(count)
@@ -0,0 +1,73 @@
+"""
+A startup time benchmark: a fresh interpreter imports run and serves the first request (GET /)
+with the Flask test client, like a new gunicorn worker does;
+measured with the catalog cache removed (cold, the data files are validated) and kept (warm)
+
+usage: python -m benchmarks.bench_startup --runs 10
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+
+from app.catalog_cache import CACHE_DIR_WITH_PATH
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE = """
+import time
+started = time.perf_counter()
+import run
+imported = time.perf_counter()
+status = run.app.test_client().get("/").status_code
+served = time.perf_counter()
+assert status == 200, status
+print(imported - started, served - started)
+"""
+
+
+def measure(cold: bool) -> tuple[float, float]:
+    """
+    starts a fresh interpreter
+    :returns the time to import run and the time to serve the first request, in seconds
+    """
+
+    if cold:
+        shutil.rmtree(CACHE_DIR_WITH_PATH, ignore_errors=True)
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    imported, served = output.split()
+    return float(imported), float(served)
+
+
+def run(runs: int) -> None:
+    """
+    measures the cold and the warm starts interleaved, prints the medians
+    """
+
+    results: dict[str, list[tuple[float, float]]] = {"cold": [], "warm": []}
+    for _ in range(runs):
+        for mode in results:
+            # the warm start follows the cold one
+            results[mode].append(measure(mode == "cold"))
+    print(f"{'start':<8}{'import ms':>12}{'first request ms':>20}")
+    for mode, times in results.items():
+        imported = statistics.median(time for time, _ in times)
+        served = statistics.median(time for _, time in times)
+        print(f"{mode:<8}{imported * 1000:>12.0f}{served * 1000:>20.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measures the time from importing run to the first request served"
+    )
+    parser.add_argument("--runs", type=int, default=10, help="the starts of every kind")
+    args = parser.parse_args()
+    run(args.runs)
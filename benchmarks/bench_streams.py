@@ -0,0 +1,88 @@
+"""
+Holds many idle fight streams (/api/fight/stream) open
+and measures the server memory per connection
+
+the app is served by the threaded werkzeug server (a thread per connection)
+usage: python -m benchmarks.bench_streams [streams] (1000 by default)
+"""
+
+import socket
+import subprocess
+import sys
+import time
+
+PORT = 8766
+SERVER = f"from run import app; app.config['STREAM_MAX_OPEN'] = 10 ** 6; app.run(port={PORT}, threaded=True)"
+REQUEST = f"GET /api/fight/stream HTTP/1.1\r\nHost: 127.0.0.1:{PORT}\r\n\r\n".encode()
+
+
+def rss(pid: int) -> int:
+    """
+    returns the resident memory of the process in bytes
+    """
+
+    with open(f"/proc/{pid}/status", encoding="utf-8") as file_handler:
+        for line in file_handler:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def open_stream() -> socket.socket:
+    """
+    opens a stream and waits for the response headers
+    """
+
+    connection = socket.create_connection(("127.0.0.1", PORT))
+    connection.sendall(REQUEST)
+    received = b""
+    while b"\r\n\r\n" not in received:
+        received += connection.recv(4096)
+    return connection
+
+
+def wait_for_server() -> None:
+    """
+    waits until the server accepts connections
+    """
+
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", PORT)).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("the server didn't start")
+
+
+def run(streams: int) -> None:
+    """
+    opens the streams and prints the memory used
+    """
+
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_server()
+        open_stream().close()  # warms the server up
+        time.sleep(0.5)
+        before = rss(server.pid)
+        connections = [open_stream() for _ in range(streams)]
+        time.sleep(0.5)
+        after = rss(server.pid)
+        print(
+            f"streams: {len(connections)}  server memory: {before / 2 ** 20:.1f} -> {after / 2 ** 20:.1f} MB"
+            f"  per stream: {(after - before) / streams / 1024:.1f} KB"
+        )
+        for connection in connections:
+            connection.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
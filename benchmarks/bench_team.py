@@ -0,0 +1,105 @@
+"""
+Benchmarks a team battle turn against the team size:
+the batch resolution of app.team next to the same turn played with the unit objects
+(BaseUnit.attack() and regenerate_stamina() per unit, like Arena does for a single pair)
+
+usage: python -m benchmarks.bench_team --sizes 1 10 100 1000
+"""
+
+import argparse
+import timeit
+from random import Random
+
+from app.classes import UnitClass
+from app.equipment import Equipment
+from app.team import Squad, TeamBattle
+from app.unit import BaseUnit, HumanPlayer, CompPlayer
+
+REPEATS = 5
+ENDLESS = 1e12  # the health of the benchmark units, they never die
+# the per-object turn is not measured for the bigger teams (too slow)
+OBJECTS_MAX_SIZE = 1000
+
+
+def make_units(class_name: type, size: int, equipment: Equipment) -> list[BaseUnit]:
+    """
+    returns the units which never die
+    """
+
+    unit_class = UnitClass.get_unit_by_name("Воин")
+    return [
+        class_name(
+            f"Боец {number}",
+            unit_class,
+            ENDLESS,
+            unit_class.max_stamina,
+            _weapon=equipment.get_weapon("топорик"),
+            _armor=equipment.get_armor("кожаная броня"),
+        )
+        for number in range(size)
+    ]
+
+
+def objects_turn(heroes: list[BaseUnit], enemies: list[BaseUnit], rng: Random) -> None:
+    """
+    a team turn played with the unit objects: every unit attacks a random target, the stamina regenerates
+    """
+
+    for attackers, targets in ((heroes, enemies), (enemies, heroes)):
+        for unit in attackers:
+            unit.attack(rng.choice(targets))
+        for unit in heroes + enemies:
+            unit.regenerate_stamina(2)
+
+
+def best_time(func: timeit.Timer) -> float:
+    """
+    returns the best time of a call in seconds
+    """
+
+    number = func.autorange()[0]
+    return min(func.repeat(REPEATS, number)) / number
+
+
+def run(sizes: list[int]) -> None:
+    """
+    measures a turn of the teams of every size
+    """
+
+    equipment = Equipment()
+    print(f"{'size':>6}{'batch ms':>12}{'objects ms':>14}{'speedup':>10}")
+    for size in sizes:
+        battle = TeamBattle(
+            Squad(make_units(HumanPlayer, size, equipment)),
+            Squad(make_units(CompPlayer, size, equipment)),
+            seed=0,
+        )
+        batch = best_time(timeit.Timer(battle.complete_turn))
+        line = f"{size:>6}{batch * 1000:>12.3f}"
+        if size <= OBJECTS_MAX_SIZE:
+            heroes, enemies = make_units(HumanPlayer, size, equipment), make_units(
+                CompPlayer, size, equipment
+            )
+            rng = Random(0)
+            for unit in heroes + enemies:
+                unit.rng = rng
+            objects = best_time(
+                timeit.Timer(lambda: objects_turn(heroes, enemies, rng))
+            )
+            line += f"{objects * 1000:>14.3f}{objects / batch:>9.1f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks a team battle turn against the team size"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100, 300, 1000, 10000],
+        help="the units per side",
+    )
+    args = parser.parse_args()
+    run(args.sizes)
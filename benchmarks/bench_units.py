@@ -0,0 +1,82 @@
+"""
+Measures the memory per unit (BaseUnit and UnitArray) and the attack throughput
+
+usage: python -m benchmarks.bench_units
+"""
+
+import timeit
+import tracemalloc
+from typing import Callable
+
+from app.classes import UnitClass
+from app.equipment import Equipment
+from app.unit import HumanPlayer
+from app.unit_array import UnitArray
+
+UNITS = 100000
+ATTACKS = 200000
+
+equipment = Equipment()
+weapon, armor = equipment.get_weapon("топорик"), equipment.get_armor("кожаная броня")
+warrior = UnitClass.get_unit_by_name("Воин")
+
+
+def make_unit(number: int) -> HumanPlayer:
+    """
+    makes a unit with its own health and stamina values
+    """
+
+    return HumanPlayer(
+        name="Герой",
+        unit_class=warrior,
+        health=warrior.max_health + number,
+        stamina=warrior.max_stamina + number,
+        _weapon=weapon,
+        _armor=armor,
+    )
+
+
+def measure_memory(make: Callable[[], object]) -> float:
+    """
+    returns the memory allocated by make() per unit
+    """
+
+    tracemalloc.start()
+    container = make()  # noqa: F841 (keeps the units alive while measuring)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / UNITS
+
+
+def fill_array() -> UnitArray:
+    """
+    packs the units into a UnitArray
+    """
+
+    units = UnitArray(equipment)
+    for number in range(UNITS):
+        units.append(make_unit(number))
+    return units
+
+
+def measure_attack() -> float:
+    """
+    returns ns per BaseUnit.attack()
+    """
+
+    hero, enemy = make_unit(0), make_unit(0)
+
+    def attack() -> None:
+        hero.health = enemy.health = 1e9
+        hero.stamina = enemy.stamina = warrior.max_stamina
+        hero.attack(enemy)
+
+    return timeit.timeit(attack, number=ATTACKS) / ATTACKS * 1e9
+
+
+if __name__ == "__main__":
+    print(
+        f"BaseUnit:  {measure_memory(lambda: [make_unit(n) for n in range(UNITS)]):.0f} bytes/unit"
+    )
+    print(f"UnitArray: {measure_memory(fill_array):.0f} bytes/unit")
+    print(f"BaseUnit.attack: {measure_attack():.0f} ns/op")
@@ -0,0 +1,85 @@
+"""
+Measures how the throughput grows with the number of gunicorn workers
+sharing the arenas through the SQLite store (see app.storage)
+
+usage: python -m benchmarks.bench_workers [workers ...] (1 2 4 by default)
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, OpenerDirector, build_opener, urlopen
+
+PORT = 8765
+URL = f"http://127.0.0.1:{PORT}"
+SESSIONS = 64
+HITS_PER_SESSION = 50
+
+
+def wait_for_server() -> None:
+    """
+    waits until the server accepts connections
+    """
+
+    for _ in range(100):
+        try:
+            urlopen(URL).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("the server didn't start")
+
+
+def play(_: int) -> int:
+    """
+    plays a fight as a separate player, returns the number of requests made
+    """
+
+    opener: OpenerDirector = build_opener(HTTPCookieProcessor(CookieJar()))
+    form = urlencode(
+        {"name": "Герой", "unit_class": "Воин", "weapon": "ладошки", "armor": "панцирь"}
+    ).encode()
+    opener.open(f"{URL}/choose-hero/").read()
+    opener.open(f"{URL}/choose-hero/", data=form).read()  # redirects to /choose-enemy/
+    opener.open(f"{URL}/choose-enemy/", data=form).read()  # redirects to /fight/
+    for _ in range(HITS_PER_SESSION):
+        opener.open(f"{URL}/fight/hit").read()
+    return 5 + HITS_PER_SESSION
+
+
+def run(workers: int) -> None:
+    """
+    runs the benchmark for the number of workers
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            ARENA_DB=os.path.join(directory, "arenas.db"),
+            SECRET_KEY="benchmark",
+        )
+        server = subprocess.Popen(
+            ["gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{PORT}", "run:app"],
+            env=env,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_server()
+            with ThreadPoolExecutor(SESSIONS) as executor:
+                started = time.perf_counter()
+                requests = sum(executor.map(play, range(SESSIONS)))
+                elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+    print(f"workers: {workers:>3}  rps: {requests / elapsed:>8.0f}")
+
+
+if __name__ == "__main__":
+    for count in map(int, sys.argv[1:] or (1, 2, 4)):
+        run(count)
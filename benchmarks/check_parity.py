@@ -0,0 +1,68 @@
+"""
+Checks that the simulator plays the same fights as Arena: every hero setup of the catalog
+against a few enemy setups (or all of them) with every hero policy, the same random numbers
+fed to both (see app.simulator.check_parity()); fails on any fight which outcome or length differ
+
+usage: python -m benchmarks.check_parity --enemies 3 --fights 50
+"""
+
+import argparse
+import sys
+import time
+from random import Random
+
+from app.simulator import POLICIES, check_parity
+from app.tournament import get_setups, setup_name
+
+
+def run(enemies: int, fights: int, seed: int) -> int:
+    """
+    checks the matchups
+    :returns the exit code
+    """
+
+    setups = get_setups()
+    rng = Random(seed)
+    started = time.perf_counter()
+    checked = failed = 0
+    for hero in setups:
+        opponents = (
+            setups if enemies <= 0 else rng.sample(setups, min(enemies, len(setups)))
+        )
+        for enemy in opponents:
+            for policy in POLICIES:
+                mismatches = check_parity(hero, enemy, fights, seed, policy)
+                checked += 1
+                if mismatches:
+                    failed += 1
+                    print(
+                        f"{setup_name(hero)} vs {setup_name(enemy)}, {policy}: {mismatches} of {fights} fights differ"
+                    )
+    print(
+        f"matchups checked: {checked} ({fights} fights each)  time: {time.perf_counter() - started:.1f} s"
+    )
+    print("FAILED" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Checks that the simulator plays the same fights as Arena"
+    )
+    parser.add_argument(
+        "--enemies",
+        type=int,
+        default=3,
+        help="the enemy setups per hero setup (0 for all)",
+    )
+    parser.add_argument(
+        "--fights", type=int, default=50, help="the fights per matchup and policy"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="the seed of the random numbers and of the enemies",
+    )
+    args = parser.parse_args()
+    sys.exit(run(args.enemies, args.fights, args.seed))
@@ -0,0 +1,305 @@
+"""
+A load generator playing whole fights like the players do:
+/choose-hero/ GET and POST, /choose-enemy/ GET and POST, /fight/,
+random /fight/hit, /fight/use-skill and /fight/pass-turn until the fight is over, /fight/end-fight
+
+reports the throughput, the latency percentiles per route and the redirect and error rates
+the redirects are not followed, every request is measured on its own
+
+usage:
+python -m benchmarks.load_test --concurrency 8 --flows 200  (the Flask test client, in process)
+python -m benchmarks.load_test --gunicorn 4  (launches gunicorn with 4 workers sharing an SQLite store)
+python -m benchmarks.load_test --url http://127.0.0.1  (a running server, e.g. nginx of infra/)
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from random import Random
+from typing import Optional, Protocol
+from urllib.parse import urlencode, urlsplit
+
+PORT = 8767
+FORMS = [
+    {
+        "name": "Герой",
+        "unit_class": "Воин",
+        "weapon": "топорик",
+        "armor": "кожаная броня",
+    },
+    {
+        "name": "Лучник",
+        "unit_class": "Рейнджер",
+        "weapon": "ножик",
+        "armor": "футболка",
+    },
+    {"name": "Тень", "unit_class": "Вор", "weapon": "ножик", "armor": "панцирь"},
+]
+ACTIONS = ["/fight/hit", "/fight/use-skill", "/fight/pass-turn"]
+ACTION_WEIGHTS = [8, 1, 1]
+FIGHT_OVER = ("Бой окончен", "Победил", "Ничья")
+# the turn results on the fight page
+RESULT = re.compile(r'<em id="result">(.*?)</em>', re.S)
+
+
+class Client(Protocol):
+    """
+    a player's connection to the app, keeps the session cookie
+    """
+
+    def request(
+        self, method: str, path: str, form: Optional[dict] = None
+    ) -> tuple[int, str]:
+        """
+        makes a request, returns the status and the body
+        """
+
+
+class TestClient:
+    """
+    the Flask test client, the app runs in this process
+    """
+
+    def __init__(self) -> None:
+        from run import app  # imported here, the app is not needed to load a server
+
+        self.client = app.test_client()
+
+    def request(
+        self, method: str, path: str, form: Optional[dict] = None
+    ) -> tuple[int, str]:
+        response = self.client.open(path, method=method, data=form)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class HttpClient:
+    """
+    a keep-alive HTTP connection to a server
+    """
+
+    def __init__(self, url: str) -> None:
+        parts = urlsplit(url)
+        self.connection = HTTPConnection(
+            parts.hostname or "127.0.0.1", parts.port or 80, timeout=30
+        )
+        self.cookies: dict[str, str] = {}
+
+    def request(
+        self, method: str, path: str, form: Optional[dict] = None
+    ) -> tuple[int, str]:
+        headers = {
+            "Cookie": "; ".join(
+                f"{name}={value}" for name, value in self.cookies.items()
+            )
+        }
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        data = response.read().decode()
+        for header in response.headers.get_all("Set-Cookie") or ():
+            name, _, value = header.split(";", 1)[0].partition("=")
+            self.cookies[name] = value
+        return response.status, data
+
+
+class Stats:
+    """
+    the latencies and the statuses per route, shared by the flow threads
+    """
+
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def add(self, route: str, latency: float, status: str) -> None:
+        with self._lock:
+            self.latencies[route].append(latency)
+            self.statuses[route][status] += 1
+
+
+def timed(
+    client: Client, stats: Stats, method: str, path: str, form: Optional[dict] = None
+) -> str:
+    """
+    makes a request and records its latency and status ("2xx", "3xx", ... or "error")
+    """
+
+    started = time.perf_counter()
+    try:
+        status, body = client.request(method, path, form)
+        outcome = f"{status // 100}xx"
+    except OSError:
+        body, outcome = "", "error"
+    stats.add(f"{method} {path}", time.perf_counter() - started, outcome)
+    return body
+
+
+def play_flow(client: Client, stats: Stats, rng: Random, max_turns: int) -> None:
+    """
+    plays a fight from choosing the hero to ending the fight
+    """
+
+    hero, enemy = rng.choice(FORMS), rng.choice(FORMS)
+    timed(client, stats, "GET", "/choose-hero/")
+    timed(client, stats, "POST", "/choose-hero/", hero)
+    timed(client, stats, "GET", "/choose-enemy/")
+    timed(client, stats, "POST", "/choose-enemy/", enemy)
+    timed(client, stats, "GET", "/fight/")
+    for _ in range(max_turns):
+        result = RESULT.search(
+            timed(client, stats, "GET", rng.choices(ACTIONS, ACTION_WEIGHTS)[0])
+        )
+        if result is None or any(message in result.group(1) for message in FIGHT_OVER):
+            break
+    timed(client, stats, "GET", "/fight/end-fight")
+
+
+def percentile(values: list[float], share: float) -> float:
+    """
+    returns the value below which the share of the sorted values lies
+    """
+
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def report(stats: Stats, elapsed: float) -> None:
+    """
+    prints the throughput and the figures per route
+    """
+
+    total = sum(len(latencies) for latencies in stats.latencies.values())
+    print(
+        f"requests: {total}  time: {elapsed:.1f} s  throughput: {total / elapsed:.0f} rps"
+    )
+    print(
+        f"{'route':<26}{'count':>7}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'3xx':>7}{'errors':>8}"
+    )
+    for route in sorted(stats.latencies):
+        latencies = sorted(stats.latencies[route])
+        statuses = stats.statuses[route]
+        errors = sum(
+            count
+            for status, count in statuses.items()
+            if status in ("4xx", "5xx", "error")
+        )
+        print(
+            f"{route:<26}{len(latencies):>7}"
+            + "".join(
+                f"{percentile(latencies, share) * 1000:>9.1f}"
+                for share in (0.5, 0.9, 0.99, 1.0)
+            )
+            + f"{statuses['3xx'] / len(latencies):>7.0%}{errors / len(latencies):>8.1%}"
+        )
+
+
+def run(
+    url: Optional[str], concurrency: int, flows: int, max_turns: int, seed: int
+) -> None:
+    """
+    plays the flows with the concurrency against the test client (no url) or the server
+    """
+
+    stats = Stats()
+
+    def flow(number: int) -> None:
+        client: Client = HttpClient(url) if url else TestClient()
+        play_flow(client, stats, Random(seed + number), max_turns)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(flow, range(flows)))
+    report(stats, time.perf_counter() - started)
+
+
+def launch_gunicorn(workers: int, threads: int, directory: str) -> subprocess.Popen:
+    """
+    launches gunicorn with the workers sharing the arenas through an SQLite store
+    """
+
+    env = dict(
+        os.environ,
+        ARENA_DB=os.path.join(directory, "arenas.db"),
+        SECRET_KEY="load-test",
+    )
+    server = subprocess.Popen(
+        [
+            "gunicorn",
+            "-w",
+            str(workers),
+            "--threads",
+            str(threads),
+            "-b",
+            f"127.0.0.1:{PORT}",
+            "run:app",
+        ],
+        env=env,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            HttpClient(f"http://127.0.0.1:{PORT}").request("GET", "/")
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("gunicorn didn't start")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Plays whole fights against the app and reports the latencies"
+    )
+    parser.add_argument(
+        "--url", help="a running server, the Flask test client by default"
+    )
+    parser.add_argument(
+        "--gunicorn",
+        type=int,
+        metavar="WORKERS",
+        help="launch gunicorn with the workers",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=1, help="the threads per gunicorn worker"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="the players playing at the same time",
+    )
+    parser.add_argument("--flows", type=int, default=100, help="the fights to play")
+    parser.add_argument(
+        "--max-turns", type=int, default=200, help="the max turns of a fight"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="the seed of the players' choices"
+    )
+    args = parser.parse_args()
+
+    if args.gunicorn:
+        with tempfile.TemporaryDirectory() as temp_directory:
+            gunicorn = launch_gunicorn(args.gunicorn, args.threads, temp_directory)
+            try:
+                run(
+                    f"http://127.0.0.1:{PORT}",
+                    args.concurrency,
+                    args.flows,
+                    args.max_turns,
+                    args.seed,
+                )
+            finally:
+                gunicorn.terminate()
+                gunicorn.wait()
+    else:
+        run(args.url, args.concurrency, args.flows, args.max_turns, args.seed)
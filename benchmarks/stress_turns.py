@@ -0,0 +1,168 @@
+"""
+A stress test of the turn submission: several players (threads with the same session) play
+every fight at once, each sends its turns with the version it saw last and repeats a share of
+its requests with the same Idempotency-Key (like a double click or a retry behind nginx)
+
+checks that every version got exactly one turn, the repeats got the first response,
+and the fight replays to the same state (no turns interleaved); reports the throughput
+
+usage: python -m benchmarks.stress_turns --arenas 16 --threads 8
+"""
+
+import argparse
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+
+from flask.testing import FlaskClient
+
+from app.replay import dump_replay, verify_replay
+from run import app
+
+FORM = {
+    "name": "Стойкий",
+    "unit_class": "Воин",
+    "weapon": "ножик",
+    "armor": "кожаная броня",
+}  # a long fight
+MAX_TURNS = 1000  # the players leave a fight not over by then
+ACTIONS = ["/api/fight/hit", "/api/fight/pass-turn"]
+
+
+class Fight:
+    """
+    a fight played by several threads and what they were answered
+    """
+
+    def __init__(self) -> None:
+        self.client = app.test_client()
+        self.client.get("/choose-hero/")
+        self.client.post("/choose-hero/", data=FORM)
+        self.client.post("/choose-enemy/", data=FORM)
+        with self.client.session_transaction() as session:
+            self.session_id = session["sid"]
+        self.turns: list[int] = []  # the versions the accepted turns were made at
+        self.conflicts = 0  # the turns rejected as stale
+        self.repeats = 0  # the repeated requests
+        self.mismatches = 0  # the repeats answered differently from the first request
+        self.lock = threading.Lock()
+
+    def player(self) -> FlaskClient:
+        """
+        returns a new client with the fight's session
+        """
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["sid"] = self.session_id
+        return client
+
+
+def send(client: FlaskClient, action: str, form: dict, key: str) -> dict:
+    """
+    sends a turn with the key, returns the response
+    """
+
+    return (
+        client.post(action, data=form, headers={"Idempotency-Key": key}).get_json()
+        or {}
+    )
+
+
+def play(fight: Fight, rng: Random, retry: float) -> None:
+    """
+    sends the turns until the fight is over
+    """
+
+    client, version = fight.player(), 0
+    while True:
+        key, action, sent = uuid.uuid4().hex, rng.choice(ACTIONS), {"version": version}
+        data = send(client, action, sent, key)
+        version = data["version"]
+        with fight.lock:
+            if "error" in data:
+                fight.conflicts += 1
+            elif data["version"] != data["base_version"]:
+                fight.turns.append(data["base_version"])
+        if rng.random() < retry:
+            repeat = send(client, action, sent, key)
+            with fight.lock:
+                fight.repeats += 1
+                fight.mismatches += repeat != data
+        if not data["game_on"] or version >= MAX_TURNS:
+            return
+
+
+def check(fight: Fight) -> list[str]:
+    """
+    returns the problems of the fight
+    """
+
+    arena = app.config["ARENAS"].get(fight.session_id)
+    problems = []
+    if sorted(fight.turns) != list(range(arena.version)):
+        problems.append(
+            f"{len(fight.turns)} turns accepted for {arena.version} versions"
+        )
+    if fight.mismatches:
+        problems.append(f"{fight.mismatches} repeats answered differently")
+    if not verify_replay(dump_replay(arena), app.config["EQUIPMENT"]):
+        problems.append("the fight doesn't replay to its state")
+    return problems
+
+
+def run(arenas: int, threads: int, retry: float, seed: int) -> int:
+    """
+    plays the fights with the threads each, checks them
+    :returns the exit code
+    """
+
+    fights = [Fight() for _ in range(arenas)]
+    rngs = [Random(seed + number) for number in range(arenas * threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(arenas * threads) as executor:
+        futures = [
+            executor.submit(play, fights[number % arenas], rngs[number], retry)
+            for number in range(arenas * threads)
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    turns = sum(len(fight.turns) for fight in fights)
+    requests = turns + sum(fight.conflicts + fight.repeats for fight in fights)
+    print(f"fights: {arenas}  players per fight: {threads}  time: {elapsed:.2f} s")
+    print(
+        f"turns: {turns}  stale rejected: {sum(fight.conflicts for fight in fights)}"
+        f"  repeats: {sum(fight.repeats for fight in fights)}  requests: {requests}  ({requests / elapsed:.0f} rps)"
+    )
+    failed = 0
+    for number, fight in enumerate(fights):
+        for problem in check(fight):
+            print(f"fight {number}: {problem}")
+            failed += 1
+    print("FAILED" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Plays every fight with several threads and checks the turns"
+    )
+    parser.add_argument(
+        "--arenas", type=int, default=16, help="the fights played at once"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=8, help="the players of every fight"
+    )
+    parser.add_argument(
+        "--retry", type=float, default=0.2, help="the share of the requests repeated"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="the seed of the players' choices"
+    )
+    args = parser.parse_args()
+    sys.exit(run(args.arenas, args.threads, args.retry, args.seed))
@@ -1,19 +1,238 @@
 """This module contains a flask app"""
 
-from typing import Union, Callable
-from flask import Flask, render_template, request, redirect, url_for
+import base64
+import json
+import os
+import threading
+import time
+from queue import Empty
+from typing import Union, Callable, Iterator, Optional, Type, TypeVar
+from uuid import uuid4
+from flask import (
+    Flask,
+    render_template,
+    request,
+    redirect,
+    url_for,
+    session,
+    g,
+    jsonify,
+)
+from flask.wrappers import Response as FlaskResponse
 from werkzeug.wrappers.response import Response
 
+from app.ai import ai_player, choose_enemy_action
+from app.api import fight_state, snapshot, turn_delta
 from app.classes import UnitClass
+from app.const import (
+    STREAM_KEEP_ALIVE,
+    STREAM_MAX_OPEN,
+    REQUEST_ID_HEADER,
+    REQUEST_ID_MAX_LENGTH,
+    TURN_SAVE_ATTEMPTS,
+    ARENA_TTL,
+    ARENA_MEMORY_BUDGET,
+    HISTORY_FILE,
+)
 from app.equipment import Equipment
-from app.unit import HumanPlayer, CompPlayer
-from app.arena import Arena
+from app.history import FightHistory
+from app.metrics import (
+    ACTIVE_ARENAS,
+    ARENA_MEMORY,
+    HISTORY_PENDING,
+    RENDER_DURATION,
+    REQUEST_DURATION,
+    render_metrics,
+)
+from app.odds import OddsBoard
+from app.profiling import RequestProfiler
+from app.unit import BaseUnit, HumanPlayer, CompPlayer, FIXED_POINT_PLAYERS
+from app.arena import Arena, ArenaRegistry, StaleArenaError, POLICIES
+from app.replay import dump_replay
+from app.unit import Setup
+from app.storage import SqliteArenaStore, dump_unit
+from app.streams import EventBroker
+
+Personage = TypeVar("Personage", bound=BaseUnit)
 
 app = Flask(__name__)
 app.config["JSON_AS_ASCII"] = False
 app.url_map.strict_slashes = False
-app.config["ARENA"] = Arena()  # to store the arena
+# the session cookie is signed with it, set the same key for all the workers
+app.secret_key = os.environ.get("SECRET_KEY") or os.urandom(16)
 app.config["EQUIPMENT"] = Equipment()  # to store the equipment
+# to keep the units' health and stamina in integer tenths
+app.config["FIXED_POINT"] = os.environ.get("FIXED_POINT") == "1"
+
+
+def make_arena_store() -> Union[ArenaRegistry, SqliteArenaStore]:
+    """
+    returns the store of the players' arenas: a database shared by the workers (ARENA_DB)
+    or the worker's memory with the idle arenas expiring after ARENA_TTL seconds,
+    the least recently used ones evicted over ARENA_MEMORY_MB and spilled to ARENA_SPILL_DB
+    """
+
+    if os.environ.get("ARENA_DB"):
+        return SqliteArenaStore(os.environ["ARENA_DB"], app.config["EQUIPMENT"])
+    return ArenaRegistry(
+        ttl=float(os.environ.get("ARENA_TTL", ARENA_TTL)),
+        budget=int(
+            float(os.environ.get("ARENA_MEMORY_MB", ARENA_MEMORY_BUDGET / 2**20))
+            * 2**20
+        ),
+        spill=(
+            SqliteArenaStore(os.environ["ARENA_SPILL_DB"], app.config["EQUIPMENT"])
+            if os.environ.get("ARENA_SPILL_DB")
+            else None
+        ),
+    )
+
+
+app.config["ARENAS"] = make_arena_store()  # to store the players' arenas
+ACTIVE_ARENAS.read = lambda: len(app.config["ARENAS"])
+if isinstance(app.config["ARENAS"], ArenaRegistry):
+    ARENA_MEMORY.read = lambda: app.config["ARENAS"].memory
+app.config["STREAMS"] = EventBroker()  # to push the turns to the open fight pages
+app.config["STREAM_MAX_OPEN"] = int(os.environ.get("STREAM_MAX_OPEN", STREAM_MAX_OPEN))
+# the enemy choosing screen shows the hero's odds, they are calculated by a background pool
+app.config["ODDS"] = OddsBoard(app.config["EQUIPMENT"])
+# to profile the requests with the header (or a share of all the requests) into the directory
+app.config["PROFILER"] = (
+    RequestProfiler(os.environ["PROFILE_DIR"], float(os.environ.get("PROFILE_RATE", 0)))
+    if os.environ.get("PROFILE_DIR")
+    else None
+)
+# the finished fights are written to the SQLite file by a background thread
+# (HISTORY_DB="" to turn it off), the file and the thread are created
+# by the first request using the history (see get_history())
+app.config["HISTORY_DB"] = os.environ.get("HISTORY_DB", HISTORY_FILE)
+app.config["HISTORY"] = None
+history_lock = threading.Lock()
+# the enemy chooses its actions with the expectimax AI instead of randomly
+app.config["SMART_ENEMY"] = os.environ.get("SMART_ENEMY") == "1"
+if app.config["SMART_ENEMY"]:
+    ai_player.load_policies()
+
+
+def get_arena() -> Arena:
+    """
+    returns the arena of the current player (session)
+    """
+
+    if "arena" not in g:
+        if "sid" not in session:
+            session["sid"] = uuid4().hex
+        g.arena = app.config["ARENAS"].get(session["sid"])
+        g.arena.on_finish = finish_fight
+    return g.arena
+
+
+def get_history() -> Optional[FightHistory]:
+    """
+    returns the fight history of the worker (creates it on the first call), None if it is turned off
+    """
+
+    if app.config["HISTORY"] is None and app.config["HISTORY_DB"]:
+        with history_lock:
+            if app.config["HISTORY"] is None:
+                app.config["HISTORY"] = FightHistory(app.config["HISTORY_DB"])
+                HISTORY_PENDING.read = lambda: app.config["HISTORY"].pending
+    return app.config["HISTORY"]
+
+
+def finish_fight(arena: Arena) -> None:
+    """
+    the fight of the request is over: it is recorded to the history once the arena is saved
+    """
+
+    g.finished = arena
+
+
+@app.before_request
+def start_timer() -> None:
+    """
+    remembers when the request started to measure its latency
+    """
+
+    g.started = time.perf_counter()
+
+
+@app.before_request
+def start_profile() -> None:
+    """
+    starts profiling the request if it is selected
+    """
+
+    profiler = app.config["PROFILER"]
+    if profiler is not None and profiler.should_profile(request.headers):
+        g.profile = profiler.start()
+
+
+@app.after_request
+def finish_profile(response: FlaskResponse) -> FlaskResponse:
+    """
+    writes the profile of the request with the arena and the turn
+    """
+
+    if "profile" in g:
+        context = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration": time.perf_counter() - g.started,
+        }
+        if "arena" in g:
+            arena = g.arena
+            context.update(
+                session=session.get("sid"),
+                seed=arena.seed,
+                turn=arena.version,
+                game_on=arena.is_game_on(),
+                result=arena.result,
+                hero=dump_unit(arena.hero),
+                enemy=dump_unit(arena.enemy),
+            )
+        app.config["PROFILER"].finish(
+            g.pop("profile"), f"{request.method} {request.path}", context
+        )
+    return response
+
+
+@app.after_request
+def observe_latency(response: FlaskResponse) -> FlaskResponse:
+    """
+    adds the request latency to the route's histogram
+    """
+
+    route = request.url_rule.rule if request.url_rule else "unknown"
+    REQUEST_DURATION.observe(time.perf_counter() - g.started, request.method, route)
+    return response
+
+
+@app.after_request
+def save_arena(response: FlaskResponse) -> FlaskResponse:
+    """
+    saves the arena of the current player if the request used it (the turns of the API
+    save it themselves)
+    if another request saved the arena meanwhile, the changes of this one are dropped:
+    an API request gets 409, a page is redirected to the fight
+    """
+
+    if "arena" in g and not g.get("arena_saved"):
+        try:
+            app.config["ARENAS"].save(session["sid"], g.arena)
+        except StaleArenaError:
+            g.pop("finished", None)
+            if request.path.startswith("/api/"):
+                return app.make_response(
+                    (jsonify(error="Бой изменён другим запросом"), 409)
+                )
+            return app.make_response(redirect(url_for("fight")))
+    if "finished" in g:
+        history = get_history()
+        if history is not None:
+            history.record(g.pop("finished"))
+    return response
 
 
 def prepare_form_data(header: str) -> dict:
@@ -29,34 +248,164 @@ def prepare_form_data(header: str) -> dict:
     }
 
 
+def prepare_odds(hero: BaseUnit, stamina: float) -> list[tuple[str, str]]:
+    """
+    to prepare the hero's odds against every enemy setup, "..." for the pending ones
+    """
+
+    odds = app.config["ODDS"].get_all(
+        Setup(hero.unit_class, hero.weapon, hero.armor), stamina
+    )
+    return [
+        (
+            f"{enemy.unit_class.name} / {enemy.weapon.name} / {enemy.armor.name}",
+            "..." if matchup is None else f"{matchup.win:.0%}",
+        )
+        for enemy, matchup in odds
+    ]
+
+
 def render_fighting_screen(func: Union[str, Callable]) -> Union[str, Response]:
     """
     renders the fighting screen depending from the args
     """
 
-    if NotImplemented in (app.config["ARENA"].hero, app.config["ARENA"].enemy):
+    arena = get_arena()
+    if NotImplemented in (arena.hero, arena.enemy):
         return redirect(url_for("index"))
-    return render_template(
-        "fight.html",
-        heroes={"player": app.config["ARENA"].hero, "enemy": app.config["ARENA"].enemy},
-        result=(func() if app.config["ARENA"].is_game_on() else "Бой окончен!")
-        if not isinstance(func, str)
-        else func,
+    expected_version = request.args.get("version", type=int)
+    with arena.turn_lock:
+        if isinstance(func, str):
+            result = func
+        elif not arena.is_game_on():
+            result = "Бой окончен!"
+        elif expected_version is not None and expected_version != arena.version:
+            result = "Ход уже сделан"
+        else:
+            result = func()
+    started = time.perf_counter()
+    page = render_template(
+        "fight.html", heroes={"player": arena.hero, "enemy": arena.enemy}, result=result
+    )
+    RENDER_DURATION.observe(time.perf_counter() - started)
+    return page
+
+
+def make_api_turn(
+    func: Callable[[Arena], object],
+    finish: Optional[Callable[[Arena, int], dict]] = None,
+) -> Union[FlaskResponse, tuple]:
+    """
+    makes a turn with the function (an Arena method) if the fight is on
+    the turns of an arena are made one at a time; a turn sent with the expected version
+    (the version parameter) is rejected if another turn was made since, a repeat of a turn
+    (the same Idempotency-Key header) gets the response of the first one, the turn is made once;
+    the responses are kept with the arena, so a shared store (ARENA_DB) answers the repeats too,
+    and a turn which arena was saved by another request meanwhile is made again with the saved one
+    finish - adds the fields to the response by the arena and the version before the turn
+    :returns the turn events and the changes of the players as JSON
+    """
+
+    request_id = request.headers.get(REQUEST_ID_HEADER)
+    if request_id is not None and len(request_id) > REQUEST_ID_MAX_LENGTH:
+        return (
+            jsonify(
+                error=f"{REQUEST_ID_HEADER} длиннее {REQUEST_ID_MAX_LENGTH} символов"
+            ),
+            400,
+        )
+    expected_version = request.values.get("version", type=int)
+    for _ in range(TURN_SAVE_ATTEMPTS):
+        arena = get_arena()
+        if NotImplemented in (arena.hero, arena.enemy):
+            return jsonify(error="Бой не начат"), 409
+        with arena.turn_lock:
+            body, status, delta = play_api_turn(
+                arena, func, finish, request_id, expected_version
+            )
+            try:
+                app.config["ARENAS"].save(session["sid"], arena)
+            except StaleArenaError:
+                del g.arena  # read the arena saved by the other request
+                g.pop("finished", None)
+                continue
+        g.arena_saved = True
+        if delta is not None:
+            app.config["STREAMS"].publish(
+                session["sid"], json.dumps(delta, ensure_ascii=False)
+            )
+        return json_response(body, status)
+    return (
+        jsonify(
+            error="Бой изменён другими запросами, повторите ход",
+            **fight_state(get_arena()),
+        ),
+        409,
     )
 
 
+def play_api_turn(
+    arena: Arena,
+    func: Callable[[Arena], object],
+    finish: Optional[Callable[[Arena, int], dict]],
+    request_id: Optional[str],
+    expected_version: Optional[int],
+) -> tuple[bytes, int, Optional[dict]]:
+    """
+    answers a turn request with the arena (see make_api_turn())
+    :returns the response, its status and the turn delta to publish (None if no turn is made)
+    """
+
+    if request_id is not None and request_id in arena.done_turns:
+        return *arena.done_turns[request_id], None
+    if expected_version is not None and expected_version != arena.version:
+        rejection = json_body({"error": "Ход уже сделан", **fight_state(arena)})
+        if request_id is not None:
+            arena.remember_turn(request_id, rejection, 409)
+        return rejection, 409, None
+    base_version, before = arena.version, snapshot(arena)
+    if arena.is_game_on():
+        func(arena)
+    delta = turn_delta(arena, base_version, before)
+    response = dict(delta)
+    if finish is not None:
+        response.update(finish(arena, base_version))
+    body = json_body(response)
+    if request_id is not None:
+        arena.remember_turn(request_id, body)
+    return body, 200, delta
+
+
+def json_body(data: dict) -> bytes:
+    """
+    the compact JSON of a turn response (kept with the arena to answer the repeats of the request)
+    """
+
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def json_response(body: bytes, status: int = 200) -> FlaskResponse:
+    """
+    the response with the JSON made by json_body()
+    """
+
+    return FlaskResponse(body, status, mimetype="application/json")
+
+
 def make_personage(
-    class_name: Callable, name: str, hero_type: UnitClass
-) -> Union[HumanPlayer, CompPlayer]:
+    class_name: Type[Personage], name: str, hero_type: UnitClass
+) -> Personage:
     """
     make a personage with the specified class and hero type
     """
 
+    if app.config["FIXED_POINT"]:
+        class_name = FIXED_POINT_PLAYERS[class_name]
     return class_name(
         name=name,
         unit_class=hero_type,
-        health=hero_type.max_health,
-        stamina=hero_type.max_stamina,
+        health=class_name.encode(hero_type.max_health),
+        stamina=class_name.encode(hero_type.max_stamina),
         _weapon=app.config["EQUIPMENT"].get_weapon(request.form["weapon"]),
         _armor=app.config["EQUIPMENT"].get_armor(request.form["armor"]),
     )
@@ -75,11 +424,15 @@ def index() -> str:
 def choose_hero() -> Union[str, Response]:
     """
     Choose hero screen
+    (the player's fight goes on if both players are chosen, otherwise the choosing starts over)
     """
 
-    if app.config["ARENA"].is_game_on():
-        return render_template("ongoing.html")
-    app.config["ARENA"].start_game()
+    arena = get_arena()
+    if arena.is_game_on():
+        if NotImplemented not in (arena.hero, arena.enemy):
+            return redirect(url_for("fight"))
+        arena.end_game()
+    arena.start_game()
     return render_template(
         "hero_choosing.html", result=prepare_form_data("Выберите героя")
     )
@@ -91,11 +444,14 @@ def choose_hero_post() -> Response:
     Choose hero post
     """
 
-    app.config["ARENA"].hero = make_personage(
+    arena = get_arena()
+    arena.hero = make_personage(
         HumanPlayer,
         request.form["name"],
         UnitClass.get_unit_by_name(request.form["unit_class"]),
     )
+    # to start calculating the odds before the screen is shown
+    prepare_odds(arena.hero, arena.stamina)
     return redirect(url_for("choose_enemy"))
 
 
@@ -105,10 +461,13 @@ def choose_enemy() -> Union[str, Response]:
     Choose enemy screen
     """
 
-    if app.config["ARENA"].hero == NotImplemented:
+    arena = get_arena()
+    if arena.hero == NotImplemented:
         return redirect(url_for("index"))
     return render_template(
-        "hero_choosing.html", result=prepare_form_data("Выберите противника")
+        "hero_choosing.html",
+        result=prepare_form_data("Выберите противника"),
+        odds=prepare_odds(arena.hero, arena.stamina),
     )
 
 
@@ -118,11 +477,13 @@ def choose_enemy_post() -> Response:
     Choose enemy post
     """
 
-    app.config["ARENA"].enemy = make_personage(
+    arena = get_arena()
+    arena.enemy = make_personage(
         CompPlayer,
         request.form["name"],
         UnitClass.get_unit_by_name(request.form["unit_class"]),
     )
+    arena.enemy_ai = choose_enemy_action if app.config["SMART_ENEMY"] else None
     return redirect(url_for("fight"))
 
 
@@ -141,7 +502,7 @@ def fight_hit() -> Union[str, Response]:
     Make a hit
     """
 
-    return render_fighting_screen(app.config["ARENA"].attack)
+    return render_fighting_screen(get_arena().attack)
 
 
 @app.route("/fight/use-skill")
@@ -150,7 +511,7 @@ def fight_use_skill() -> Union[str, Response]:
     Use your skill
     """
 
-    return render_fighting_screen(app.config["ARENA"].use_skill)
+    return render_fighting_screen(get_arena().use_skill)
 
 
 @app.route("/fight/pass-turn")
@@ -159,7 +520,7 @@ def fight_pass_turn() -> Union[str, Response]:
     Pass your turn
     """
 
-    return render_fighting_screen(app.config["ARENA"].skip_turn)
+    return render_fighting_screen(get_arena().skip_turn)
 
 
 @app.route("/fight/end-fight")
@@ -168,9 +529,181 @@ def fight_end_fight() -> Response:
     End the fight
     """
 
-    app.config["ARENA"].end_game()
+    get_arena().end_game()
     return redirect(url_for("index"))
 
 
+@app.route("/metrics")
+def metrics() -> FlaskResponse:
+    """
+    The app metrics in the Prometheus text format
+    """
+
+    return FlaskResponse(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/odds/stats")
+def api_odds_stats() -> FlaskResponse:
+    """
+    The odds cache hit rate and the background calculation time
+    """
+
+    return jsonify(app.config["ODDS"].stats())
+
+
+@app.route("/api/leaderboard")
+def api_leaderboard() -> Union[FlaskResponse, tuple]:
+    """
+    The players with the most wins (top `size`, 10 by default)
+    """
+
+    history = get_history()
+    if history is None:
+        return jsonify(error="История боёв отключена"), 404
+    size = request.args.get("size", 10, type=int)
+    if not 0 < size <= 100:
+        return jsonify(error="Размер таблицы должен быть от 1 до 100"), 400
+    return jsonify(history.leaderboard(size))
+
+
+@app.route("/api/stats/classes")
+def api_stats_classes() -> Union[FlaskResponse, tuple]:
+    """
+    The fights, the outcomes and the win rate of the heroes per class
+    """
+
+    history = get_history()
+    if history is None:
+        return jsonify(error="История боёв отключена"), 404
+    return jsonify(history.class_win_rates())
+
+
+@app.route("/api/fight/")
+def api_fight() -> Union[FlaskResponse, tuple]:
+    """
+    The full state of the fight
+    """
+
+    arena = get_arena()
+    if NotImplemented in (arena.hero, arena.enemy):
+        return jsonify(error="Бой не начат"), 409
+    return jsonify(fight_state(arena))
+
+
+@app.route("/api/fight/stream")
+def api_fight_stream() -> Union[FlaskResponse, tuple]:
+    """
+    The stream of the fight turns (server-sent events)
+    the first event is the full state, then the turns made by POST /api/fight/... follow
+    an open stream holds a thread: a server without threads (e.g. a sync gunicorn
+    worker) or a worker
+    holding STREAM_MAX_OPEN streams (the environment variable) refuses it,
+    the page keeps working with the responses of the turns
+    """
+
+    streams = app.config["STREAMS"]
+    if (
+        not request.environ.get("wsgi.multithread")
+        or len(streams) >= app.config["STREAM_MAX_OPEN"]
+    ):
+        return jsonify(error="Обновления боя недоступны"), 503
+    arena = get_arena()
+    session_id = session["sid"]
+    messages = streams.subscribe(session_id)
+    state = (
+        json.dumps(fight_state(arena), ensure_ascii=False)
+        if NotImplemented not in (arena.hero, arena.enemy)
+        else None
+    )
+
+    def stream() -> Iterator[str]:
+        try:
+            yield "retry: 3000\n\n"  # sends the headers at once and sets the reconnection delay
+            if state:
+                yield f"event: state\ndata: {state}\n\n"
+            while True:
+                try:
+                    yield f"data: {messages.get(timeout=STREAM_KEEP_ALIVE)}\n\n"
+                except Empty:
+                    yield ": keep-alive\n\n"  # a comment, to find out the closed connections
+        finally:
+            streams.unsubscribe(session_id, messages)
+
+    return FlaskResponse(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/fight/hit", methods=["POST"])
+def api_fight_hit() -> Union[FlaskResponse, tuple]:
+    """
+    Make a hit
+    """
+
+    return make_api_turn(Arena.attack)
+
+
+@app.route("/api/fight/use-skill", methods=["POST"])
+def api_fight_use_skill() -> Union[FlaskResponse, tuple]:
+    """
+    Use your skill
+    """
+
+    return make_api_turn(Arena.use_skill)
+
+
+@app.route("/api/fight/pass-turn", methods=["POST"])
+def api_fight_pass_turn() -> Union[FlaskResponse, tuple]:
+    """
+    Pass your turn
+    """
+
+    return make_api_turn(Arena.skip_turn)
+
+
+@app.route("/api/fight/auto", methods=["POST"])
+def api_fight_auto() -> Union[FlaskResponse, tuple]:
+    """
+    Play several turns (the turns parameter) or the whole fight with a policy (the policy parameter)
+    returns the changes like the other turns, the actions played (base64, a byte per turn)
+    and the replay of the fight if it is over (base64, see app.replay)
+    """
+
+    arena = get_arena()
+    if NotImplemented in (arena.hero, arena.enemy):
+        return jsonify(error="Бой не начат"), 409
+    policy = request.values.get("policy", "attack")
+    turns = request.values.get("turns", type=int)
+    if policy not in POLICIES:
+        return jsonify(error=f"Неизвестная стратегия: {policy}"), 400
+    return make_api_turn(
+        lambda arena_: arena_.auto_battle(policy, turns), auto_battle_log
+    )
+
+
+def auto_battle_log(arena: Arena, base_version: int) -> dict:
+    """
+    returns the actions played (base64, a byte per turn) and the replay if the fight is over
+    """
+
+    fields = {"log": base64.b64encode(arena.log[base_version:]).decode()}
+    if not arena.is_game_on():
+        fields["replay"] = base64.b64encode(dump_replay(arena)).decode()
+    return fields
+
+
+@app.route("/api/fight/end-fight", methods=["POST"])
+def api_fight_end_fight() -> FlaskResponse:
+    """
+    End the fight
+    """
+
+    arena = get_arena()
+    arena.end_game()
+    return jsonify(game_on=False, version=arena.version)
+
+
 if __name__ == "__main__":
     app.run()